@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""
+Accuracy and speed of the fast engine
+
+Indexes the files of a corpus with the fast engine and with a full one,
+reporting the time each one took, how many files were indexed the same,
+and how many of the symbols the full engine marks (as definitions, calls,
+assignments, includes...) the fast engine marks the same, and how many it
+marks that the full engine does not.
+
+The corpus is generated (see corpus.py) unless an existing tree is given.
+
+Usage: accuracy.py [--corpus=dir] [--shape=name] [--files=N] [--lines=N] [--depth=N] [--seed=N]
+                   [--engine=name] [--diffs=N] [--json]
+
+--corpus=dir    Index the Python files under 'dir' instead of a generated corpus
+--shape=name    Shape of the generated corpus (default: mixed)
+--files=N       Number of files of the generated corpus
+--lines=N       Approximate number of lines of each file of the generated corpus
+--depth=N       Nesting depth of the code blocks of the generated corpus
+--seed=N        Seed of the corpus generator (default: 0)
+--engine=name   Full engine compared with (default: ast)
+--diffs=N       List the first N files indexed differently
+--json          Report the results as JSON
+"""
+
+from __future__ import print_function
+
+import getopt, json, os, shutil, sys, tempfile, timeit
+from collections import Counter
+
+import bench
+import corpus
+
+pycscope = bench.pycscope
+
+
+def markedSymbols(index):
+    """ The marked symbols of the index lines of a file, as a Counter of
+        (line number, mark, symbol) tuples.
+    """
+    marked = Counter()
+    for block in index.split("\n\n"):
+        lines = block.split("\n")
+        try:
+            lineno = int(lines[0].split(" ", 1)[0])
+        except ValueError:
+            continue
+        for line in lines[1:]:
+            if line.startswith("\t") and len(line) > 1:
+                marked[(lineno, line[1], line[2:])] += 1
+    return marked
+
+
+def indexFile(source, engine):
+    """ Index the source of a file, returning the index and the time taken.
+    """
+    buff = []
+    start = timeit.default_timer()
+    pycscope.parseSource(source, buff, 0, engine=engine)
+    return "".join(buff), timeit.default_timer() - start
+
+
+def compare(corpusdir, engine='ast', diffs=0):
+    """ Index the files of a corpus with both engines, returning the
+        results of the comparison.
+    """
+    fnames = bench.findFiles(corpusdir)
+    results = {'engine': engine, 'files': 0, 'same': 0, 'errors': 0, 'time': {engine: 0.0, 'fast': 0.0},
+               'marked': 0, 'matched': 0, 'extra': 0, 'differ': []}
+    for fname, source in zip(fnames, bench.readFiles(corpusdir, fnames)):
+        try:
+            full, fullTime = indexFile(source, engine)
+        except (SyntaxError, AssertionError):
+            # The full engine cannot index it, there is nothing to compare
+            results['errors'] += 1
+            continue
+        fast, fastTime = indexFile(source, 'fast')
+        results['files'] += 1
+        results['time'][engine] += fullTime
+        results['time']['fast'] += fastTime
+        if fast == full:
+            results['same'] += 1
+        elif len(results['differ']) < diffs:
+            results['differ'].append(fname)
+
+        fullMarked = markedSymbols(full)
+        fastMarked = markedSymbols(fast)
+        matched = sum((fullMarked & fastMarked).values())
+        results['marked'] += sum(fullMarked.values())
+        results['matched'] += matched
+        results['extra'] += sum(fastMarked.values()) - matched
+    return results
+
+
+def report(results):
+    engine = results['engine']
+    times = results['time']
+    print("pycscope %s, Python %s" % (pycscope.__version__, sys.version.split()[0]))
+    print("files: %d indexed, %d the same, %d skipped (errors)" % (results['files'], results['same'],
+                                                                 results['errors']))
+    print("time: %s %.3fs, fast %.3fs (%.2fx)" % (engine, times[engine], times['fast'],
+                                                   times[engine] / (times['fast'] or 1e-9)))
+    print("marked symbols: %d, %d marked the same (%.2f%%), %d more marked by the fast engine" % (
+        results['marked'], results['matched'], 100.0 * results['matched'] / (results['marked'] or 1),
+        results['extra']))
+    for fname in results['differ']:
+        print("differs: %s" % fname)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    try:
+        opts, args = getopt.getopt(argv[1:], "", ["corpus=", "shape=", "files=", "lines=", "depth=",
+                                                  "seed=", "engine=", "diffs=", "json"])
+    except getopt.GetoptError:
+        print(__doc__)
+        return 2
+
+    corpusdir = None
+    options = {}
+    engine = 'ast'
+    diffs = 0
+    asJson = False
+    for o, a in opts:
+        if o == "--corpus":
+            corpusdir = os.path.abspath(a)
+        elif o == "--shape":
+            if a not in corpus.SHAPES:
+                print(__doc__)
+                return 2
+            options['shape'] = a
+        elif o == "--engine":
+            if (a not in pycscope.engines) or (a == 'fast'):
+                print(__doc__)
+                return 2
+            engine = a
+        elif o == "--json":
+            asJson = True
+        else:
+            if not a.isdigit():
+                print(__doc__)
+                return 2
+            if o == "--diffs":
+                diffs = int(a)
+            else:
+                options[o[2:]] = int(a)
+
+    tmpd = None
+    if corpusdir is None:
+        tmpd = tempfile.mkdtemp()
+        corpusdir = tmpd
+        corpus.generate(corpusdir, **options)
+    try:
+        results = compare(corpusdir, engine, diffs)
+    finally:
+        if tmpd is not None:
+            shutil.rmtree(tmpd)
+
+    if asJson:
+        results['version'] = pycscope.__version__
+        results['python'] = sys.version.split()[0]
+        print(json.dumps(results, indent=2, sort_keys=True))
+    else:
+        report(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
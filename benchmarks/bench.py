@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+"""
+pycscope benchmarks
+
+Times the phases of indexing a corpus of Python source, reporting the
+files, lines and bytes of source handled per second by each one, and the
+peak RSS of the process while timing it. Each phase is run in a process of
+its own, which sets it up before timing it. The best of the repeated runs of
+a phase is kept, as timeit does.
+
+The corpus is generated (see corpus.py) unless an existing tree is given.
+The pycscope found on the Python path is benchmarked, or else the one of
+the checkout this script is in.
+
+Usage: bench.py [--corpus=dir] [--shape=name] [--files=N] [--lines=N] [--depth=N] [--seed=N]
+                [--phase=name] [--repeat=N] [--jobs=N] [--json]
+
+--corpus=dir    Index the Python files under 'dir' instead of a generated corpus
+--shape=name    Shape of the generated corpus (default: mixed)
+--files=N       Number of files of the generated corpus
+--lines=N       Approximate number of lines of each file of the generated corpus
+--depth=N       Nesting depth of the code blocks of the generated corpus
+--seed=N        Seed of the corpus generator (default: 0)
+--phase=name    Only run the given phase; may be repeated
+--repeat=N      Number of runs of each phase (default: 3)
+--jobs=N        Number of worker processes for the work phase (default: 1)
+--json          Report the results as JSON
+
+Phases:
+  genFiles      finding the files of the corpus
+  read          reading and decoding the files, as pycscope does
+  parseSource   indexing the source of the files, with the default engine
+  parseFast     indexing the source of the files, with the fast engine
+                (see accuracy.py for how its output compares)
+  formatLines   building the index lines of the files from their tokens, as
+                the default engine adds them, without parsing them
+  walkCst       indexing the concrete syntax trees of the files, without
+                parsing them (only where the parser module is available)
+  work          finding, reading and indexing the files
+  writeIndex    streaming the index of each file to the cross-ref file
+"""
+
+from __future__ import print_function
+
+import getopt, json, os, shutil, subprocess, sys, tempfile, timeit
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import pycscope
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import pycscope
+
+import corpus
+
+
+PHASES = ('genFiles', 'read', 'parseSource', 'parseFast', 'formatLines', 'walkCst', 'work',
+          'writeIndex')
+
+
+def findFiles(corpusdir):
+    return list(pycscope.genFiles(corpusdir, ['.'], True))
+
+
+def readFiles(corpusdir, fnames):
+    return [pycscope.readSource(os.path.join(corpusdir, fname))[0] for fname in fnames]
+
+
+def recordLines(sources):
+    """ The line numbers of the source lines indexed and the calls adding
+        their tokens to a LineBuilder, as (method, args) pairs.
+    """
+    LineBuilder = pycscope.LineBuilder
+    lines = []
+
+    class Recorder(LineBuilder):
+        def __init__(self, num):
+            LineBuilder.__init__(self, num)
+            self.calls = []
+            lines.append((num, self.calls))
+
+        def addSymbol(self, name, mark=None):
+            self.calls.append((LineBuilder.addSymbol, (name, mark)))
+            LineBuilder.addSymbol(self, name, mark)
+
+        def addNonSymbol(self, text):
+            self.calls.append((LineBuilder.addNonSymbol, (text,)))
+            LineBuilder.addNonSymbol(self, text)
+
+        def addFuncEnd(self):
+            self.calls.append((LineBuilder.addFuncEnd, ()))
+            LineBuilder.addFuncEnd(self)
+
+    pycscope.LineBuilder = Recorder
+    try:
+        for source in sources:
+            pycscope.parseSource(source, [], 0)
+    finally:
+        pycscope.LineBuilder = LineBuilder
+    return lines
+
+
+def setupPhase(name, corpusdir, jobs=1):
+    """ Set up a phase, returning the function running it once, or None if
+        it cannot be run here.
+    """
+    if name == 'genFiles':
+        return lambda: findFiles(corpusdir)
+
+    fnames = findFiles(corpusdir)
+    if name == 'read':
+        return lambda: readFiles(corpusdir, fnames)
+    elif name in ('parseSource', 'parseFast'):
+        sources = readFiles(corpusdir, fnames)
+        engine = 'fast' if name == 'parseFast' else None
+
+        def run():
+            for source in sources:
+                pycscope.parseSource(source, [], 0, engine=engine)
+        return run
+    elif name == 'formatLines':
+        lines = recordLines(readFiles(corpusdir, fnames))
+        LineBuilder = pycscope.LineBuilder
+
+        def run():
+            for num, calls in lines:
+                builder = LineBuilder(num)
+                for method, args in calls:
+                    method(builder, *args)
+                builder.format()
+        return run
+    elif name == 'walkCst':
+        if pycscope.parser is None:
+            return None
+        csts = [pycscope.parser.suite(source).totuple(True, True)
+                for source in readFiles(corpusdir, fnames)]
+
+        def run():
+            for cst in csts:
+                pycscope.walkCst(pycscope.Context(), cst)
+        return run
+    elif name == 'work':
+        return lambda: pycscope.work(corpusdir, fnames, False, jobs=jobs)
+    elif name == 'writeIndex':
+        chunks = list(pycscope.workChunks(corpusdir, fnames, False))
+
+        def run():
+            with tempfile.TemporaryFile('w+b') as fout:
+                pycscope.streamIndex(corpusdir, fout, chunks)
+        return run
+    raise ValueError(name)
+
+
+def resetPeakRss():
+    """ Reset the peak RSS of this process to its current RSS, where Linux
+        allows it, returning whether it did.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def peakRss():
+    """ The peak RSS of this process so far, in bytes.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError):
+        pass
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return maxrss
+    return maxrss * 1024
+
+
+def runPhase(name, corpusdir, repeat, jobs):
+    """ Run a phase in this process, returning its results.
+
+        The peak RSS is the one reached while timing the phase, not setting
+        it up. Where it cannot be reset, it is only known if the timed runs
+        went past the peak of the set up.
+    """
+    run = setupPhase(name, corpusdir, jobs)
+    if run is None:
+        return None
+    reset = resetPeakRss()
+    setupRss = peakRss()
+    times = []
+    for i in range(repeat):
+        start = timeit.default_timer()
+        run()
+        times.append(timeit.default_timer() - start)
+    rss = peakRss()
+    if (not reset) and (rss is not None) and (rss <= setupRss):
+        rss = None
+    return {'phase': name, 'times': times, 'best': min(times), 'peak_rss': rss}
+
+
+def corpusStats(corpusdir):
+    """ The number of files, lines and bytes of the corpus.
+    """
+    fnames = findFiles(corpusdir)
+    lines = size = 0
+    for fname in fnames:
+        with open(os.path.join(corpusdir, fname), 'rb') as f:
+            data = f.read()
+        lines += data.count(b'\n')
+        size += len(data)
+    return {'files': len(fnames), 'lines': lines, 'bytes': size}
+
+
+def report(stats, results):
+    print("pycscope %s (%s), Python %s" % (pycscope.__version__, os.path.dirname(pycscope.__file__),
+                                            sys.version.split()[0]))
+    print("corpus: %(files)d files, %(lines)d lines, %(bytes)d bytes" % stats)
+    print("%-12s %10s %12s %12s %10s %10s" % ("phase", "best (s)", "files/s", "lines/s", "MB/s", "RSS (MB)"))
+    for result in results:
+        best = result['best'] or 1e-9
+        rss = result['peak_rss']
+        print("%-12s %10.3f %12.0f %12.0f %10.2f %10s" % (
+            result['phase'], result['best'], stats['files'] / best, stats['lines'] / best,
+            stats['bytes'] / best / 1e6, "-" if rss is None else "%.1f" % (rss / 1e6)))
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    try:
+        opts, args = getopt.getopt(argv[1:], "", ["corpus=", "shape=", "files=", "lines=", "depth=",
+                                                  "seed=", "phase=", "repeat=", "jobs=", "json",
+                                                  "run-phase="])
+    except getopt.GetoptError:
+        print(__doc__)
+        return 2
+
+    corpusdir = None
+    options = {}
+    phases = []
+    repeat = 3
+    jobs = 1
+    asJson = False
+    runOne = None
+    for o, a in opts:
+        if o == "--corpus":
+            corpusdir = os.path.abspath(a)
+        elif o == "--shape":
+            if a not in corpus.SHAPES:
+                print(__doc__)
+                return 2
+            options['shape'] = a
+        elif o in ("--phase", "--run-phase"):
+            if a not in PHASES:
+                print(__doc__)
+                return 2
+            if o == "--phase":
+                phases.append(a)
+            else:
+                runOne = a
+        elif o == "--json":
+            asJson = True
+        else:
+            if not a.isdigit():
+                print(__doc__)
+                return 2
+            if o == "--repeat":
+                repeat = max(int(a), 1)
+            elif o == "--jobs":
+                jobs = int(a)
+            else:
+                options[o[2:]] = int(a)
+
+    if runOne:
+        # Run a single phase, for the process running the benchmarks
+        print(json.dumps(runPhase(runOne, corpusdir, repeat, jobs)))
+        return 0
+
+    tmpd = None
+    if corpusdir is None:
+        tmpd = tempfile.mkdtemp()
+        corpusdir = tmpd
+        corpus.generate(corpusdir, **options)
+    try:
+        stats = corpusStats(corpusdir)
+        results = []
+        for name in phases or PHASES:
+            out = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                           "--run-phase=%s" % name, "--corpus=%s" % corpusdir,
+                                           "--repeat=%d" % repeat, "--jobs=%d" % jobs])
+            result = json.loads(out.decode())
+            if result is not None:
+                results.append(result)
+    finally:
+        if tmpd is not None:
+            shutil.rmtree(tmpd)
+
+    if asJson:
+        print(json.dumps({'version': pycscope.__version__, 'python': sys.version.split()[0],
+                          'corpus': stats, 'results': results}, indent=2, sort_keys=True))
+    else:
+        report(stats, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+pycscope benchmarks, run with pyperf
+
+Runs the phases of bench.py on an existing corpus with pyperf, which
+spawns worker processes, calibrates the number of loops and checks the
+stability of the results, for comparisons with "python -m pyperf compare_to".
+
+Usage: bm_pyperf.py --corpus=dir [--phase=name ...] [pyperf options]
+
+For instance:
+
+    python corpus.py --shape=mixed /tmp/corpus
+    python bm_pyperf.py --corpus=/tmp/corpus -o before.json
+"""
+
+import pyperf
+
+import bench
+
+
+def timeLoops(loops, run):
+    start = pyperf.perf_counter()
+    for i in range(loops):
+        run()
+    return pyperf.perf_counter() - start
+
+
+def addCmdlineArgs(cmd, args):
+    cmd.extend(("--corpus", args.corpus))
+    for name in args.phase or ():
+        cmd.extend(("--phase", name))
+
+
+def main():
+    runner = pyperf.Runner(add_cmdline_args=addCmdlineArgs)
+    runner.argparser.add_argument("--corpus", required=True,
+                                  help="Index the Python files under this directory")
+    runner.argparser.add_argument("--phase", action="append", choices=bench.PHASES,
+                                  help="Only run the given phase; may be repeated")
+    args = runner.parse_args()
+
+    for name in args.phase or bench.PHASES:
+        run = None
+        if args.worker:
+            # Only the worker processes run the phases
+            run = bench.setupPhase(name, args.corpus)
+            if run is None:
+                continue
+        elif name == 'walkCst' and bench.pycscope.parser is None:
+            continue
+        runner.bench_time_func(name, timeLoops, run)
+
+
+if __name__ == "__main__":
+    main()
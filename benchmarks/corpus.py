@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+"""
+Synthetic corpus generator for the pycscope benchmarks
+
+Writes a tree of Python source files of a given shape and size. The same
+seed always gives the same tree, so that runs of the benchmarks can be
+compared across versions of pycscope. The source is valid for Python 2.7
+and 3, and for both indexing engines.
+
+Usage: corpus.py [--shape=name] [--files=N] [--lines=N] [--depth=N] [--seed=N] directory
+
+--shape=name    One of the shapes below (default: mixed)
+--files=N       Number of files (default: depends on the shape)
+--lines=N       Approximate number of lines of each file (default: depends on the shape)
+--depth=N       Nesting depth of the code blocks (default: depends on the shape)
+--seed=N        Seed of the generator (default: 0)
+
+Shapes:
+  mixed     a bit of everything, in a few packages
+  deep      deeply nested functions and blocks
+  huge      a single, huge module
+  many      many small files, in many directories
+  strings   long string literals, on one or many lines
+  imports   modules made mostly of import statements
+"""
+
+from __future__ import print_function
+
+import getopt, os, random, sys
+
+
+# The defaults of each shape: number of files, lines per file, nesting
+# depth, and the kinds of statements the files are made of
+SHAPES = {
+    'mixed': (200, 300, 4, ('imports', 'function', 'class', 'assign', 'call', 'string')),
+    'deep': (20, 1000, 40, ('deep',)),
+    'huge': (1, 100000, 4, ('function', 'class', 'assign', 'call')),
+    'many': (5000, 20, 2, ('imports', 'function', 'assign', 'call')),
+    'strings': (100, 500, 2, ('string', 'longstring', 'docstring', 'assign')),
+    'imports': (500, 100, 1, ('imports', 'imports', 'imports', 'assign')),
+}
+
+# Python limits the indentation to 100 levels
+MAX_DEPTH = 90
+
+WORDS = ("data", "value", "node", "item", "index", "name", "path", "count",
+         "buffer", "state", "config", "result", "token", "entry", "parent",
+         "child", "key", "table", "line", "symbol", "cache", "stream")
+VERBS = ("get", "set", "make", "parse", "find", "load", "save", "update",
+         "check", "build", "read", "write", "walk", "visit", "format")
+MODULES = ("os", "sys", "re", "json", "collections", "itertools", "functools",
+           "os.path", "xml.dom.minidom", "email.mime.text", "logging.handlers")
+EXCEPTIONS = ("ValueError", "KeyError", "IndexError", "TypeError", "IOError")
+TEXT = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing",
+        "elit", "sed", "do", "eiusmod", "tempor", "incididunt", "labore")
+
+
+class Generator(object):
+    """ Generates the lines of Python source files, from a seeded random
+        number generator.
+    """
+    def __init__(self, seed=0, depth=4):
+        self.rnd = random.Random(seed)
+        self.depth = depth
+
+    # Only random() gives the same numbers on Python 2 and 3 for a seed,
+    # so choices are made from it
+
+    def choice(self, seq):
+        return seq[int(self.rnd.random() * len(seq))]
+
+    def randint(self, a, b):
+        return a + int(self.rnd.random() * (b - a + 1))
+
+    def name(self):
+        return "%s_%s" % (self.choice(WORDS), self.choice(WORDS))
+
+    def funcName(self):
+        return "%s_%s" % (self.choice(VERBS), self.choice(WORDS))
+
+    def className(self):
+        return "%s%s" % (self.choice(WORDS).capitalize(), self.choice(WORDS).capitalize())
+
+    def dotted(self):
+        return ".".join(self.name() for i in range(self.randint(1, 3)))
+
+    def text(self, words):
+        return " ".join(self.choice(TEXT) for i in range(words))
+
+    def expr(self):
+        choice = self.randint(0, 7)
+        if choice == 0:
+            return str(self.randint(0, 1000))
+        elif choice == 1:
+            return "'%s'" % self.text(3)
+        elif choice == 2:
+            return "%s(%s, %s=%s)" % (self.funcName(), self.name(), self.name(), self.randint(0, 9))
+        elif choice == 3:
+            return "[%s for %s in %s if %s]" % (self.name(), self.name(), self.dotted(), self.name())
+        elif choice == 4:
+            return "{'%s': %s, '%s': %s}" % (self.name(), self.name(), self.name(), self.dotted())
+        elif choice == 5:
+            return "(lambda %s: %s + 1)" % (self.name(), self.name())
+        elif choice == 6:
+            return "%s.%s(%s)" % (self.dotted(), self.funcName(), self.name())
+        return "%s * %s - %s" % (self.name(), self.dotted(), self.randint(1, 9))
+
+    def imports(self, ind):
+        pad = "    " * ind
+        choice = self.randint(0, 3)
+        if choice == 0:
+            return [pad + "import %s" % self.choice(MODULES)]
+        elif choice == 1:
+            return [pad + "import %s as %s" % (self.choice(MODULES), self.name())]
+        elif choice == 2:
+            return [pad + "from %s import %s" % (self.choice(MODULES), self.name())]
+        names = [self.name() for i in range(self.randint(4, 12))]
+        lines = [pad + "from %s import (" % self.choice(MODULES)]
+        lines.extend(pad + "    %s," % n for n in names)
+        lines.append(pad + ")")
+        return lines
+
+    def assign(self, ind):
+        pad = "    " * ind
+        if self.randint(0, 3):
+            return [pad + "%s = %s" % (self.name(), self.expr())]
+        return [pad + "%s.%s += %s" % (self.name(), self.name(), self.expr())]
+
+    def call(self, ind):
+        pad = "    " * ind
+        return [pad + "%s(%s, %s)" % (self.dotted(), self.expr(), self.name())]
+
+    def string(self, ind):
+        pad = "    " * ind
+        return [pad + "%s = \"%s\"" % (self.name(), self.text(self.randint(20, 300)))]
+
+    def longstring(self, ind):
+        pad = "    " * ind
+        lines = [pad + "%s = '''%s" % (self.name(), self.text(8))]
+        lines.extend(self.text(12) for i in range(self.randint(5, 40)))
+        lines[-1] += "'''"
+        return lines
+
+    def docstring(self, ind):
+        pad = "    " * ind
+        lines = [pad + "def %s(%s):" % (self.funcName(), self.name()),
+                 pad + "    \"\"\" %s" % self.text(10)]
+        lines.extend(pad + "        %s" % self.text(10) for i in range(self.randint(2, 10)))
+        lines.append(pad + "    \"\"\"")
+        lines.append(pad + "    return %s" % self.name())
+        return lines
+
+    def block(self, ind, depth):
+        """ The statements of a block, some of them compound statements
+            while the depth allows.
+        """
+        lines = []
+        for i in range(self.randint(1, 4)):
+            if depth > 0 and not self.randint(0, 2):
+                lines.extend(self.compound(ind, depth - 1))
+            else:
+                lines.extend(self.choice((self.assign, self.call))(ind))
+        return lines
+
+    def compound(self, ind, depth):
+        pad = "    " * ind
+        choice = self.randint(0, 4)
+        if choice == 0:
+            lines = [pad + "if %s > %s:" % (self.name(), self.expr())]
+            lines.extend(self.block(ind + 1, depth))
+            lines.append(pad + "else:")
+            lines.extend(self.block(ind + 1, depth))
+        elif choice == 1:
+            lines = [pad + "for %s in %s:" % (self.name(), self.expr())]
+            lines.extend(self.block(ind + 1, depth))
+        elif choice == 2:
+            lines = [pad + "while %s:" % self.dotted()]
+            lines.extend(self.block(ind + 1, depth))
+        elif choice == 3:
+            lines = [pad + "try:"]
+            lines.extend(self.block(ind + 1, depth))
+            lines.append(pad + "except %s as %s:" % (self.choice(EXCEPTIONS), self.name()))
+            lines.extend(self.block(ind + 1, depth))
+        else:
+            lines = [pad + "with %s(%s) as %s:" % (self.funcName(), self.name(), self.name())]
+            lines.extend(self.block(ind + 1, depth))
+        return lines
+
+    def function(self, ind, depth=None):
+        pad = "    " * ind
+        lines = []
+        if not self.randint(0, 3):
+            lines.append(pad + "@%s" % self.dotted())
+        first = self.name()
+        second = self.name()
+        while second == first:
+            second = self.name()
+        lines.append(pad + "def %s(%s, %s=%s, *args, **kwargs):" % (
+            self.funcName(), first, second, self.expr()))
+        lines.extend(self.block(ind + 1, self.depth if depth is None else depth))
+        lines.append(pad + "    return %s" % self.expr())
+        return lines
+
+    def klass(self, ind):
+        pad = "    " * ind
+        lines = [pad + "class %s(%s):" % (self.className(), self.dotted()),
+                 pad + "    %s = %s" % (self.name(), self.expr())]
+        for i in range(self.randint(1, 5)):
+            lines.append("")
+            lines.extend(self.function(ind + 1))
+        return lines
+
+    def deep(self, ind):
+        """ Functions and blocks nested down to the depth, with a function
+            every few levels, as Python limits the nesting of loops and
+            other blocks within a function to 20.
+        """
+        lines = []
+        levels = min(self.depth, MAX_DEPTH - ind)
+        for level in range(levels):
+            pad = "    " * (ind + level)
+            kind = level % 4
+            if kind == 0:
+                lines.append(pad + "def %s(%s):" % (self.funcName(), self.name()))
+            elif kind == 1:
+                lines.append(pad + "if %s:" % self.dotted())
+            elif kind == 2:
+                lines.append(pad + "for %s in %s:" % (self.name(), self.dotted()))
+            else:
+                lines.append(pad + "with %s(%s) as %s:" % (self.funcName(), self.name(), self.name()))
+            lines.extend(self.assign(ind + level + 1))
+        lines.extend(self.call(ind + levels))
+        return lines
+
+    def module(self, lines, kinds):
+        """ The lines of a module, of about the given length.
+        """
+        source = ['""" %s' % self.text(10), '"""', ""]
+        source.extend(self.imports(0))
+        while len(source) < lines:
+            kind = self.choice(kinds)
+            if kind == 'class':
+                source.extend(self.klass(0))
+            else:
+                source.extend(getattr(self, kind)(0))
+            source.append("")
+        return source
+
+
+def generate(directory, shape='mixed', files=None, lines=None, depth=None, seed=0):
+    """ Write a corpus of the given shape in the directory, returning the
+        paths of its files relative to it.
+    """
+    nfiles, nlines, ndepth, kinds = SHAPES[shape]
+    if files is not None:
+        nfiles = files
+    if lines is not None:
+        nlines = lines
+    if depth is not None:
+        ndepth = min(depth, MAX_DEPTH)
+    gen = Generator(seed, ndepth)
+
+    # Spread the files over packages of about 20 modules, nested two deep
+    relpaths = []
+    for i in range(nfiles):
+        pkg = i // 20
+        if nfiles <= 20:
+            relpath = "module%d.py" % i
+        else:
+            relpath = os.path.join("pkg%d" % (pkg // 20), "sub%d" % (pkg % 20), "module%d.py" % i)
+        fullpath = os.path.join(directory, relpath)
+        if not os.path.isdir(os.path.dirname(fullpath)):
+            os.makedirs(os.path.dirname(fullpath))
+        with open(fullpath, "w") as f:
+            f.write("\n".join(gen.module(nlines, kinds)) + "\n")
+        relpaths.append(relpath)
+    return relpaths
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    try:
+        opts, args = getopt.getopt(argv[1:], "", ["shape=", "files=", "lines=", "depth=", "seed="])
+    except getopt.GetoptError:
+        print(__doc__)
+        return 2
+    options = {}
+    for o, a in opts:
+        if o == "--shape":
+            if a not in SHAPES:
+                print(__doc__)
+                return 2
+            options['shape'] = a
+        else:
+            if not a.isdigit():
+                print(__doc__)
+                return 2
+            options[o[2:]] = int(a)
+    if len(args) != 1:
+        print(__doc__)
+        return 2
+    generate(args[0], **options)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,23 +11,96 @@ __author__ = "Peter Portante (peter\x2Ea\x2Eportante\x40gmail\x2Ecom)"
 __copyright__ = "Copyright 2013 Peter Portante.  See LICENSE for details."
 __date__ = "2013/03/16"
 __version__ = "1.2.1"
-__usage__ = """Usage: pycscope.py [-D] [-R] [-S] [-V] [-f reffile] [-i srclistfile] [files ...]
+__usage__ = """Usage: pycscope.py [-D] [-R] [-S] [-V] [-f reffile] [-i srclistfile] [-j jobs] [-q] [-u] [--cache=file] [--callgraph] [--compress] [--engine=name] [--exclude=glob] [--fast=size] [--git] [--gitignore] [--keywords=names] [--profile=N] [--since=rev] [--sqlite=file] [--stats=file] [--string-names] [--watch] [files ...]
+       pycscope.py serve [-d] [-l] [-f reffile] [--results=N] [--socket=path]
 
--D              Dump the (C)oncrete (S)yntax (T)ree generated by the parser for each file
+-D              Dump the syntax tree generated by the engine's parser for each file
 -R              Recurse directories for files
 -S              Interpret simple strings as symbols
 -V              Print version and exit
 -f reffile      Use 'reffile' as cross-ref file name instead of 'cscope.out'
--i srclistfile  Use the contents of 'srclistfile' as the list of source files to scan"""
-
-import getopt, sys, os, re
-import keyword, parser, symbol, token
-import tokenize
+-i srclistfile  Use the contents of 'srclistfile' as the list of source files to scan
+-j jobs         Parse files using 'jobs' worker processes (0 for one per CPU)
+-q              Build an inverted index for quick symbol searching (cscope -q),
+                written next to the cross-ref file
+-u              Update the cross-ref file, only parsing files changed since it was written
+                (the state of the files it indexes is kept in 'cscope.up.out' for
+                'cscope.out', else 'reffile.up')
+--cache=file    Keep the index of each file in the cache 'file' across runs, only
+                parsing files that changed
+--callgraph     Also write the functions each function calls, and those calling it,
+                into a call graph file for pycscope.callgraph ('cscope.cg.out' for
+                'cscope.out', else 'reffile.cg')
+--compress      Compress the cross-ref file like cscope does by default (without
+                its -c option); only ASCII text is kept as is
+--engine=name   Index using the 'ast' (default), the 'cst' or the 'fast' engine;
+                'cst' uses the parser module, which is gone as of Python 3.10, and
+                'fast' only tokenizes the source, marking symbols from the tokens
+                around them
+--exclude=glob  Skip the files and directories matching the shell pattern 'glob',
+                matched against their path if it has a slash, else their name;
+                may be repeated (version control directories are always skipped)
+--fast=size     Index the files of 'size' bytes or more with the 'fast' engine
+                (default: 10485760, 10 MB; 0 for never)
+--git           Ask git for the files to index, those it tracks or does not ignore,
+                instead of searching the directories
+--gitignore     Skip the files and directories ignored by git, as per .gitignore files
+--keywords=names
+                Also write the comma separated 'names', such as builtins, as non-symbol
+                text like the Python keywords, unless defined or assigned; 'soft'
+                stands for the soft keywords (_, case, match and type)
+--profile=N     With --stats, also profile the time and memory spent parsing the N
+                slowest files (memory with Python 3.4 and later)
+--since=rev     Update the cross-ref file built at git revision 'rev', only parsing
+                the files git tells were changed since (implies --git); the
+                cross-ref file must have been written with -u or --since
+--sqlite=file   Also write the files, lines and marked symbols of the index into the
+                SQLite database 'file', updating it in place
+--stats=file    Write the time spent in each phase of the run, overall and for each
+                file, with the bytes and objects handled, as JSON to 'file' ('-'
+                for standard output)
+--string-names  Interpret the strings naming symbols as symbols, with the 'ast' engine:
+                dict keys, subscripts, the attribute names given to getattr() and
+                the like, and the names listed in __all__
+--watch         Keep running, rewriting the cross-ref file as files change, only
+                parsing those (watched with inotify on Linux, else polled)
+
+serve           Answer queries on the cross-ref file with cscope's line-oriented
+                protocol (its -l option), keeping it open between queries"""
+
+import getopt, sys, os, re, time
+import codecs, collections, functools, io, json, mmap
+import fnmatch
+import multiprocessing
+import ast, bisect, keyword, token
+import tokenize, warnings
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+try:
+    import parser, symbol
+except ImportError:
+    # Removed in Python 3.10, only the ast engine is available
+    parser = symbol = None
+try:
+    from os import scandir
+except ImportError:
+    try:
+        # The backport, for Python 2
+        from scandir import scandir
+    except ImportError:
+        scandir = None
 
 
 class Mark(object):
     """ Marks, as defined by Cscope, that are implemented.
+
+        Marks are interned: there is a single, shared object for each mark,
+        which is never changed once created.
     """
+    __slots__ = ('__mark',)
+
     FILE = "@"
     FUNC_DEF = "$"
     FUNC_CALL = "`"
@@ -41,13 +114,24 @@ class Mark(object):
     # Class private list of valid marks
     __valid = (FILE, FUNC_DEF, FUNC_CALL, FUNC_END, INCLUDE, ASSIGN, CLASS, GLOBAL, LOCAL)
 
-    def __init__(self, mark=''):
-        """ Constructor, making sure a given mark is valid.
+    # Class private table of the marks created so far
+    __interned = {}
+
+    def __new__(cls, mark=''):
+        """ Constructor, making sure a given mark is valid, and returning
+            the existing object for it if there is one.
         """
+        try:
+            return Mark.__interned[mark]
+        except KeyError:
+            pass
 
         if mark:
             assert mark in Mark.__valid, "Not a valid mark (%s)" % mark
+        self = object.__new__(cls)
         self.__mark = (mark or '')  # Turn None into ''
+        Mark.__interned[mark] = self
+        return self
 
     def __eq__(self, other):
         return self.__mark == other.__mark
@@ -69,34 +153,89 @@ class Mark(object):
     def __repr__(self):
         return "<Mark:%s>" % self.format().replace("\t", "\\t")
 
-    def __getattr__(self, name):
+    @property
+    def _test_mark(self):
         """ Used as a way for tests to check the internal value
             without exposing its name directly.
         """
-        if name == '_test_mark':
-            return self.__mark
-        else:
-            raise AttributeError(name)
+        return self.__mark
 
 markFuncEnd = Mark(Mark.FUNC_END)
 
-# Get the list of Python keywords and add a few common builtins
-kwlist = keyword.kwlist
-kwlist.extend(("True", "False", "None"))
+# The Python keywords and a few common builtins, written as non-symbol text
+# (a copy of the standard list, which is shared by every module using it)
+python_keywords = frozenset(keyword.kwlist + ["True", "False", "None"])
+if hasattr(token, 'ASYNC'):
+    # Python 3.5 and 3.6 report "async" and "await" as tokens of their own
+    # where they are keywords, without listing them as such (later versions
+    # do list them)
+    python_keywords |= frozenset(["async", "await"])
+
+# The soft keywords, only keywords in some contexts, whatever the version of
+# Python, for "--keywords=soft"
+soft_keywords = ('_', 'case', 'match', 'type')
+
+# The names written as non-symbol text: the Python keywords, plus those
+# given with --keywords
+kwlist = python_keywords
 
 strings_as_symbols = False
 
+# Strings naming symbols (dict keys, getattr() names, ...) are symbols, if set
+string_names = False
+
+# Files of this many bytes or more are indexed with the fast engine, if not 0
+fast_size = 10 * 1024 * 1024
+
+# The statistics of the run, when recorded (see pycscope.stats)
+run_stats = None
+
+
+class NoPhase(object):
+    """ Stands for the timing of a phase when no statistics are recorded.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+noPhase = NoPhase()
+
+
+def timed(name, nbytes=0, count=0):
+    """ Time a phase of the run, if its statistics are recorded; the bytes
+        and the number of objects handled can be set on the returned object
+        as the phase runs.
+    """
+    if run_stats is None:
+        return noPhase
+    return run_stats.phase(name, nbytes, count)
+
 def main(argv=None):
     """Parse command line args and act accordingly.
     """
-    global strings_as_symbols
+    global strings_as_symbols, string_names, kwlist, fast_size, run_stats
 
     if argv is None:
         argv = sys.argv
 
+    if argv[1:2] == ["serve"]:
+        from pycscope.serve import main as serve
+        return serve(argv[1:])
+
     # Parse the command line arguments
     try:
-        opts, args = getopt.getopt(argv[1:], "DRSVf:i:")
+        opts, args = getopt.getopt(argv[1:], "DRSVf:i:j:qu", ["cache=", "callgraph", "compress", "engine=",
+                                                               "exclude=", "fast=", "git", "gitignore", "keywords=",
+                                                               "profile=",
+                                                               "since=", "sqlite=", "stats=", "string-names",
+                                                               "watch"])
     except getopt.GetoptError:
         print(__usage__)
         return 2
@@ -104,6 +243,22 @@ def main(argv=None):
     debug = False
     recurse = False
     indexfn = "cscope.out"
+    engine = default_engine
+    jobs = 1
+    cachefn = None
+    update = False
+    invert = False
+    callgraph = False
+    compress = False
+    exclude = []
+    git = False
+    gitignore = False
+    since = None
+    sqlitefn = None
+    statsfn = None
+    profile = 0
+    watch = False
+    keywords = set()
     for o, a in opts:
         if o == "-D":
             debug = True
@@ -120,130 +275,868 @@ def main(argv=None):
         if o == "-i":
             with open(a) as f:
                 args.extend(x.rstrip() for x in f)
+        if o == "-j":
+            if not a.isdigit():
+                print(__usage__)
+                return 2
+            jobs = int(a) or multiprocessing.cpu_count()
+        if o == "-q":
+            invert = True
+        if o == "-u":
+            update = True
+        if o == "--cache":
+            cachefn = a
+        if o == "--callgraph":
+            callgraph = True
+        if o == "--compress":
+            compress = True
+        if o == "--engine":
+            if a not in engines:
+                print(__usage__)
+                return 2
+            engine = a
+        if o == "--exclude":
+            exclude.append(a)
+        if o == "--fast":
+            if not a.isdigit():
+                print(__usage__)
+                return 2
+            fast_size = int(a)
+        if o == "--git":
+            git = True
+        if o == "--gitignore":
+            gitignore = True
+        if o == "--keywords":
+            for name in a.split(","):
+                if name == "soft":
+                    keywords.update(soft_keywords)
+                elif name:
+                    keywords.add(name)
+        if o == "--profile":
+            if not a.isdigit():
+                print(__usage__)
+                return 2
+            profile = int(a)
+        if o == "--since":
+            git = True
+            since = a
+        if o == "--sqlite":
+            sqlitefn = a
+        if o == "--stats":
+            statsfn = a
+        if o == "--string-names":
+            string_names = True
+        if o == "--watch":
+            watch = True
+    kwlist = python_keywords | frozenset(keywords)
 
     # Search current dir by default
     if len(args) == 0:
         args = "."
 
+    ownStats = statsfn and (run_stats is None)
+    if ownStats:
+        from pycscope.stats import Stats
+        run_stats = Stats()
+
     # Parse the given list of files/dirs
     basepath = os.getcwd()
-    gen = genFiles(basepath, args, recurse)
+    changed = None
+    if git:
+        from pycscope.git import GitError, changedFiles, listFiles
+        try:
+            with timed('git'):
+                fnames, untracked = listFiles(basepath, args, recurse,
+                                              excludeMatcher(list(vcs_dirs) + exclude))
+                if since is not None:
+                    changed = set(os.path.join(basepath, path)
+                                  for path in changedFiles(basepath, since) | untracked)
+        except GitError as e:
+            print("pycscope.py: %s" % e)
+            if ownStats:
+                run_stats = None
+            return 1
+        gen = iter(fnames)
+    else:
+        gen = genFiles(basepath, args, recurse, exclude, gitignore)
+    if run_stats is not None:
+        gen = run_stats.timedIter('genFiles', gen)
+
+    # The settings the index lines are generated with
+    settings = "%s %s %s %s %s %s" % (__version__, engine, strings_as_symbols, string_names,
+                                      ",".join(sorted(kwlist - python_keywords)), fast_size)
+
+    cache = None
+    if cachefn:
+        from pycscope.cache import IndexCache
+        cache = IndexCache(os.path.join(basepath, cachefn), settings)
+
+    sections = None
+    if update or (since is not None):
+        # Files not changed since the cross-ref file was written keep their
+        # index lines from it; without one, or if it was written with other
+        # settings, everything is parsed.
+        sections = cache = IndexSections(basepath, settings, cache, changed)
+        if (not sections.load(indexfn)) and (since is not None):
+            # Expected of the first -u run, but not of a --since one
+            print("pycscope.py: %s: Not written by a -u or --since run with the same settings, "
+                  "parsing every file" % indexfn)
 
-    indexbuff, fnamesbuff = work(basepath, gen, debug)
+    try:
+        if watch:
+            from pycscope.watch import watchTree
+            files = None
+            if git:
+                # Ask git again for each rebuild
+                files = lambda: listFiles(basepath, args, recurse,
+                                          excludeMatcher(list(vcs_dirs) + exclude))[0]
+            watchTree(basepath, args, recurse, exclude, gitignore, cache,
+                      functools.partial(buildIndex, basepath, indexfn, debug=debug, engine=engine,
+                                        jobs=jobs, invert=invert, compress=compress,
+                                        sqlitefn=sqlitefn, callgraph=callgraph),
+                      files=files)
+        else:
+            buildIndex(basepath, indexfn, gen, debug, engine, jobs, cache, invert, compress,
+                       sqlitefn, callgraph, sections)
+    finally:
+        if cache is not None:
+            cache.close()
 
-    # Symbol data for the last file ends with a file mark
-    indexbuff.append("\n%s" % Mark(Mark.FILE))
+    if statsfn:
+        writeStats(run_stats, statsfn, basepath, engine, jobs, profile)
+        if ownStats:
+            run_stats = None
+
+    return 0
+
+
+def buildIndex(basepath, indexfn, gen, debug=False, engine=None, jobs=1, cache=None,
+               invert=False, compress=False, sqlitefn=None, callgraph=False, sections=None):
+    """ Write the cross-ref file for the files generated, along with its
+        inverted index if 'invert' is set, its symbol database if
+        'sqlitefn' names one, and its call graph if 'callgraph' is set.
+
+        Given the IndexSections the cache is made of, the state of the files
+        indexed is written too, for the cross-ref file to be updated;
+        otherwise any such state left by a previous run is removed, as it no
+        longer holds.
+
+        The files are written under temporary names, then renamed over the
+        old ones, so that they are never seen half written. The symbol
+        database is updated in place.
+    """
+    inverted = None
+    if invert:
+        from pycscope.inverted import InvertedIndex
+        inverted = InvertedIndex(compress)
+    graph = None
+    if callgraph:
+        from pycscope.callgraph import CallGraphBuilder
+        from pycscope.symtab import SymbolTable
+        graph = CallGraphBuilder(SymbolTable())
+    database = None
+    if sqlitefn:
+        from pycscope.symboldb import SymbolDatabase
+        database = SymbolDatabase(os.path.join(basepath, sqlitefn))
+
+    paths = [os.path.join(basepath, indexfn)]
+    if invert:
+        from pycscope.inverted import fileNames
+        paths.extend(os.path.join(basepath, fn) for fn in fileNames(indexfn))
+    if callgraph:
+        from pycscope.callgraph import fileName
+        paths.append(os.path.join(basepath, fileName(indexfn)))
+    statepath = os.path.join(basepath, stateFileName(indexfn))
+    if sections is not None:
+        paths.append(statepath)
+    tmppaths = ["%s.%d.tmp" % (path, os.getpid()) for path in paths]
+    try:
+        with open(tmppaths[0], 'wb') as fout:
+            streamIndex(basepath, fout, workChunks(basepath, gen, debug, engine, jobs, cache),
+                        inverted, compress, database, graph)
+        if database is not None:
+            with timed('sqlite'):
+                database.finish()
+        if inverted is not None:
+            with open(tmppaths[1], 'wb') as finv:
+                with open(tmppaths[2], 'wb') as fpost:
+                    inverted.write(finv, fpost)
+        if graph is not None:
+            with timed('callgraph'):
+                with open(tmppaths[3 if invert else 1], 'wb') as fgraph:
+                    graph.write(fgraph)
+        if sections is not None:
+            with open(tmppaths[-1], 'w') as fstate:
+                sections.write(fstate)
+        for tmppath, path in zip(tmppaths, paths):
+            replaceFile(tmppath, path)
+        if (sections is None) and os.path.exists(statepath):
+            os.remove(statepath)
+    finally:
+        if database is not None:
+            database.close()
+        for tmppath in tmppaths:
+            if os.path.exists(tmppath):
+                os.remove(tmppath)
+
+
+if hasattr(os, 'replace'):
+    replaceFile = os.replace
+else:
+    # Python 2, where renaming replaces files but on Windows
+    def replaceFile(src, dst):
+        if (sys.platform == 'win32') and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
 
-    if sys.hexversion < 0x03000000:
-        fout = open(os.path.join(basepath, indexfn), 'wb')
+
+def writeStats(stats, statsfn, basepath, engine, jobs, profile):
+    """ Write the statistics of the run as JSON, to standard output if the
+        file name is '-', with the profiles of the slowest files.
+    """
+    import json
+    from pycscope.stats import profileFile
+
+    report = stats.report(version=__version__, python=sys.version.split()[0],
+                          engine=engine or default_engine, jobs=jobs)
+    if profile:
+        report['profiles'] = [profileFile(basepath, fname, engine) for fname in stats.slowest(profile)]
+    if statsfn == '-':
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
     else:
-        fout = open(os.path.join(basepath, indexfn), 'w', newline='\n')
+        with open(os.path.join(basepath, statsfn), 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
 
-    writeIndex(basepath, fout, indexbuff, fnamesbuff)
-    fout.close()
 
-    return 0
+# The header of a cross-ref file: the base path, whether the index is not
+# compressed, and the offset of the trailer
+header_re = re.compile(br"cscope 15 ((?:(?! -).)*) (-c )?(?:-q \d{10} )?(\d{10})\n")
+
+
+def readIndex(fin):
+    """ Read a cross-ref file written by streamIndex(), opened in binary
+        mode, splitting its index at the file marks.
+
+        Returns the base path from the header and a dictionary of the index
+        lines of each file (following its file mark), by file name. The
+        lines of a compressed index are expanded.
+    """
+    contents = fin.read()
+
+    # The header is followed immediately by the first file mark
+    match = header_re.match(contents)
+    if match is None:
+        raise ValueError("Not a cross-ref file written by pycscope")
+    basepath = decoded(match.group(1))
+    header = match.group(0)[:-1]
+    if match.group(2) is None:
+        from pycscope.compress import expand
+    else:
+        expand = None
+
+    # The index ends with an empty file mark, followed by the trailer
+    filemark = encoded('\n%s' % Mark(Mark.FILE))
+    end = contents.rfind(filemark + b"\n1\n.\n0\n")
+    if end < len(header):
+        raise ValueError("Not a cross-ref file written by pycscope")
+
+    sections = {}
+    for section in contents[len(header):end].split(filemark)[1:]:
+        relpath, sep, lines = section.partition(b'\n\n')
+        if expand is not None:
+            lines = expand(lines)
+        sections[decoded(relpath)] = decoded(lines)
+    return basepath, sections
 
 
 def writeIndex(basepath, fout, indexbuff, fnamesbuff):
     """Write the index buffer to the output file.
     """
     # Write the header and index
-    index = ''.join(indexbuff)
-    index_len = len(index.encode() if isinstance(u'' , str) else index)
-    hdr_len = len(basepath) + 25
-    fout.write("cscope 15 %s -c %010d" % (basepath, hdr_len + index_len))
-    fout.write(index)
+    with timed('write', count=len(indexbuff)) as phase:
+        index = ''.join(indexbuff)
+        index_len = encodedLen(index)
+        hdr_len = len(basepath) + 25
+        fout.write("cscope 15 %s -c %010d" % (basepath, hdr_len + index_len))
+        fout.write(index)
+
+        fout.write(trailer(fnamesbuff))
+        phase.nbytes = hdr_len + index_len
+
+
+def streamIndex(basepath, fout, chunks, inverted=None, compress=False, database=None,
+                callgraph=None):
+    """ Write the index to the output file as the chunks of each file are
+        generated, so that only one file's chunk is held in memory at a
+        time.
 
-    # Write trailer info
+        The offset of the trailer is only known once the whole index is
+        written, so the header is written with a placeholder for it, which
+        is patched afterwards. The output file must be binary and seekable.
+
+        Given an inverted index, the postings of the symbols are added to
+        it along the way, and the header notes its number of terms.
+
+        Compressed, the index lines are written with cscope's keyword and
+        digraph compression, and the header lacks the -c option.
+
+        Given a symbol database, the index lines of each file are written
+        to it too, and given a call graph, the calls marked in the index
+        lines of each file are added to it.
+    """
+    fnamesbuff = []
+    if compress:
+        from pycscope.compress import compressIndex
+
+    # Write the header, up to the offset of the trailer
+    header = "cscope 15 %s " % basepath
+    if not compress:
+        header += "-c "
+    fout.write(encoded(header))
+    if inverted is not None:
+        fout.write(b"-q ")
+        terms_pos = fout.tell()
+        fout.write(b"0000000000 ")
+        header += "-q %010d " % 0
+    offset_pos = fout.tell()
+    fout.write(b"0000000000")
+    offset = encodedLen(header) + 10
+
+    # Write the index
+    for fileindexbuff, filefnamesbuff in chunks:
+        if (database is not None) and filefnamesbuff:
+            with timed('sqlite', count=1):
+                database.addFile(filefnamesbuff[0], ''.join(fileindexbuff[1:]))
+        with timed('write', count=len(fileindexbuff)) as phase:
+            data = encoded(''.join(fileindexbuff))
+            if callgraph is not None:
+                callgraph.add(data)
+            if compress:
+                data = compressIndex(data)
+            if inverted is not None:
+                inverted.add(data, offset)
+            offset += len(data)
+            fout.write(data)
+            fnamesbuff.extend(filefnamesbuff)
+            phase.nbytes = len(data)
+
+    # Symbol data for the last file ends with a file mark
+    data = encoded("\n%s" % Mark(Mark.FILE))
+    offset += len(data)
+    fout.write(data)
+
+    fout.write(encoded(trailer(fnamesbuff)))
+
+    # Patch the offset of the trailer into the header, which points past
+    # the newline the trailer starts with
+    end_pos = fout.tell()
+    if inverted is not None:
+        fout.seek(terms_pos)
+        fout.write(encoded("%010d" % len(inverted)))
+    fout.seek(offset_pos)
+    fout.write(encoded("%010d" % (offset + 1)))
+    fout.seek(end_pos)
+
+
+def encoded(s):
+    """ A string, encoded as written to the output file.
+    """
+    return s.encode() if isinstance(u'' , str) else s
+
+
+def decoded(s):
+    """ A string, decoded as read from the output file.
+    """
+    return s.decode() if isinstance(u'' , str) else s
+
+
+def encodedLen(s):
+    """ The length in bytes of a string, as written to the output file.
+    """
+    return len(encoded(s))
+
+
+def trailer(fnamesbuff):
+    """ The trailer of the cross-ref file, listing the names of the files.
+    """
     fnames = '\n'.join(fnamesbuff) + '\n'
-    fout.write("\n1\n.\n0\n")
-    fout.write("%d\n" % len(fnamesbuff))
-    fout.write("%d\n" % len(fnames))
-    fout.write(fnames)
+    return "\n1\n.\n0\n%d\n%d\n%s" % (len(fnamesbuff), len(fnames), fnames)
 
 
-def work(basepath, gen, debug):
+def work(basepath, gen, debug, engine=None, jobs=1, cache=None):
     """ The actual work of parsing the files.
+
+        With more than one job, the files are parsed by a pool of worker
+        processes. Their results are gathered in the order the files were
+        generated, so the index is the same as when parsing serially.
+
+        With a cache, only the files without cached index lines are parsed.
     """
 
     # Create the buffer to store the output (list of strings)
     indexbuff = []
-    indexbuff_len = 0
     fnamesbuff = []
 
-    for fname in gen:
-        try:
-            indexbuff_len = parseFile(basepath, fname, indexbuff, indexbuff_len, fnamesbuff, dump=debug)
-        except (SyntaxError, AssertionError) as e:
-            print("pycscope.py: %s: Line %s: %s" % (e.filename, e.lineno, e))
-        except Exception as e:
-            print("pycscope.py: %s: %s" % (fname, e))
+    for fileindexbuff, filefnamesbuff in workChunks(basepath, gen, debug, engine, jobs, cache):
+        indexbuff.extend(fileindexbuff)
+        fnamesbuff.extend(filefnamesbuff)
 
     return indexbuff, fnamesbuff
 
 
+def workChunks(basepath, gen, debug, engine=None, jobs=1, cache=None):
+    """ Generate the index and file name buffers of each file in turn, as
+        work() does, reporting the errors along the way.
+    """
+    if jobs > 1:
+        pool = multiprocessing.Pool(jobs, initWorker,
+                                    (strings_as_symbols, string_names, kwlist, fast_size,
+                                     run_stats is not None))
+    else:
+        pool = None
+
+    if cache is not None:
+        chunks = cachedChunks(basepath, gen, debug, engine, cache, pool, jobs * 16)
+    else:
+        args = ((basepath, fname, debug, engine, None) for fname in gen)
+        if pool is not None:
+            # Hand out the files in small batches to cut down on the
+            # overhead of passing them to the workers and back.
+            chunks = pool.imap(workFile, args, 8)
+        else:
+            chunks = (workFile(arg) for arg in args)
+
+    try:
+        for fname, fileindexbuff, filefnamesbuff, error, filestats in chunks:
+            if error:
+                print(error)
+            if filestats is not None:
+                # Files that cannot be read have no file name buffer
+                run_stats.addFile(fname, filestats)
+            yield fileindexbuff, filefnamesbuff
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+def stateFileName(indexfn):
+    """ The name the state of the files indexed is written under, for a
+        given cross-ref file name.
+    """
+    if indexfn == "cscope.out":
+        return "cscope.up.out"
+    return indexfn + ".up"
+
+
+class IndexSections(object):
+    """ The index lines of the files in an existing cross-ref file, which
+        work() uses as a cache, for the files that have not been modified
+        since the cross-ref file was written. Files missing from it, or
+        modified since, are looked up in the given cache, if any.
+
+        Along with the cross-ref file, the settings it was written with and
+        the modification time and size of each file, as they were before the
+        file was read, are written to its state file, as JSON. Its sections
+        are only used if the settings are the same, and for the files whose
+        modification time and size are unchanged.
+
+        If the set of the normalized full paths of the files changed since
+        is given, as git tells it, modification times are not looked at.
+    """
+    def __init__(self, basepath, settings, cache=None, changed=None):
+        self.basepath = basepath
+        self.settings = settings
+        self.cache = cache
+        self.changed = changed
+        self.sections = {}      # Index lines of the files, by full path
+        self.files = {}         # Modification time and size of the files, by full path
+        self.checked = 0        # When the files were last looked at
+        self.now = time.time()
+        self.state = {}         # Modification time and size of the files indexed now
+
+    def load(self, indexfn):
+        """ Read the sections of a cross-ref file, if it was written for
+            the same base path and with the same settings, returning whether
+            it was.
+        """
+        try:
+            with open(os.path.join(self.basepath, stateFileName(indexfn)), 'r') as fstate:
+                state = json.load(fstate)
+            if state['settings'] != self.settings:
+                return False
+            with open(os.path.join(self.basepath, indexfn), 'rb') as fin:
+                indexpath, sections = readIndex(fin)
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return False
+        if indexpath != self.basepath:
+            return False
+        self.sections = dict((os.path.join(self.basepath, relpath), lines)
+                             for relpath, lines in sections.items())
+        self.files = state['files']
+        self.checked = state['checked']
+        return True
+
+    def lookup(self, fullpath):
+        try:
+            st = os.stat(fullpath)
+        except OSError:
+            # Let the parsing report the error
+            return None, None, None
+        key = [st.st_mtime, st.st_size]
+
+        lines = self.sections.get(fullpath)
+        if lines is not None:
+            if self.changed is not None:
+                unchanged = os.path.normpath(fullpath) not in self.changed
+            else:
+                # A file modified within a second of when it was looked at
+                # could have been modified again without its modification
+                # time changing.
+                unchanged = (self.files.get(fullpath) == key) and (key[0] < self.checked - 1)
+            if unchanged:
+                self.state[fullpath] = key
+                return lines, None, None
+
+        info = data = None
+        if self.cache is not None:
+            lines, info, data = self.cache.lookup(fullpath)
+            if lines is not None:
+                self.state[fullpath] = key
+                return lines, None, None
+        return None, (key, info), data
+
+    def store(self, fullpath, info, lines):
+        key, info = info
+        self.state[fullpath] = key
+        if (info is not None) and (self.cache is not None):
+            self.cache.store(fullpath, info, lines)
+
+    def write(self, fstate):
+        """ Write the state of the files indexed.
+        """
+        json.dump({'settings': self.settings, 'checked': self.now, 'files': self.state}, fstate)
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+
+
+def cachedChunks(basepath, gen, debug, engine, cache, pool=None, ahead=0):
+    """ Generate the chunks of the files, as workFile() returns them, taking
+        the index lines of the cached files from the cache and parsing the
+        others, whose index lines are stored.
+
+        Files are looked up as the chunks are consumed, so that only the
+        cached lines of a few files are held at a time: with a pool of
+        worker processes, up to 'ahead' files are looked up while the first
+        of them is being parsed. The contents read to look up a file are
+        handed on to be parsed.
+    """
+    pending = collections.deque()   # Full path, info and chunk of each file
+    for fname in gen:
+        fullpath = os.path.join(basepath, fname)
+        lines, info, data = cache.lookup(fullpath)
+        if lines is not None:
+            chunk = (fname, [fileMark(fname), lines], [fname], None, None)
+        elif pool is None:
+            chunk = workFile((basepath, fname, debug, engine, data))
+        else:
+            chunk = pool.apply_async(workFile, ((basepath, fname, debug, engine, data),))
+        pending.append((fullpath, info, chunk))
+        while pending and ((len(pending) > ahead) or (type(pending[0][2]) is tuple) or
+                           pending[0][2].ready()):
+            yield storeChunk(cache, *pending.popleft())
+    while pending:
+        yield storeChunk(cache, *pending.popleft())
+
+
+def storeChunk(cache, fullpath, info, chunk):
+    """ Store the index lines of a file that was parsed into the cache,
+        returning its chunk.
+    """
+    if type(chunk) is not tuple:
+        # Parsed by a worker process
+        chunk = chunk.get()
+    fileindexbuff, error = chunk[1], chunk[3]
+    if (error is None) and (info is not None):
+        # Skip the file mark, the file could be named differently later
+        cache.store(fullpath, info, ''.join(fileindexbuff[1:]))
+    return chunk
+
+
+def initWorker(strings, names, keywords, fast, stats=False):
+    """ Set up a worker process with the settings of the parent process.
+    """
+    global strings_as_symbols, string_names, kwlist, fast_size, run_stats
+    strings_as_symbols = strings
+    string_names = names
+    kwlist = keywords
+    fast_size = fast
+    if stats:
+        from pycscope.stats import Stats
+        run_stats = Stats()
+
+
+def workFile(args):
+    """ Parse one file into its own chunk of the index, given its contents
+        if they were read already, returning its name,
+        the index and file name buffers along with an error message, if any,
+        and the statistics of the file, if recorded.
+    """
+    basepath, fname, debug, engine, data = args
+    indexbuff = []
+    fnamesbuff = []
+    error = None
+    filestats = None
+    if run_stats is not None:
+        run_stats.beginFile()
+    try:
+        parseFile(basepath, fname, indexbuff, 0, fnamesbuff, dump=debug, engine=engine, data=data)
+    except (SyntaxError, AssertionError) as e:
+        error = "pycscope.py: %s: Line %s: %s" % (e.filename, e.lineno, e)
+    except Exception as e:
+        error = "pycscope.py: %s: %s" % (fname, e)
+    if run_stats is not None:
+        filestats = run_stats.endFile()
+    return fname, indexbuff, fnamesbuff, error, filestats
+
+
 def isPython(name):
     # Is this a python file?
     return name[-3:] == ".py"
 
 
-def genFiles(basepath, args, recurse):
+# Directories of version control systems, which are never searched
+vcs_dirs = ("CVS", "RCS", ".bzr", ".git", ".hg", ".svn")
+
+
+def excludeMatcher(patterns):
+    """ A function telling whether a file or directory is to be skipped,
+        given its name and its path, for the given shell patterns: those
+        with a slash are matched against the path, others against the name.
+    """
+    names = [fnmatch.translate(p) for p in patterns if '/' not in p]
+    paths = [fnmatch.translate(p) for p in patterns if '/' in p]
+    nameMatch = re.compile('|'.join(names)).match if names else None
+    pathMatch = re.compile('|'.join(paths)).match if paths else None
+
+    def excluded(name, path):
+        if nameMatch is not None and nameMatch(name):
+            return True
+        if pathMatch is not None and pathMatch(os.path.normpath(path).replace(os.sep, '/')):
+            return True
+        return False
+    return excluded
+
+
+def listDir(dirpath):
+    """ List the entries of a directory, giving the name of each one,
+        whether it is a directory (following symbolic links), and whether
+        it is a symbolic link.
+    """
+    if scandir is None:
+        for name in os.listdir(dirpath):
+            fullpath = os.path.join(dirpath, name)
+            isdir = os.path.isdir(fullpath)
+            yield name, isdir, isdir and os.path.islink(fullpath)
+    else:
+        # The type of most entries is known without a stat, and the whole
+        # directory is read first so that it is closed before recursing
+        for entry in list(scandir(dirpath)):
+            yield entry.name, entry.is_dir(), entry.is_symlink()
+
+
+def genFiles(basepath, args, recurse, exclude=(), gitignore=False, dirs=None):
     """ A generator for returning all the files that need to be parsed.
         Caller is required to provide synchronization.
+
+        Files and directories matching the 'exclude' shell patterns are
+        skipped, as are those git ignores if 'gitignore' is set, and the
+        directories of version control systems.
+
+        The full paths of the directories searched are appended to 'dirs',
+        if given.
     """
+    excluded = excludeMatcher(list(vcs_dirs) + list(exclude))
     for name in args:
-        if os.path.isdir(os.path.join(basepath, name)):
-            for fname in parseDir(basepath, name, recurse):
+        fullpath = os.path.join(basepath, name)
+        if os.path.isdir(fullpath):
+            dirpath = os.path.normpath(fullpath)
+            ignores = None
+            if gitignore:
+                from pycscope.gitignore import rulesFor
+                ignores = rulesFor(dirpath)
+            for fname in parseDir(basepath, name, recurse, excluded, ignores, dirs=dirs):
                 yield fname
         else:
             # Don't return the file name if it's not python source
-            if isPython(name):
+            if isPython(name) and not excluded(os.path.basename(name), name):
                 yield name
 
 
-def parseDir(basepath, relpath, recurse):
+def parseDir(basepath, relpath, recurse, excluded=None, ignores=None, realpaths=(), dirs=None):
     """ A generator that parses all files in the directory and
         recurses into subdirectories if requested.
         Caller is required to provide synchronization.
+
+        The real paths of the directories being searched are kept, so as
+        not to follow a symbolic link back into one of them.
     """
-    dirpath = os.path.join(basepath, relpath)
-    for name in os.listdir(dirpath):
-        fullpath = os.path.join(dirpath, name)
-        if os.path.isdir(fullpath) and recurse:
-            for fname in parseDir(basepath, os.path.join(relpath, name), recurse):
+    dirpath = os.path.normpath(os.path.join(basepath, relpath))
+    if not realpaths:
+        realpaths = (os.path.realpath(dirpath),)
+    if dirs is not None:
+        dirs.append(dirpath)
+    for name, isdir, islink in listDir(dirpath):
+        path = os.path.join(relpath, name)
+        if (excluded is not None) and excluded(name, path):
+            continue
+        if (ignores is not None) and ignores.ignored(os.path.join(dirpath, name), isdir):
+            continue
+        if isdir and recurse:
+            if islink:
+                realpath = os.path.realpath(os.path.join(dirpath, name))
+                prefix = realpath.rstrip(os.sep) + os.sep
+                if any((r == realpath) or r.startswith(prefix) for r in realpaths):
+                    # A symbolic link loop
+                    continue
+            else:
+                realpath = os.path.join(realpaths[-1], name)
+            subignores = ignores
+            if ignores is not None:
+                subignores = ignores.enter(os.path.join(dirpath, name))
+            for fname in parseDir(basepath, path, recurse, excluded, subignores,
+                                  realpaths + (realpath,), dirs):
                 yield fname
         else:
             if isPython(name):
-                yield os.path.join(relpath, name)
+                yield path
+
+
+def fileMark(relpath):
+    """ The index line marking the start of a file.
+    """
+    return "\n%s%s\n\n" % (Mark(Mark.FILE), relpath)
 
 
-def parseFile(basepath, relpath, indexbuff, indexbuff_len, fnamesbuff, dump=False):
+def parseFile(basepath, relpath, indexbuff, indexbuff_len, fnamesbuff, dump=False, engine=None,
+              data=None):
     """Parses a source file and puts the resulting index into the buffer.
        Caller is required to provide synchronization.
+
+       The contents of the file can be given as bytes, if already read.
     """
     # Open the file and get the contents
     fullpath = os.path.join(basepath, relpath)
-    bestopen = getattr(tokenize, 'open', open)
-    with bestopen(fullpath) as f:
-        filecontents = f.read()
+    with timed('read') as phase:
+        if data is None:
+            filecontents, size = readSource(fullpath)
+        else:
+            filecontents, size = decodeSource(data), len(data)
+        phase.nbytes = size
     # Add the file mark to the index
     fnamesbuff.append(relpath)
-    indexbuff.append("\n%s%s\n\n" % (Mark(Mark.FILE), relpath))
+    indexbuff.append(fileMark(relpath))
     indexbuff_len += 1
 
+    if fast_size and (size >= fast_size):
+        # Too big to be worth parsing in full
+        engine = 'fast'
+
     # Add path info to any syntax errors in the source files
     if filecontents:
         try:
-            indexbuff_len = parseSource(filecontents, indexbuff, indexbuff_len, dump)
+            indexbuff_len = parseSource(filecontents, indexbuff, indexbuff_len, dump, engine)
         except (SyntaxError, AssertionError) as e:
             e.filename = fullpath
             raise e
 
     return indexbuff_len
 
+# Files of this many bytes or more are mapped into memory to be read,
+# rather than read into the buffer
+mmap_size = 1024 * 1024
+
+# The buffer files are read into, grown as needed and reused for each file
+read_buffer = bytearray(64 * 1024)
+
+def readBytes(fd, size):
+    """ Read a file from its descriptor, expected to be of the given size,
+        into the buffer, and return a view of its contents.
+    """
+    global read_buffer
+    if size >= len(read_buffer):
+        # Room to spare, to find the end of the file in one read
+        read_buffer = bytearray(size + 4096)
+    view = memoryview(read_buffer)
+    length = 0
+    with io.FileIO(fd, closefd=False) as f:
+        while True:
+            count = f.readinto(view[length:])
+            length += count or 0
+            if length < len(read_buffer):
+                # A short read: the end of the file
+                break
+            # The file grew since it was stat'ed
+            read_buffer = read_buffer + bytearray(len(read_buffer))
+            view = memoryview(read_buffer)
+    return view[:length]
+
+if isinstance(u'', str):
+    def decodeSource(data):
+        """ Decode the contents of a source file, as tokenize.open() would,
+            making its newlines "\n".
+        """
+        head = bytes(data[:256])
+        text = None
+        if (head[:3] != codecs.BOM_UTF8) and (b'coding' not in b'\n'.join(head.split(b'\n', 2)[:2])):
+            try:
+                text = codecs.utf_8_decode(data, 'strict', True)[0]
+            except UnicodeDecodeError:
+                # Reported as tokenize.open() would
+                pass
+        if text is None:
+            encoding = tokenize.detect_encoding(io.BytesIO(bytes(data)).readline)[0]
+            text = codecs.decode(data, encoding)
+        if '\r' in text:
+            # Universal newlines
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
+else:
+    def decodeSource(data):
+        """ The contents of a source file, as bytes, with its newlines made
+            "\n".
+        """
+        text = data.tobytes() if isinstance(data, memoryview) else data[:]
+        if '\r\n' in text:
+            text = text.replace('\r\n', '\n')
+        return text
+
+def readSource(fullpath):
+    """ Read a source file in one go, returning its text, decoded in Python
+        3, with its newlines made "\n", and its size in bytes.
+
+        Files are read into a buffer reused for each one, but for large ones
+        which are mapped into memory instead.
+    """
+    fd = os.open(fullpath, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        size = os.fstat(fd).st_size
+        if size >= mmap_size:
+            data = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+            try:
+                return decodeSource(data), size
+            finally:
+                data.close()
+        return decodeSource(readBytes(fd, size)), size
+    finally:
+        os.close(fd)
+
 nodeNames = token.tok_name
-nodeNames.update(symbol.sym_name)
+if symbol is not None:
+    nodeNames.update(symbol.sym_name)
 
 def replaceNodeType(treeList):
     """ Replaces the 0th element in the list with the name
@@ -285,6 +1178,10 @@ def dumpCst(cst, stream=None):
 class Symbol(object):
     """ A representation of a what cscope considers a 'symbol'.
     """
+    __slots__ = ('__mark', '__name')
+
+    isSymbol = True
+
     def __init__(self, name, mark=None):
         """ Constructor, which ensures an actual name ("string") is given.
         """
@@ -313,51 +1210,38 @@ class Symbol(object):
     def __repr__(self):
         return "<Symbol:%s>" % self.format()
 
-    def __getattr__(self, name):
+    @property
+    def _test_mark(self):
         """ Used as a way for tests to check the internal value
             without exposing its name directly.
         """
-        if name == '_test_mark':
-            return self.__mark._test_mark
-        elif name == '_test_name':
-            return self.__name
-        else:
-            print("Symbol(): does not have attribute <%s>" % name)
-            raise AttributeError(name)
-
-    def __coerce__(self, other):
-        """ We do not implement coercion; we define this routine so
-            that the interpretter won't invoke __getattr__() to try to
-            find it.
-        """
-        return NotImplemented
+        return self.__mark._test_mark
 
-    def __nonzero__(self):
-        """ Defined so that the interpretter won't invoke
-            __getattr__() to try to find it.
-        """
-        return True
-
-    def __bool__(self):
-        """ Defined so that the interpretter won't invoke
-            __getattr__() to try to find it (Python 3).
+    @property
+    def _test_name(self):
+        """ Used as a way for tests to check the internal value
+            without exposing its name directly.
         """
-        return True
+        return self.__name
 
     def hasMark(self, mark):
         """ Does this symbol have a given mark?
         """
-        return self.__mark == mark
+        return self.__mark is mark
 
 
 class NonSymbol(object):
     """ A representation of a what cscope considers a 'non-symbol' text.
     """
+    __slots__ = ('__text',)
+
+    isSymbol = False
+
     def __init__(self, val):
         """ Constructor, whatever we are given we'll store it as a string.
         """
         assert val and (type(val) == str), "Must have an actual string."
-        self.__text = str(val)
+        self.__text = val
 
     def __add__(self, other):
         """ Add text to the stored string.
@@ -379,46 +1263,51 @@ class NonSymbol(object):
 
 
 class Line(object):
+    __slots__ = ('lineno', '__contents', '__hasSymbol')
+
     def __init__(self, num):
         assert ((type(num) == int) or (type(num) == long)) and num > 0, "Requires a positive, non-zero integer for a line number"
         self.lineno = num
         self.__contents = []    # List of Symbol and NonSymbol objects
         self.__hasSymbol = False
 
-    def __getattr__(self, name):
+    @property
+    def _test_contents(self):
         """ Used as a way for tests to check the internal value
             without exposing its name directly.
         """
-        if name == '_test_contents':
-            return self.__contents
-        elif name == '_test_hasSymbol':
-            return self.__hasSymbol
-        else:
-            raise AttributeError(name)
+        return self.__contents
+
+    @property
+    def _test_hasSymbol(self):
+        """ Used as a way for tests to check the internal value
+            without exposing its name directly.
+        """
+        return self.__hasSymbol
 
     def __add__(self, other):
         ''' Add a Symbol() or a NonSymbol() to the contents of this line
         '''
-        assert isinstance(other, Symbol) or isinstance(other, NonSymbol), "Can only add Symbol or NonSymbol objects"
-
-        global markFuncEnd
+        assert type(other) in (Symbol, NonSymbol), "Can only add Symbol or NonSymbol objects"
 
-        if self.__contents and isinstance(other, Symbol) and other.hasMark(markFuncEnd):
+        contents = self.__contents
+        if not contents:
+            self.__hasSymbol = other.isSymbol
+            contents.append(other)
+        elif other.isSymbol and other.hasMark(markFuncEnd):
             # If we have a function end marker, then we need to make
             # sure it is preceded by a NonSymbol to preserve
             # alternating lines of NonSymbol and then Symbol.
-            if isinstance(self.__contents[-1], Symbol):
-                self.__contents.append(NonSymbol(' '))
+            if contents[-1].isSymbol:
+                contents.append(NonSymbol(' '))
             self.__hasSymbol = True
-            self.__contents.append(other)
-        elif self.__contents \
-                and ((isinstance(self.__contents[-1], NonSymbol) and isinstance(other, NonSymbol))
-                     or (isinstance(self.__contents[-1], Symbol) and isinstance(other, Symbol))):
-            self.__contents[-1] += other
+            contents.append(other)
+        elif contents[-1].isSymbol == other.isSymbol:
+            contents[-1] += other
         else:
-            if isinstance(other, Symbol):
+            if other.isSymbol:
                 self.__hasSymbol = True
-            self.__contents.append(other)
+            contents.append(other)
         return self
     __iadd__ = __add__
 
@@ -474,12 +1363,100 @@ class Line(object):
     def __repr__(self):
         return "<Line:%s>" % self.format().replace("\n", "\\n")
 
-    def __coerce__(self, other):
-        """ We do not implement coercion; we define this routine so
-            that the interpretter won't invoke __getattr___() to try to
-            find it.
+
+class LineBuilder(object):
+    """ Builds the index lines of a source line straight from its tokens,
+        giving the same output as formatting a Line holding a Symbol or a
+        NonSymbol for each of them.
+
+        The tokens of the current run of symbols or of non-symbol text are
+        gathered until a token of the other kind comes in, when the run is
+        written out as an index line.
+    """
+    __slots__ = ('lineno', 'buff', 'run', 'isSymbol', 'mark', 'hasSymbol')
+
+    def __init__(self, num):
+        assert ((type(num) == int) or (type(num) == long)) and num > 0, "Requires a positive, non-zero integer for a line number"
+        self.lineno = num
+        self.buff = []          # The index lines written out so far
+        self.run = []           # The tokens of the current run
+        self.isSymbol = None    # The kind of the current run, if any
+        self.mark = None        # The mark of the current run of symbols
+        self.hasSymbol = False
+
+    def flush(self, nextIsSymbol):
+        """ Write out the current run as an index line.
+        """
+        if self.isSymbol:
+            s = ''.join(self.run)
+            if self.mark:
+                s = "\t%s%s" % (self.mark, s)
+            if not self.buff:
+                # The line number must be placed on its own line, with a
+                # trailing blank, when followed by a symbol
+                self.buff.append("%d " % self.lineno)
+            self.buff.append(s)
+        elif self.run:
+            s = ' '.join(self.run)
+            if not self.buff:
+                # The line number must be placed on the same line as
+                # non-symbol text following it
+                s = "%d %s" % (self.lineno, s)
+            elif s != ' ':
+                # Separate the text from the previous symbol line
+                s = ' ' + s
+            if nextIsSymbol and (s != ' '):
+                # Separate the text from the next symbol line
+                s += ' '
+            self.buff.append(s)
+
+    def addSymbol(self, name, mark=None):
+        """ Add a symbol, with an optional mark.
+        """
+        if self.isSymbol:
+            assert (mark or '') == (self.mark or ''), "Symbols must be marked the same."
+            self.run.append(name)
+        else:
+            self.flush(True)
+            self.isSymbol = True
+            self.mark = mark
+            self.run = [name]
+            self.hasSymbol = True
+
+    def addNonSymbol(self, text):
+        """ Add non-symbol text.
         """
-        return NotImplemented
+        if self.isSymbol is False:
+            self.run.append(text)
+        else:
+            self.flush(False)
+            self.isSymbol = False
+            self.run = [text]
+
+    def addFuncEnd(self):
+        """ Mark the end of a function, which must be preceded by non-symbol
+            text to preserve alternating lines of non-symbol text and then
+            symbols.
+        """
+        if self.isSymbol:
+            self.addNonSymbol(' ')
+        self.flush(True)
+        self.isSymbol = True
+        self.mark = Mark.FUNC_END
+        self.run = ['']
+        self.hasSymbol = True
+
+    def format(self):
+        """ Format this source line (that has a symbol) as individual
+            strings representing lines in the Cscope database.
+        """
+        if not self.hasSymbol:
+            return ''
+        self.flush(False)
+        self.isSymbol = None
+        self.run = []
+        return "\n".join(self.buff) + "\n\n"
+    __str__ = format
 
 
 if sys.hexversion < 0x03000000:
@@ -504,48 +1481,70 @@ class Context(object):
         Cscope uses Marks to help it understand what a symbol is for. As the
         CST tree is processed, often we'll look ahead into the CST tree to
         associate a Mark with a Symbol before we have processed that
-        Symbol. The dictionary of Marks encapsulates that state.
+        Symbol. The Marks are kept by the (line, column) position of the
+        terminals, sorted, and taken in order as the terminals are
+        processed, so that the tree need not be kept alive for them.
     '''
     # Buffer of lines in the Cscope database (individual strings in a list)
     def __init__(self):
         self.buff = []              # The accumlated list of lines with symbols
-        self.line = Line(1)         # The current line being processed
-        self.marks = {}             # Association of CST tuples to a Mark
+        self.line = LineBuilder(1)  # The current line being processed
+        self.markPositions = []     # Positions of the CST terminals marked, sorted
+        self.markValues = []        # The Marks of those terminals
+        self.markCursor = 0         # Index of the next Mark to take
         self.indent_lvl = 0         # Indentation level, used to track outer fn
         self.func_def_lvl = -1      # Function definition level, to track outer
         self.import_cnt = 0         # Number of import statements to expect
         self.import_name = False    # Handling an import ... statement (not from ... import ...)
-        self.tests = {}             # List of CST test objects tracked for assignment
+        self.tests = set()          # Positions of the CST test objects tracked for assignment
+        self.decorators = set()     # Positions of the decorator expressions marked already
         self.power_do_assignment = False
 
     def setMark(self, tup, mark):
-        ''' Add a mark to the dictionary for the given tuple
+        ''' Add a mark for the given tuple, which has not been processed yet
         '''
-        idx = id(tup)
-        assert idx not in self.marks
         assert tup[0] in valid_tokens_for_marks, "Expected one of %s, found %s" % ([token.tok_name[t] for t in valid_tokens_for_marks], tup)
-        self.marks[idx] = mark
-
-    def getMark(self, tup):
-        ''' Get the mark associated with the given tuple. This is a one shot
-            deal, as we delete the association from the dictionary to prevent
-            unnecessary accumlation of these associations given we never
-            rewalk the tree (one pass only).
+        pos = (tup[2], tup[3])
+        positions = self.markPositions
+        if (not positions) or (positions[-1] < pos):
+            positions.append(pos)
+            self.markValues.append(mark)
+        else:
+            i = bisect.bisect_left(positions, pos, self.markCursor)
+            assert positions[i] != pos
+            positions.insert(i, pos)
+            self.markValues.insert(i, mark)
+
+    def takeMark(self, tup):
+        ''' Take the mark of the given tuple, if any. This is a one shot
+            deal, as the marks are taken in the order of the terminals, the
+            marks of terminals never processed being dropped on the way.
         '''
-        idx = id(tup)
-        assert idx in self.marks
-        mark = self.marks[idx]
-        del(self.marks[idx])
+        pos = (tup[2], tup[3])
+        positions = self.markPositions
+        end = len(positions)
+        cursor = self.markCursor
+        while (cursor < end) and (positions[cursor] < pos):
+            cursor += 1
+        mark = None
+        if (cursor < end) and (positions[cursor] == pos):
+            mark = self.markValues[cursor]
+            cursor += 1
+        if cursor == end:
+            del positions[:]
+            del self.markValues[:]
+            cursor = 0
+        self.markCursor = cursor
         return mark
 
     def commit(self, lineno=None):
         ''' Commit a processed souce line to the buffer
         '''
-        line = str(self.line)
+        line = self.line.format()
         if line:
             self.buff.append(line)
         if lineno:
-            self.line = Line(lineno)
+            self.line = LineBuilder(lineno)
         else:
             self.line = None
 
@@ -554,7 +1553,7 @@ def isNamedFuncCall(cst, cst_len):
     """ Figure out if this CST sub-tree represents a named function call;
         that is, one which looks like name(), or name(arg,arg=1).
     """
-    assert (cst[0] == symbol.power)
+    assert (cst[0] == power_expr)
     if cst_len < 3:
         return False
 
@@ -569,7 +1568,7 @@ def isTrailerFuncCall(cst, idx, cst_len):
         call; that is, one which looks like name.name(), or
         name.name(arg,arg=1).
     """
-    assert (cst[0] == symbol.power)
+    assert (cst[0] == power_expr)
     assert (idx < (cst_len - 1))
 
     return (cst[idx][0] == symbol.trailer) \
@@ -579,6 +1578,36 @@ def isTrailerFuncCall(cst, idx, cst_len):
             and (cst[idx + 1][1][0] == token.LPAR) \
             and (cst[idx + 1][-1][0] == token.RPAR)
 
+def testPosition(cst):
+    """ The position of a test CST tuple: its type and the position of its
+        first terminal.
+    """
+    tup = cst
+    while token.ISNONTERMINAL(tup[0]):
+        tup = tup[1]
+    return (cst[0], tup[2], tup[3])
+
+def decoratorExpr(cst):
+    """ Find the power expression of a decorator given as an expression
+        (Python 3.9 and later), if it is a dotted name, optionally called,
+        like the decorators of the older grammar. Returns None otherwise.
+    """
+    while cst[0] != power_expr:
+        if (len(cst) != 2) or not token.ISNONTERMINAL(cst[1][0]):
+            return None
+        cst = cst[1]
+    if (cst[1][0] != symbol.atom) or (len(cst[1]) != 2) or (cst[1][1][0] != token.NAME):
+        return None
+    for i in range(2, len(cst)):
+        trailer = cst[i]
+        if trailer[0] != symbol.trailer:
+            return None
+        if (trailer[1][0] == token.DOT) and (trailer[2][0] == token.NAME):
+            continue
+        if (i != len(cst) - 1) or (trailer[1][0] != token.LPAR):
+            return None
+    return cst
+
 def markTestlist(ctx, cst):
     assert (cst[0] == tse)
 
@@ -589,10 +1618,13 @@ def markTestlist(ctx, cst):
             continue
         if cst[i][0] not in test_or_star_expr:
             break
-        ctx.tests[id(cst[i])] = cst[i]
+        ctx.tests.add(testPosition(cst[i]))
 
 
-if sys.hexversion < 0x02070000:
+if symbol is None:
+    # Only needed by the cst engine
+    pass
+elif sys.hexversion < 0x02070000:
     tse = symbol.testlist
     test_or_star_expr = (symbol.test,)
     testlist_comp = (symbol.testlist_gexp, symbol.listmaker)
@@ -608,6 +1640,22 @@ else:
     test_or_star_expr = (symbol.test, symbol.star_expr)
     testlist_comp = (symbol.testlist_comp,)
 
+if symbol is None:
+    pass
+elif hasattr(symbol, 'atom_expr'):
+    # Python 3.5 and later: an atom and its trailers are an atom_expr
+    # inside the power, which only adds the exponent
+    power_expr = symbol.atom_expr
+else:
+    power_expr = symbol.power
+
+# The "await" keyword starting an atom_expr, a token of its own in the CST
+await_token = getattr(token, 'AWAIT', None)
+
+# Python 3.8 and later: the assignment expressions, also wrapping the tests
+# of parenthesized tuples and lists
+namedexpr_test = getattr(symbol, 'namedexpr_test', None)
+
 def processNonTerminal(ctx, cst):
     """ Process a given CST tuple representing a non-terminal symbol
     """
@@ -636,9 +1684,10 @@ def processNonTerminal(ctx, cst):
             idx += 1
             ctx.setMark(cst[idx], Mark.FUNC_DEF)
     elif cst[0] == symbol.decorated \
-            and (cst[1][0] == symbol.decorators) \
-            and (cst[2][0] == symbol.funcdef):
-        # Handle function decorators only.
+            and (cst[1][0] == symbol.decorators):
+        # Handle function decorators only, the decorators of other
+        # definitions are left unmarked.
+        isFunc = (cst[2][0] == symbol.funcdef)
         dcsts = cst[1]
         for i in range(1, len(dcsts)):
             # Handle each decorator
@@ -646,23 +1695,32 @@ def processNonTerminal(ctx, cst):
 
             assert dcst[0] == symbol.decorator
             assert dcst[1][0] == token.AT
-            assert dcst[2][0] == symbol.dotted_name
 
-            dotted = dcst[2]
-            dotted_len = len(dotted)
-            assert dotted_len >= 2
-            if dotted_len > 2:
+            if dcst[2][0] == symbol.dotted_name:
+                names = dcst[2][1::2]
+            else:
+                # Python 3.9 and later: the decorator is an expression,
+                # handled here instead of as a power expression when it has
+                # the form of the older decorators
+                expr = decoratorExpr(dcst[2])
+                if expr is None:
+                    continue
+                ctx.decorators.add(testPosition(expr))
+                names = [expr[1][1]] + [t[2] for t in expr[2:] if t[1][0] == token.DOT]
+            if not isFunc:
+                continue
+
+            assert names and names[-1][0] == token.NAME
+            if len(names) > 1:
                 # When decorators use dotted names, but we don't want to
                 # consider the entire sequence as the function being called
                 # since the functions are not defined that way. Instead, we
                 # only mark the last symbol in the sequence as being a
                 # function call.
-                ctx.setMark(dotted[-1], Mark.FUNC_CALL)
-            elif dotted_len == 2:
+                ctx.setMark(names[-1], Mark.FUNC_CALL)
+            elif names[-1][1] not in ('property', 'classmethod'):
                 # Check for some builtin ones we should ignore
-                assert dotted[-1][0] == token.NAME
-                if dotted[-1][1] not in ('property', 'classmethod'):
-                    ctx.setMark(dotted[-1], Mark.FUNC_CALL)
+                ctx.setMark(names[-1], Mark.FUNC_CALL)
     elif cst[0] == symbol.import_from:
         # The next tuple is the "from" string, so grab the following dotted
         # name tuple, and mark each NAME and DOT terminal in that tuple list
@@ -708,7 +1766,7 @@ def processNonTerminal(ctx, cst):
             if (cst[2][0] == symbol.augassign) and (cst[3][0] in (symbol.testlist, symbol.yield_expr)):
                 # testlist or testlist_star_expr, augassign, testlist
                 assert cst[1][1][0] == symbol.test, "%s is not symbol.test" % nodeNames[cst[1][1][0]]
-                ctx.tests[id(cst[1][1])] = cst[1][1]
+                ctx.tests.add(testPosition(cst[1][1]))
             elif (cst[2][0] == token.EQUAL):
                 # testlist or testlist_star_expr, EQUAL, ...
                 markTestlist(ctx, cst[1])
@@ -719,23 +1777,35 @@ def processNonTerminal(ctx, cst):
                         break
                     # We have another testlist, EQUAL, ...
                     markTestlist(ctx, cst[i])
+        elif (l == 3) and (cst[2][0] == symbol.annassign) and (len(cst[2]) >= 4):
+            # testlist_star_expr, annassign with a value
+            markTestlist(ctx, cst[1])
+    elif (cst[0] == namedexpr_test) and (len(cst) == 4):
+        # test, COLONEQUAL, test
+        ctx.tests.add(testPosition(cst[1]))
     elif cst[0] in test_or_star_expr:
-        if id(cst) in ctx.tests:
+        if ctx.tests and (testPosition(cst) in ctx.tests):
             # We happen to have a test CST that is part of an assignment
             # expression of some sort. It is assumed that deep inside this CST
             # subtree is a power CST subtree that is (one of) the target(s) of
             # the assignment to be marked. Since other CST tuples have to be
             # processed in between, we set a flag for the power symbol
             # handling to actually perform the marking.
-            assert cst == ctx.tests[id(cst)], "%r(%d) != %r(%d)" % (cst, id(cst), ctx.tests[id(cst)], id(cst))
-            del ctx.tests[id(cst)]
+            ctx.tests.remove(testPosition(cst))
             assert not ctx.power_do_assignment
             ctx.power_do_assignment = True
     elif cst[0] == symbol.classdef:
         # Handle class declarations.
         assert (cst[1][0] == token.NAME) and (cst[1][1] == 'class')
         ctx.setMark(cst[2], Mark.CLASS)
-    elif cst[0] == symbol.power:
+    elif cst[0] == power_expr:
+        if ctx.decorators and (testPosition(cst) in ctx.decorators):
+            # A decorator, marked with its definition
+            ctx.decorators.remove(testPosition(cst))
+            return
+        if cst[1][0] == await_token:
+            # Leave out the "await" keyword, the atom follows it
+            cst = cst[:1] + cst[2:]
         l_cst = len(cst)
         if ctx.power_do_assignment:
             ctx.power_do_assignment = False
@@ -756,11 +1826,14 @@ def processNonTerminal(ctx, cst):
                         and cst[1][2][0] in testlist_comp \
                         and cst[1][3][0] in (token.RPAR, token.RSQB):
                     for i in range(1, len(cst[1][2])):
-                        if cst[1][2][i][0] == token.COMMA:
+                        elem = cst[1][2][i]
+                        if elem[0] == token.COMMA:
                             continue
-                        if cst[1][2][i][0] != symbol.test:
+                        if (elem[0] == namedexpr_test) and (len(elem) == 2):
+                            elem = elem[1]
+                        if elem[0] != symbol.test:
                             break
-                        ctx.tests[id(cst[1][2][i])] = cst[1][2][i]
+                        ctx.tests.add(testPosition(elem))
 
             # power
             #   atom
@@ -822,8 +1895,23 @@ def processNonTerminal(ctx, cst):
                 # name.name(a,b=1,c)
                 ctx.setMark(cst[i][2], Mark.FUNC_CALL)
 
-def processTerminal(ctx, cst):
-    """ Process a given CST tuple representing a terminal symbol
+# A string literal holding a Python identifier, with its prefix, its quotes
+# and the identifier as groups
+matchStringSymbol = re.compile("([bBfFrRuU]{0,2})('''|\"\"\"|'|\")([A-Za-z_][A-Za-z_0-9]*)\\2\\Z").match
+
+identifier_chars = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_")
+
+# The mark given by the ast engine to the strings naming symbols, added as
+# symbols without a mark
+name_string = Mark()
+
+# The mark given by the ast and fast engines to soft keywords ("match",
+# "case", "type") used as keywords, added as non-symbol text
+soft_keyword = object()
+
+def processTerminal(ctx, cst, mark=None):
+    """ Process a given CST tuple representing a terminal symbol, with its
+        mark if it has one
     """
     global kwlist, strings_as_symbols
 
@@ -838,7 +1926,7 @@ def processTerminal(ctx, cst):
         ctx.indent_lvl -= 1
         if ctx.indent_lvl == ctx.func_def_lvl:
             ctx.func_def_lvl = -1
-            ctx.line += Symbol('', Mark.FUNC_END)
+            ctx.line.addFuncEnd()
         return lineno
 
     if (lineno != ctx.line.lineno) and (cst[0] != token.STRING):
@@ -860,55 +1948,70 @@ def processTerminal(ctx, cst):
     elif cst[0] == token.STRING:
         # Handle strings: make sure newline's within strings are
         # escaped.
-        if strings_as_symbols:
-            m = re.search("^('|\"|'''|\"\"\")([A-Za-z_][A-Za-z_0-9]*)('|\"|'''|\"\"\")$", cst[1])
-            if m is not None:
-                # We have a string that is a valid Python identifier, emit the
-                # enclosing quotes as non-symbols and the string as a symbol.
-                ctx.line += NonSymbol(m.group(1))
-                ctx.line += Symbol(m.group(2))
-                ctx.line += NonSymbol(m.group(3))
-            else:
-                ctx.line += NonSymbol(cst[1].replace("\n", "\\n"))
+        string = cst[1]
+        m = None
+        if strings_as_symbols or (mark is name_string):
+            # Only strings ending with an identifier character, before their
+            # closing quotes, can hold one
+            quote = string[-1]
+            last = string[-4:-3] if string[-2:-1] == quote else string[-2:-1]
+            if last in identifier_chars:
+                m = matchStringSymbol(string)
+        if m is not None:
+            # We have a string that is a valid Python identifier, emit the
+            # prefix and enclosing quotes as non-symbols and the string as a
+            # symbol.
+            ctx.line.addNonSymbol(string[:m.start(3)])
+            ctx.line.addSymbol(m.group(3))
+            ctx.line.addNonSymbol(m.group(2))
         else:
-            ctx.line += NonSymbol(cst[1].replace("\n", "\\n"))
+            ctx.line.addNonSymbol(string.replace("\n", "\\n"))
     elif cst[0] == token.NAME:
         # Handle terminal names, could be a python keyword or
         # user defined symbol, or part of a dotted name sequence.
-        if cst[1] in kwlist:
-            if id(cst) in ctx.marks:
-                # Perhaps print statement used as a function?
-                ctx.line += Symbol(cst[1], ctx.getMark(cst))
+        if mark is soft_keyword:
+            # Soft keywords are only keywords where the engine says so
+            ctx.line.addNonSymbol(cst[1])
+        elif cst[1] in kwlist:
+            if mark and ((mark is not Mark.FUNC_CALL) or (cst[1] in python_keywords)):
+                # Perhaps print statement used as a function? The names added
+                # with --keywords are only symbols where defined or assigned.
+                ctx.line.addSymbol(cst[1], mark)
             else:
                 # Python keywords are treated as non-symbol text
-                ctx.line += NonSymbol(cst[1])
+                ctx.line.addNonSymbol(cst[1])
         else:
             # Not a python keyword, symbol text
-            if id(cst) in ctx.marks:
-                s = Symbol(cst[1], ctx.getMark(cst))
-            else:
-                s = Symbol(cst[1])
-            ctx.line += s
-    elif (cst[0] == token.DOT) and (id(cst) in ctx.marks):
+            ctx.line.addSymbol(cst[1], mark)
+    elif (cst[0] == token.DOT) and mark:
         # Add the "." to the include symbol, as we are
         # building a larger symbol from all the dotted names
-        ctx.line += Symbol(cst[1], ctx.getMark(cst))
+        ctx.line.addSymbol(cst[1], mark)
     elif token.ISEOF(cst[0]):
         # End of compilation: consume this token without adding it
         # to the line, committing any line being processed.
         ctx.commit()
     else:
         # All other tokens are simply added to the line
-        ctx.line += NonSymbol(cst[1])
+        ctx.line.addNonSymbol(cst[1])
 
     return lineno
 
 def walkCst(ctx, cst):
-    """ Scan the CST (tuple) for tokens, appending index lines to the buffer.
+    """ Scan the CST (tuple, with line and column info) for tokens,
+        appending index lines to the buffer.
+    """
+    walkCstStack(ctx, [(cst, 0)])
+
+def walkCstStack(ctx, stack):
+    """ Scan the CST tuples on the given stack, with their indentation, for
+        tokens, appending index lines to the buffer.
+
+        The tuples are popped off the stack as they are processed, so that
+        given the only reference to the tree, its subtrees are freed as soon
+        as they are walked.
     """
-    indent = 0
     lineno = 1
-    stack = [(cst, indent)]
     try:
         while stack:
             cst, indent = stack.pop()
@@ -917,6 +2020,8 @@ def walkCst(ctx, cst):
 
             if token.ISNONTERMINAL(cst[0]):
                 processNonTerminal(ctx, cst)
+            elif cst[0] in valid_tokens_for_marks:
+                lineno = processTerminal(ctx, cst, ctx.takeMark(cst))
             else:
                 lineno = processTerminal(ctx, cst)
 
@@ -933,25 +2038,1047 @@ def walkCst(ctx, cst):
         e.lineno = lineno
         raise e
 
-def parseSource(sourcecode, indexbuff, indexbuff_len, dump=False):
+def dumpAst(tree, stream=None):
+    """ For debugging, dump the abstract syntax tree with node positions.
+    """
+    import errno
+    try:
+        print(ast.dump(tree, include_attributes=True), file=stream)
+    except IOError as e:
+        if e.errno == errno.EPIPE:
+            pass
+        else:
+            raise
+
+    return stream
+
+
+# Tokens that never appear in a CST
+skip_tokens = (tokenize.COMMENT, tokenize.NL, getattr(tokenize, 'ENCODING', None))
+
+# Operator tokens that are distinguished when processing terminals; tokenize
+# reports all operators as token.OP
+exact_ops = {'.': token.DOT}
+if sys.hexversion >= 0x03000000:
+    exact_ops['...'] = token.ELLIPSIS
+
+# Python 3.5 and 3.6 report these keywords with their own token types
+name_tokens = (getattr(token, 'ASYNC', None), getattr(token, 'AWAIT', None))
+
+# Python 3.12 splits f-strings into multiple tokens
+fstring_start = getattr(tokenize, 'FSTRING_START', None)
+fstring_end = getattr(tokenize, 'FSTRING_END', None)
+
+# Zero width or layout tokens that no AST node position refers to
+unpositioned_tokens = (token.NEWLINE, token.INDENT, token.DEDENT, token.ENDMARKER)
+
+openers = {'(': ')', '[': ']', '{': '}'}
+closers = {')': '(', ']': '[', '}': '{'}
+
+# The builtins taking the name of an attribute as their second argument
+attribute_functions = frozenset(('getattr', 'setattr', 'hasattr', 'delattr'))
+
+
+def generateTerms(sourcecode, lines):
+    """ Generate the terminal tuples of source code as tokenize reads it,
+        shaped like those found in a CST, (type, string, lineno), where
+        lineno is the line on which the token ends, along with the (line,
+        column) start and end positions of each one as tokenize gives them.
+
+        The lines read are appended to the given list as they are read.
+    """
+    src = StringIO(sourcecode)
+    def readline():
+        line = src.readline()
+        lines.append(line)
+        return line
+
+    fstring_depth = 0
+    for tok in tokenize.generate_tokens(readline):
+        typ, string, start, end = tok[:4]
+        if typ in skip_tokens:
+            continue
+        if typ == fstring_start:
+            fstring_depth += 1
+            if fstring_depth == 1:
+                fstring_pos = start
+            continue
+        if fstring_depth:
+            if typ == fstring_end:
+                fstring_depth -= 1
+            if fstring_depth:
+                continue
+            # Treat the whole f-string as one STRING token, as a CST would
+            (srow, scol), (erow, ecol) = start, end = fstring_pos, end
+            if srow == erow:
+                string = lines[srow - 1][scol:ecol]
+            else:
+                string = lines[srow - 1][scol:] + ''.join(lines[srow:erow - 1]) + lines[erow - 1][:ecol]
+            typ = token.STRING
+        elif typ == token.OP:
+            typ = exact_ops.get(string, token.OP)
+        elif typ in name_tokens:
+            typ = token.NAME
+
+        yield (typ, string, end[0]), start, end
+
+
+def tokenizeSource(sourcecode):
+    """ Tokenize source code into terminal tuples shaped like those found in
+        a CST, (type, string, lineno), where lineno is the line on which the
+        token ends.
+
+        Returns the list of terminals and two dictionaries mapping the
+        (line, column) start and end positions of each terminal to its index
+        in the list. Columns are counted in UTF-8 bytes, as they are for AST
+        nodes.
+    """
+    terms = []
+    starts = {}
+    ends = {}
+
+    lines = []
+    nonascii = {}
+    def position(pos):
+        row, col = pos
+        if col and isinstance(sourcecode, type(u'')):
+            if row not in nonascii:
+                line = lines[row - 1]
+                nonascii[row] = len(line.encode('utf-8')) != len(line)
+            if nonascii[row]:
+                col = len(lines[row - 1][:col].encode('utf-8'))
+        return (row, col)
+
+    for term, start, end in generateTerms(sourcecode, lines):
+        if term[0] not in unpositioned_tokens:
+            starts[position(start)] = len(terms)
+            ends[position(end)] = len(terms)
+        terms.append(term)
+
+    return terms, starts, ends
+
+
+class AstMarker(ast.NodeVisitor):
+    """ Visitor of the abstract syntax tree (AST) of a module which attaches
+        Marks to the terminal tuples of the module's token stream.
+
+        The AST tells us what each construct is, and the token stream tells
+        us exactly where its symbols are. An AST node only records where it
+        starts (and ends, as of Python 3.8), so symbols deeper inside a node
+        are located by stepping through the tokens from there.
+
+        The patterns marked here mirror those recognized by
+        processNonTerminal() for the cst engine, which is the reference for
+        the output of this one.
+    """
+    def __init__(self, ctx, terms, starts, ends):
+        self.ctx = ctx
+        self.terms = terms
+        self.starts = starts
+        self.ends = ends
+        # The marks of the terminals, by index
+        self.marks = [None] * len(terms)
+        # Indexes of function name terminals, keyed by the index of their
+        # "def" terminal, which might be marked as definitions when the
+        # tokens are processed
+        self.defs = {}
+        self._linenos = None
+
+    def mark(self, idx, mark):
+        ''' Mark the terminal at the given index, if there is one.
+        '''
+        if idx is not None:
+            assert self.marks[idx] is None
+            self.marks[idx] = mark
+
+    def index(self, node):
+        ''' Index of the terminal at which the given node starts.
+        '''
+        return self.starts.get((node.lineno, node.col_offset))
+
+    def followedBy(self, idx, string):
+        ''' Return the given index only if the terminal after it is the
+            given string.
+        '''
+        if idx is not None and self.terms[idx + 1][1] == string:
+            return idx
+        return None
+
+    def nameIndex(self, node):
+        ''' Index of the terminal for an ast.Name node.
+        '''
+        idx = self.index(node)
+        if idx is None or self.terms[idx][1] != node.id:
+            # Names within f-strings are not tokens of their own
+            return None
+        return idx
+
+    def attrIndex(self, node):
+        ''' Index of the terminal for the attribute name of an ast.Attribute
+            node.
+        '''
+        if getattr(node, 'end_lineno', None) is not None:
+            idx = self.ends.get((node.end_lineno, node.end_col_offset))
+        else:
+            idx = self.scanTrailers(node)
+        if idx is None or self.terms[idx][1] != node.attr:
+            return None
+        return idx
+
+    def keywordIndex(self, node, keyword):
+        ''' Index of the first terminal of the given keyword at or after the
+            start of the given node (decorators can precede it).
+        '''
+        idx = self.index(node)
+        if idx is None and getattr(node, 'decorator_list', None):
+            idx = self.index(node.decorator_list[0])
+        if idx is None:
+            return None
+        while self.terms[idx][1] != keyword:
+            idx += 1
+        return idx
+
+    def skipGroup(self, idx):
+        ''' Index of the terminal following the closer matching the opener at
+            the given index.
+        '''
+        terms = self.terms
+        depth = 0
+        while True:
+            string = terms[idx][1]
+            if string in openers:
+                depth += 1
+            elif string in closers:
+                depth -= 1
+                if depth == 0:
+                    return idx + 1
+            idx += 1
+
+    def scanTrailers(self, node):
+        ''' Without end positions, locate the attribute name of an
+            ast.Attribute node by stepping over the atom at the start of the
+            node and then over each trailer (".name", "(...)", "[...]")
+            nested inside it.
+        '''
+        trailers = 0
+        base = node
+        while isinstance(base, (ast.Attribute, ast.Call, ast.Subscript)):
+            trailers += 1
+            base = base.func if isinstance(base, ast.Call) else base.value
+
+        terms = self.terms
+        start = self.index(node)
+        if start is None and node.col_offset == -1:
+            # Python 2 positions multi-line strings at the end line only
+            start = bisect.bisect_left(self.linenos(), node.lineno)
+        while start is not None:
+            # Step over the atom
+            idx = start
+            if terms[idx][1] in openers:
+                idx = self.skipGroup(idx)
+            elif terms[idx][0] == token.STRING:
+                while terms[idx][0] == token.STRING:
+                    idx += 1
+            else:
+                idx += 1
+
+            # Step over the trailers
+            for i in range(trailers):
+                if terms[idx][1] in ('(', '['):
+                    idx = self.skipGroup(idx)
+                elif terms[idx][0] == token.DOT and terms[idx + 1][0] == token.NAME:
+                    idx += 2
+                else:
+                    break
+            else:
+                if terms[idx - 1][1] == node.attr:
+                    return idx - 1
+
+            # The atom is parenthesized, but the node position is that of
+            # what is inside the parentheses; back up to the opener.
+            depth = 0
+            start -= 1
+            while start >= 0:
+                string = terms[start][1]
+                if string in closers:
+                    depth += 1
+                elif string in openers:
+                    if depth == 0:
+                        break
+                    depth -= 1
+                start -= 1
+            else:
+                start = None
+        return None
+
+    def linenos(self):
+        ''' The (ascending) line numbers of the terminals.
+        '''
+        if self._linenos is None:
+            self._linenos = [tup[2] for tup in self.terms]
+        return self._linenos
+
+    def visitFields(self, node, skip):
+        ''' Visit the children of a node, except those of the given field.
+        '''
+        for field, value in ast.iter_fields(node):
+            if field == skip:
+                continue
+            if isinstance(value, list):
+                for item in value:
+                    if isinstance(item, ast.AST):
+                        self.visit(item)
+            elif isinstance(value, ast.AST):
+                self.visit(value)
+
+    def isDotted(self, node):
+        ''' Is this a name, or a dotted name (name.name.name)?
+        '''
+        while isinstance(node, ast.Attribute):
+            node = node.value
+        return isinstance(node, ast.Name)
+
+    def visitDecorator(self, node, funcdef):
+        ''' Decorators of function definitions are marked as function calls,
+            though only the last name of a dotted decorator is marked.
+        '''
+        func = node.func if isinstance(node, ast.Call) else node
+        if not self.isDotted(func):
+            self.visit(node)
+            return
+        if funcdef:
+            if isinstance(func, ast.Attribute):
+                self.mark(self.attrIndex(func), Mark.FUNC_CALL)
+            elif func.id not in ('property', 'classmethod'):
+                # Ignore some builtin ones
+                self.mark(self.nameIndex(func), Mark.FUNC_CALL)
+        if func is not node:
+            self.visitFields(node, 'func')
+
+    def markTarget(self, node):
+        ''' Mark the symbols assigned to by an assignment target.
+        '''
+        if isinstance(node, ast.Name):
+            self.mark(self.nameIndex(node), Mark.ASSIGN)
+        elif isinstance(node, (ast.Tuple, ast.List)):
+            for elt in node.elts:
+                self.markTarget(elt)
+        elif isinstance(node, getattr(ast, 'Starred', ())):
+            self.markTarget(node.value)
+        elif isinstance(node, ast.Attribute):
+            self.mark(self.attrIndex(node), Mark.ASSIGN)
+        elif isinstance(node, ast.Subscript):
+            # Only name[...] and ....name[...] are marked
+            if isinstance(node.value, ast.Name):
+                self.mark(self.followedBy(self.nameIndex(node.value), '['), Mark.ASSIGN)
+            elif isinstance(node.value, ast.Attribute):
+                self.mark(self.followedBy(self.attrIndex(node.value), '['), Mark.ASSIGN)
+
+    def stringIndex(self, node):
+        ''' Index of the terminal of a string node, if the string is a
+            single STRING token.
+        '''
+        kind = type(node).__name__
+        if kind == 'Constant':
+            value = node.value
+        elif kind == 'Str':
+            value = node.s
+        else:
+            return None
+        if not isinstance(value, (str, type(u''))):
+            # Bytes
+            return None
+        idx = self.index(node)
+        if (idx is None) or (self.terms[idx][0] != token.STRING) or (self.terms[idx + 1][0] == token.STRING):
+            # Implicitly concatenated strings are left alone
+            return None
+        return idx
+
+    def markStrings(self, nodes):
+        ''' Mark the strings among the given nodes as naming symbols.
+        '''
+        for node in nodes:
+            if node is not None:
+                self.mark(self.stringIndex(node), name_string)
+
+    def markAll(self, target, value):
+        ''' Mark the names listed in a list or tuple assigned to __all__.
+        '''
+        if (isinstance(target, ast.Name) and (target.id == '__all__')
+                and isinstance(value, (ast.List, ast.Tuple))):
+            self.markStrings(value.elts)
+
+    def visit_Global(self, node):
+        idx = self.index(node)
+        for i in range(len(node.names)):
+            # Names follow the "global" keyword, separated by commas
+            self.mark(idx + 1 + (2 * i), Mark.GLOBAL)
+
+    def visit_FunctionDef(self, node):
+        idx = self.keywordIndex(node, 'def')
+        if idx is not None:
+            self.defs[idx] = idx + 1
+        for decorator in node.decorator_list:
+            self.visitDecorator(decorator, True)
+        self.visitFields(node, 'decorator_list')
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node):
+        idx = self.keywordIndex(node, 'class')
+        if idx is not None:
+            self.mark(idx + 1, Mark.CLASS)
+        for decorator in node.decorator_list:
+            self.visitDecorator(decorator, False)
+        self.visitFields(node, 'decorator_list')
+
+    def visit_Import(self, node):
+        # Mark each NAME and DOT terminal of the imported modules' dotted
+        # names as an include. As they are added to the line they'll be
+        # merged into one big symbol marked as an include.
+        idx = self.index(node) + 1
+        for alias in node.names:
+            end = idx + (2 * alias.name.count('.')) + 1
+            for i in range(idx, end):
+                self.mark(i, Mark.INCLUDE)
+            idx = end
+            if alias.asname:
+                # Skip "as name"
+                idx += 2
+            # Skip the comma
+            idx += 1
+
+    def visit_ImportFrom(self, node):
+        # Skip "from" and any leading dots of a relative import
+        idx = self.index(node) + 1
+        while self.terms[idx][0] in valid_tokens_for_import:
+            idx += 1
+        if node.module:
+            for i in range(idx, idx + (2 * node.module.count('.')) + 1):
+                self.mark(i, Mark.INCLUDE)
+
+    def visit_Assign(self, node):
+        for target in node.targets:
+            self.markTarget(target)
+            if string_names:
+                self.markAll(target, node.value)
+        self.generic_visit(node)
+
+    def visit_AugAssign(self, node):
+        self.markTarget(node.target)
+        if string_names:
+            self.markAll(node.target, node.value)
+        self.generic_visit(node)
+
+    def visit_AnnAssign(self, node):
+        if node.value is not None:
+            self.markTarget(node.target)
+        self.generic_visit(node)
+
+    def visit_NamedExpr(self, node):
+        self.markTarget(node.target)
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        # Calls of the form name(...) and ....name(...)
+        if isinstance(node.func, ast.Name):
+            self.mark(self.followedBy(self.nameIndex(node.func), '('), Mark.FUNC_CALL)
+        elif isinstance(node.func, ast.Attribute):
+            self.mark(self.followedBy(self.attrIndex(node.func), '('), Mark.FUNC_CALL)
+        if string_names:
+            func = node.func
+            if isinstance(func, ast.Name) and (func.id in attribute_functions) and (len(node.args) > 1):
+                # getattr(obj, 'name'), ...
+                self.markStrings(node.args[1:2])
+            elif (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name)
+                  and (func.value.id == '__all__') and node.args):
+                # __all__.append('name'), __all__.extend(['name', ...])
+                if func.attr == 'append':
+                    self.markStrings(node.args[:1])
+                elif (func.attr == 'extend') and isinstance(node.args[0], (ast.List, ast.Tuple)):
+                    self.markStrings(node.args[0].elts)
+        self.generic_visit(node)
+
+    def visit_Dict(self, node):
+        if string_names:
+            # The keys of ** unpackings are None
+            self.markStrings(node.keys)
+        self.generic_visit(node)
+
+    def visit_Subscript(self, node):
+        if string_names:
+            index = node.slice
+            if type(index).__name__ == 'Index':
+                # Before Python 3.9
+                index = index.value
+            self.markStrings([index])
+        self.generic_visit(node)
+
+    def visit_Match(self, node):
+        self.mark(self.index(node), soft_keyword)
+        self.generic_visit(node)
+
+    def visit_match_case(self, node):
+        # Cases have no position; the "case" keyword comes before their
+        # pattern, which might be parenthesized
+        idx = self.index(node.pattern)
+        while idx and (self.terms[idx - 1][1] == '('):
+            idx -= 1
+        if idx and (self.terms[idx - 1][1] == 'case'):
+            self.mark(idx - 1, soft_keyword)
+        self.generic_visit(node)
+
+    def visit_TypeAlias(self, node):
+        self.mark(self.index(node), soft_keyword)
+        self.markTarget(node.name)
+        self.generic_visit(node)
+
+    def visit_JoinedStr(self, node):
+        # An f-string is a single STRING token, nothing inside it is marked
+        pass
+
+
+def markAst(ctx, tree, terms, starts, ends):
+    """ Mark the terminals using the AST, returning the marks of the
+        terminals, by index, and the indexes of the function names keyed by
+        the index of their "def" terminal (see AstMarker).
+    """
+    marker = AstMarker(ctx, terms, starts, ends)
+    marker.visit(tree)
+    return marker.marks, marker.defs
+
+def walkAst(ctx, terms, marks, defs):
+    """ Scan the terminals for tokens, appending index lines to the buffer,
+        with the marks given by markAst().
+    """
+    lineno = 1
+    try:
+        for i, tup in enumerate(terms):
+            if (tup[1] == 'def') and (i in defs) and (ctx.func_def_lvl == -1):
+                # As for the cst engine, only the outer most function name
+                # is marked as a function definition.
+                ctx.func_def_lvl = ctx.indent_lvl
+                marks[defs[i]] = Mark.FUNC_DEF
+            lineno = processTerminal(ctx, tup, marks[i])
+    except Exception as e:
+        e.lineno = lineno
+        raise e
+
+def parseAst(ctx, sourcecode, dump=False):
+    """ The ast engine: index source code using the ast module and one pass
+        of the tokenize module.
+    """
+    with timed('parse', len(sourcecode)):
+        with warnings.catch_warnings():
+            # Warnings about the code being indexed are of no interest here
+            warnings.simplefilter('ignore')
+            tree = ast.parse(sourcecode)
+
+    if dump:
+        dumpAst(tree)
+
+    with timed('tokenize', len(sourcecode)) as phase:
+        terms, starts, ends = tokenizeSource(sourcecode)
+        phase.count = len(terms)
+    with timed('walk') as phase:
+        try:
+            marks, defs = markAst(ctx, tree, terms, starts, ends)
+        except Exception as e:
+            e.lineno = 1
+            raise e
+        # The marks are all taken, the tree can go before the terminals are
+        # processed
+        del tree, starts, ends
+        walkAst(ctx, terms, marks, defs)
+        phase.count = len(ctx.buff)
+
+# Source code with this many lines or more is parsed by the cst engine a
+# few top level statements at a time
+cst_chunk_lines = 1000
+
+# Keywords continuing a compound statement at the same indentation
+continuing_keywords = frozenset(('else', 'elif', 'except', 'finally'))
+
+# An encoding declaration (PEP 263)
+coding_re = re.compile(r"^[ \t\f]*#.*?coding[:=][ \t]*[-\w.]+")
+
+def cstChunks(sourcecode):
+    """ Split source code into chunks of whole top level statements, of at
+        least cst_chunk_lines lines each but the last, so that the parser
+        module is not made to build the tree of a whole long module.
+
+        Returns a list of (chunk, skip) pairs. Each chunk after the first is
+        padded with blank lines, so that its statements keep their line
+        numbers. The padding starts with the encoding declaration and the
+        __future__ imports of the module, so that the statements are parsed
+        as they are in the whole module; 'skip' is the number of top level
+        statements the imports make, to be skipped in the tree.
+    """
+    if sourcecode.count('\n') < cst_chunk_lines:
+        return [(sourcecode, 0)]
+
+    lines = []
+    starts = []             # The lines chunks can start at
+    futures = []            # The features imported from __future__
+    level = 0               # Indentation level
+    newline = True          # Is the next terminal the first of a statement?
+    decorated = False       # Is the statement decorating the next one?
+    statement = None        # The line and terminals of a top level "from" statement
+    firstRow = 1            # The first line a chunk other than the first can start at
+    for term, start, end in generateTerms(sourcecode, lines):
+        typ, string = term[0], term[1]
+        if typ == token.INDENT:
+            level += 1
+        elif typ == token.DEDENT:
+            level -= 1
+        elif typ in (token.NEWLINE, token.ENDMARKER):
+            if statement and (statement[2:4] == ['__future__', 'import']):
+                futures.append(' '.join(t for t in statement[4:] if t not in ('(', ')')))
+                # The __future__ imports are left in the first chunk
+                firstRow = statement[1] + 1
+            statement = None
+            newline = True
+        elif newline:
+            newline = False
+            if level == 0:
+                if (not decorated) and (string not in continuing_keywords):
+                    starts.append(start[0])
+                decorated = (string == '@')
+                if string == 'from':
+                    statement = [string, start[0]]
+        elif statement is not None:
+            statement.append(string)
+
+    bounds = [1]
+    for row in starts:
+        if (row - bounds[-1] >= cst_chunk_lines) and (row > firstRow):
+            bounds.append(row)
+
+    header = [line for line in lines[:2] if coding_re.match(line)][:1]
+    if futures:
+        header.append("from __future__ import %s\n" % ', '.join(futures))
+    skip = 1 if futures else 0
+
+    chunks = []
+    for i, first in enumerate(bounds):
+        last = bounds[i + 1] - 1 if i + 1 < len(bounds) else len(lines)
+        if i == 0:
+            chunks.append((''.join(lines[:last]), 0))
+        else:
+            padding = '\n' * (first - 1 - len(header))
+            chunks.append((''.join(header) + padding + ''.join(lines[first - 1:last]), skip))
+    return chunks
+
+def trimChunk(cst, skip, last):
+    """ Drop the given number of top level statements from the CST tuple of
+        a chunk, and unless it is the last chunk, the end marker and the
+        newlines before it, which do not end the module.
+    """
+    if cst[0] == symbol.encoding_decl:
+        # The module is wrapped in the encoding declaration
+        return (cst[0], trimChunk(cst[1], skip, last)) + cst[2:]
+    end = len(cst)
+    if not last:
+        end -= 1
+        while (end > 1) and (cst[end - 1][0] == token.NEWLINE):
+            end -= 1
+    return cst[:1] + cst[1 + skip:end]
+
+def parseCst(ctx, sourcecode, dump=False):
+    """ The cst engine: index source code using the CST from the parser module.
+
+        Long source code is parsed in chunks of top level statements (see
+        cstChunks()), only the tree of one chunk being held at a time, as a
+        tuple tree made whole before it is walked. The memory taken thus
+        grows with the size of the chunks, of cst_chunk_lines lines or so,
+        not with the depth of the trees: a top level statement longer than
+        that is never split, its chunk being as long as it is.
+    """
+    chunks = cstChunks(sourcecode)
+    for i, (chunk, skip) in enumerate(chunks):
+        with timed('parse', len(chunk)):
+            cst = parser.suite(chunk)
+
+        if dump:
+            dumpCst(cst)
+
+        with timed('totuple'):
+            tup = cst.totuple(True, True)
+            del cst
+        if (i + 1 < len(chunks)) or skip:
+            tup = trimChunk(tup, skip, i + 1 == len(chunks))
+        with timed('walk') as phase:
+            count = len(ctx.buff)
+            stack = [(tup, 0)]
+            del tup
+            walkCstStack(ctx, stack)
+            phase.count = len(ctx.buff) - count
+
+# Augmented assignment operators
+aug_assigns = frozenset(('+=', '-=', '*=', '/=', '//=', '%=', '**=', '>>=', '<<=',
+                         '&=', '^=', '|=', '@='))
+
+# Keywords starting a compound statement, whose header ends with a colon
+compound_keywords = frozenset(('if', 'elif', 'else', 'for', 'while', 'try', 'except',
+                               'finally', 'with', 'def', 'class', 'async'))
+
+# Terminals, besides names, that can appear in an assignment target outside
+# brackets
+target_ops = frozenset((',', '.', '(', ')', '[', ']', '*'))
+
+# Soft keywords starting a statement when used as keywords
+soft_statements = frozenset(('match', 'case', 'type'))
+
+# Keywords that can start the subject of a match statement or the pattern of
+# a case, but cannot follow a name in an expression
+subject_keywords = frozenset(('None', 'True', 'False', 'await', 'lambda'))
+
+# Terminals that can follow "match" or "case" both when they are keywords and
+# when they are names in an expression
+ambiguous_subjects = frozenset(('(', '[', '-', '+', '*', 'not'))
+
+# How many terminals of a statement are held back, waiting for an "=" to
+# tell whether they are assigned to
+max_lookahead = 200
+
+
+class FastMarker(object):
+    """ Marker of the terminals of a module's token stream as they come,
+        from the few terminals around them, without parsing the module.
+
+        The terminals of a statement are held back until it is known
+        whether they are an assignment target, that is until an "=" or the
+        end of the statement comes, or until there are too many of them;
+        all the others are processed as soon as the next one comes.
+
+        The decorators of a definition are held back as well, until it is
+        known whether a function or a class is decorated, and so is a
+        statement starting with a soft keyword, until it is known whether it
+        is used as a keyword.
+
+        The heuristics used mark most of what the other engines mark, the
+        patterns missed being rare in the generated code this engine is
+        for: the targets of assignments longer than max_lookahead terminals
+        are not marked, for one.
+    """
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.pending = []       # The terminals not processed yet
+        self.marks = []         # The marks of the pending terminals
+        self.live = True        # Might the pending terminals be assigned to?
+        self.colon = None       # Number of pending terminals before an annotation
+        self.depth = 0          # Bracket nesting depth
+        self.lambdas = 0        # Number of lambdas whose parameters are being read
+        self.first = None       # The first terminal string of the statement
+        self.segStart = True    # Is the next terminal the first of a target?
+        self.state = None       # Handling an 'import', 'from', 'global' or '@' statement
+        self.decorators = None  # The names of the decorators held back, if any
+        self.soft = None        # The soft keyword starting the statement, until known to be one or not
+        self.header = None      # The soft keyword of a match or case header, 'if' in a guard
+        self.printFunc = False  # Is print a function (in Python 2)?
+        self.prev = self.prev2 = (None, None, 0)
+        self.lineno = 1
+
+    def mark(self, tup, mark):
+        ''' Mark the given pending terminal, unless it is already marked,
+            but as a call before it was known to be a soft keyword.
+        '''
+        if tup[0] in valid_tokens_for_marks:
+            pending = self.pending
+            # The terminals marked are mostly the last ones
+            for i in range(len(pending) - 1, -1, -1):
+                if pending[i] is tup:
+                    if (self.marks[i] is None) or (mark is soft_keyword):
+                        self.marks[i] = mark
+                    return
+
+    def emit(self, count):
+        ''' Process the given number of pending terminals.
+        '''
+        ctx = self.ctx
+        pending = self.pending
+        marks = self.marks
+        for i in range(count):
+            tup = pending[i]
+            if tup[0] == token.NAME:
+                if (tup[1] == 'def') and (ctx.func_def_lvl == -1):
+                    # As for the other engines, only the outer most function
+                    # name is marked as a function definition.
+                    ctx.func_def_lvl = ctx.indent_lvl
+                    self.mark(pending[i + 1], Mark.FUNC_DEF)
+                elif ctx.line.isSymbol and (tup[2] == ctx.line.lineno) and (tup[1] not in kwlist):
+                    # Names only follow one another in code this engine
+                    # misreads (Python 2 print statements, say), whose
+                    # symbol they are added to
+                    marks[i] = ctx.line.mark or None
+            self.lineno = processTerminal(ctx, tup, marks[i])
+        del pending[:count]
+        del marks[:count]
+
+    def markTargets(self, terms):
+        ''' Mark the symbols assigned to by the terminals of an assignment
+            target: names, possibly starred or in tuples or lists, the last
+            names of attributes, and names subscripted.
+        '''
+        elements = []
+        depth = 0
+        begin = 0
+        for i, tup in enumerate(terms):
+            if tup[1] in openers:
+                depth += 1
+            elif tup[1] in closers:
+                depth -= 1
+            elif (tup[1] == ',') and (depth == 0):
+                elements.append(terms[begin:i])
+                begin = i + 1
+        elements.append(terms[begin:])
+
+        for elt in elements:
+            if elt and (elt[0][1] == '*'):
+                elt = elt[1:]
+            if not elt:
+                continue
+            last = elt[-1]
+            if (elt[0][1] in ('(', '[')) and (groupStart(elt) == 0):
+                self.markTargets(elt[1:-1])
+            elif last[0] == token.NAME:
+                if (len(elt) == 1) or (elt[-2][0] == token.DOT):
+                    self.mark(last, Mark.ASSIGN)
+            elif last[1] == ']':
+                j = groupStart(elt)
+                if (j == 1) or ((j > 1) and (elt[j - 2][0] == token.DOT)):
+                    if elt[j - 1][0] == token.NAME:
+                        self.mark(elt[j - 1], Mark.ASSIGN)
+
+    def endTarget(self, assigned):
+        ''' Process the pending terminals, those before the last one being
+            an assignment target if 'assigned'.
+        '''
+        pending = self.pending
+        self.soft = None
+        if assigned and self.live:
+            self.markTargets(pending[:-1] if self.colon is None else pending[:self.colon])
+        if self.decorators is None:
+            self.emit(len(pending))
+        self.live = True
+        self.colon = None
+        self.segStart = True
+
+    def endStatement(self):
+        self.endTarget(False)
+        self.first = None
+        self.state = None
+        self.header = None
+        self.lambdas = 0
+
+    def softKeyword(self, tup):
+        ''' Tell from the terminal following the soft keyword starting the
+            statement whether it is used as a keyword, if it can be told yet.
+        '''
+        typ, string = tup[0], tup[1]
+        keyword = self.soft
+        if (typ == token.NAME) and ((string not in python_keywords) or
+                                    ((string in subject_keywords) and (keyword[1] != 'type'))):
+            # match x:, case None:, type X = ...
+            self.mark(keyword, soft_keyword)
+            if keyword[1] == 'type':
+                self.mark(tup, Mark.ASSIGN)
+            else:
+                self.header = keyword[1]
+        elif (keyword[1] != 'type') and ((typ in (token.NUMBER, token.STRING)) or (string in ('{', '~'))):
+            # case 1:, match {...}:
+            self.mark(keyword, soft_keyword)
+            self.header = keyword[1]
+        elif (keyword[1] != 'type') and (string in ambiguous_subjects):
+            # match (x): or match(x), case [y]: or case[y] = ... are told
+            # apart by the colon ending the statement
+            return
+        self.soft = None
+
+    def feed(self, tup):
+        ''' Mark the next terminal and process it, or hold it back.
+        '''
+        typ, string = tup[0], tup[1]
+        prev = self.prev
+        self.pending.append(tup)
+        self.marks.append(None)
+
+        if (self.soft is not None) and (prev[1] == ':') and (self.depth == 0) and (self.soft is not prev):
+            # Only the colon of a match or case header ends its line;
+            # that of an annotation is followed by its type
+            if typ == token.NEWLINE:
+                # The call mark given by an opener following it is dropped
+                self.mark(self.soft, soft_keyword)
+            self.soft = None
+
+        if self.first is None:
+            self.first = string
+            if string == '@':
+                if self.decorators is None:
+                    self.decorators = []
+            elif self.decorators is not None:
+                if string in ('def', 'async'):
+                    # Decorators of classes are not marked
+                    for name in self.decorators:
+                        self.mark(name, Mark.FUNC_CALL)
+                self.decorators = None
+            if string in ('import', 'from', 'global', '@'):
+                self.state = string
+            elif (typ == token.NAME) and (string in soft_statements):
+                self.soft = tup
+        elif self.soft is prev:
+            self.softKeyword(tup)
+        elif self.state is not None:
+            state = self.state
+            if state == 'import':
+                if (typ == token.NAME) and (string != 'as') and (prev[1] != 'as'):
+                    self.mark(tup, Mark.INCLUDE)
+                elif (typ == token.DOT) and (prev[0] == token.NAME):
+                    self.mark(tup, Mark.INCLUDE)
+            elif state == 'from':
+                if string == 'import':
+                    self.state = None
+                elif (typ == token.NAME) or ((typ == token.DOT) and (prev[0] == token.NAME) and (prev[1] != 'from')):
+                    self.mark(tup, Mark.INCLUDE)
+            elif state == 'global':
+                if typ == token.NAME:
+                    self.mark(tup, Mark.GLOBAL)
+            elif (typ != token.NAME) and (typ != token.DOT):
+                # The end of the dotted name of a decorator, whose last
+                # name is marked as a call, but for some builtin ones
+                self.state = None
+                if (prev[0] == token.NAME) and ((self.prev2[1] != '@') or
+                                                (prev[1] not in ('property', 'classmethod'))):
+                    self.decorators.append(prev)
+        elif (prev[1] == 'class') and (typ == token.NAME):
+            self.mark(tup, Mark.CLASS)
+        elif (string == 'print_function') and (self.first == 'from'):
+            self.printFunc = True
+
+        if string in openers:
+            if ((string == '(') and (prev[0] == token.NAME)
+                    and ((prev[1] not in kwlist) or ((prev[1] == 'print') and self.printFunc))
+                    and (self.prev2[1] not in ('def', 'class'))
+                    and (self.header != 'case')
+                    and not (self.decorators and (self.decorators[-1] is prev))):
+                # A call of the form name(...) or ....name(...)
+                self.mark(prev, Mark.FUNC_CALL)
+            self.depth += 1
+        elif string in closers:
+            self.depth -= 1
+        elif (string == ':=') and (prev[0] == token.NAME):
+            self.mark(prev, Mark.ASSIGN)
+
+        self.prev2 = prev
+        self.prev = tup
+
+        if typ in unpositioned_tokens:
+            self.endStatement()
+            return
+        if self.depth == 0:
+            if string == 'lambda':
+                # Until its colon, "=" gives the default value of a parameter
+                self.lambdas += 1
+                self.live = False
+            elif self.lambdas:
+                if string == ':':
+                    self.lambdas -= 1
+            elif (string == 'if') and (self.header == 'case'):
+                # Patterns hold no calls, but guards do
+                self.header = string
+            elif (string == '=') or (string in aug_assigns):
+                self.endTarget(True)
+                return
+            elif string == ';':
+                self.endStatement()
+                return
+            elif string == ':':
+                if (self.first in compound_keywords) or self.header:
+                    self.endStatement()
+                    return
+                if self.colon is None:
+                    # An annotation: what comes before is assigned to if an
+                    # "=" follows
+                    self.colon = len(self.pending) - 1
+            elif self.live and (self.colon is None):
+                if (typ in (token.STRING, token.NUMBER)) or ((typ == token.NAME) and (string in python_keywords)):
+                    # Targets hold no keywords or literals, the names added
+                    # with --keywords can be assigned to
+                    self.live = False
+                elif (typ != token.NAME) and (string not in target_ops or
+                                              (self.segStart and string not in ('(', '[', '*'))):
+                    self.live = False
+        self.segStart = False
+
+        if (self.live or (self.soft is not None)) and (len(self.pending) > max_lookahead):
+            self.live = False
+            self.soft = None
+        if (not self.live) and (self.decorators is None) and (self.soft is None):
+            # Hold back the last terminal, which the next one might mark
+            self.emit(len(self.pending) - 1)
+
+
+def groupStart(terms):
+    """ Index of the opener matching the closer ending the given terminals.
+    """
+    if terms[-1][1] not in closers:
+        return -1
+    depth = 0
+    for i in range(len(terms) - 1, -1, -1):
+        string = terms[i][1]
+        if string in closers:
+            depth += 1
+        elif string in openers:
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+
+def walkFast(ctx, sourcecode):
+    """ Scan the terminals of source code as tokenize generates them,
+        appending index lines to the buffer.
+    """
+    marker = FastMarker(ctx)
+    try:
+        for term, start, end in generateTerms(sourcecode, []):
+            marker.feed(term)
+    except Exception as e:
+        e.lineno = marker.lineno
+        raise e
+
+def parseFast(ctx, sourcecode, dump=False):
+    """ The fast engine: index source code from one pass of the tokenize
+        module, marking symbols from the terminals around them.
+    """
+    if dump:
+        for term, start, end in generateTerms(sourcecode, []):
+            print("%s %r %d" % (nodeNames[term[0]], term[1], term[2]))
+
+    with timed('walk', len(sourcecode)) as phase:
+        walkFast(ctx, sourcecode)
+        phase.count = len(ctx.buff)
+
+# The available indexing engines, by name
+engines = {'ast': parseAst, 'fast': parseFast}
+if parser is not None:
+    engines['cst'] = parseCst
+default_engine = 'ast'
+
+def parseSource(sourcecode, indexbuff, indexbuff_len, dump=False, engine=None):
     """Parses python source code and puts the resulting index information into the buffer.
     """
     if len(sourcecode) == 0:
         return indexbuff_len
 
-    # Parse the source to an Concrete Syntax Tree (cst)
-    sourcecode = sourcecode.replace('\r\n', '\n')
+    if '\r\n' in sourcecode:
+        sourcecode = sourcecode.replace('\r\n', '\n')
     if sourcecode[-1] != '\n':
         # We need to make sure files are terminated by a newline.
         sourcecode += '\n'
-    cst = parser.suite(sourcecode)
-
-    if dump:
-        dumpCst(cst)
 
     ctx = Context()
 
-    walkCst(ctx, cst.totuple(True))
+    engines[engine or default_engine](ctx, sourcecode, dump)
     indexbuff.extend(ctx.buff)
     indexbuff_len += len(ctx.buff)
     return indexbuff_len
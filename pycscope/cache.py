@@ -0,0 +1,131 @@
+"""
+PyCscope index cache
+
+A persistent cache of the index lines of each source file, kept in a single
+SQLite database, so that files which have not changed since a previous run
+need not be parsed again.
+"""
+
+import hashlib, os, sqlite3, sys, time
+
+
+# Entries not used by any run for this long are evicted (seconds)
+MAX_AGE = 30 * 24 * 60 * 60
+
+schema = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT NOT NULL,     -- Full path of the source file
+    key TEXT NOT NULL,      -- Settings the index was generated with
+    mtime REAL NOT NULL,    -- Modification time of the source file
+    size INTEGER NOT NULL,  -- Size of the source file
+    digest TEXT NOT NULL,   -- Hash of the contents of the source file
+    checked REAL NOT NULL,  -- When the stat data was recorded
+    used INTEGER NOT NULL,  -- When the entry was last used by a run
+    lines BLOB NOT NULL,    -- Index lines of the file, after its file mark
+    PRIMARY KEY (path, key)
+)
+"""
+
+if sys.hexversion < 0x03000000:
+    def toBlob(text):
+        return buffer(text)
+
+    def fromBlob(blob):
+        return str(blob)
+else:
+    def toBlob(text):
+        return text.encode('utf-8')
+
+    def fromBlob(blob):
+        return bytes(blob).decode('utf-8')
+
+
+def digestFile(fullpath):
+    """ Hash the contents of a file, returning the digest along with the
+        contents, which need not be read again to parse the file.
+    """
+    with open(fullpath, 'rb') as f:
+        data = f.read()
+    return hashlib.sha1(data).hexdigest(), data
+
+
+class IndexCache(object):
+    """ The cache of the index lines of source files.
+
+        Entries are keyed by the full path of a file and by a key naming the
+        settings the index lines were generated with (the settings string
+        main() builds: the pycscope version, the engine, whether strings
+        are symbols, whether string names are, the extra keywords and the
+        size of the files indexed with the fast engine), so that runs with
+        different settings do not share lines.
+
+        An entry is used when the size and modification time of its file
+        are unchanged, or failing that, when the contents of its file hash
+        to the same digest.
+    """
+    def __init__(self, path, key, max_age=MAX_AGE):
+        self.db = sqlite3.connect(path)
+        self.db.execute(schema)
+        self.key = key
+        self.max_age = max_age
+        self.now = int(time.time())
+
+    def lookup(self, fullpath):
+        """ Look up the index lines for a file.
+
+            Returns the lines, or None if they need to be generated, along
+            with the stat data and digest of the file to store with newly
+            generated lines, and the contents of the file, if they were read
+            to digest them.
+        """
+        try:
+            st = os.stat(fullpath)
+        except OSError:
+            # Let the parsing report the error
+            return None, None, None
+
+        row = self.db.execute("SELECT mtime, size, digest, checked, lines FROM files"
+                              " WHERE path = ? AND key = ?",
+                              (fullpath, self.key)).fetchone()
+        if row is not None:
+            mtime, size, digest, checked, lines = row
+            # A file modified within a second of when its stat data was
+            # recorded could have been modified again without its
+            # modification time changing, so only the digest is trusted.
+            if (mtime == st.st_mtime) and (size == st.st_size) and (mtime < checked - 1):
+                self.db.execute("UPDATE files SET used = ? WHERE path = ? AND key = ?",
+                                (self.now, fullpath, self.key))
+                return fromBlob(lines), None, None
+
+        try:
+            filedigest, data = digestFile(fullpath)
+        except (IOError, OSError):
+            return None, None, None
+        info = (st.st_mtime, st.st_size, filedigest)
+
+        if (row is not None) and (digest == info[2]):
+            # Only the stat data changed
+            self.db.execute("UPDATE files SET mtime = ?, size = ?, checked = ?, used = ?"
+                            " WHERE path = ? AND key = ?",
+                            (info[0], info[1], time.time(), self.now, fullpath, self.key))
+            return fromBlob(lines), None, None
+
+        return None, info, data
+
+    def store(self, fullpath, info, lines):
+        """ Store the index lines for a file, given the stat data and digest
+            returned by lookup() before the file was parsed.
+        """
+        mtime, size, digest = info
+        self.db.execute("INSERT OR REPLACE INTO files"
+                        " (path, key, mtime, size, digest, checked, used, lines)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (fullpath, self.key, mtime, size, digest, time.time(), self.now,
+                         toBlob(lines)))
+
+    def close(self):
+        """ Evict the entries unused for too long and save the cache.
+        """
+        self.db.execute("DELETE FROM files WHERE used < ?", (self.now - self.max_age,))
+        self.db.commit()
+        self.db.close()
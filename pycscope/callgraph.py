@@ -0,0 +1,231 @@
+"""
+PyCscope call graph
+
+The functions each function calls, and those calling it, gathered from the
+function definition, end and call marks of the index lines of the files
+as the cross-ref file is written, and saved as a file of sorted arrays
+which is mapped into memory to be queried, so that the calls made by or to
+a function, directly or not, are found without scanning the cross-ref
+file.
+
+Like cscope's, the graph is made of function names: calls made outside of
+any function are made by "<global>". All the numbers in the file are
+unsigned 32 bit integers, in little-endian byte order:
+
+  - the magic string "PYCSCG01", the number of names and of calls;
+  - the offsets of the names in the table of names, sorted, plus the
+    offset of the end of the table;
+  - for each name, the index of its first callee in the callees array,
+    plus the length of the array, then the callees array, holding the
+    indexes of the names of the callees of each function, sorted;
+  - the same arrays for the callers of each function;
+  - the table of the names, encoded in UTF-8.
+"""
+
+import mmap, struct
+
+from pycscope import Mark, decoded, encoded
+
+
+MAGIC = b"PYCSCG01"
+
+# The caller of the calls made outside of any function
+GLOBAL = "<global>"
+
+# The name the call graph file is written under, for the default cross-ref
+# file name
+CG_NAME = "cscope.cg.out"
+
+counts_struct = struct.Struct("<II")
+uint_struct = struct.Struct("<I")
+
+def fileName(indexfn):
+    """ The name the call graph file is written under, for a given cross-ref
+        file name.
+    """
+    if indexfn == "cscope.out":
+        return CG_NAME
+    return indexfn + ".cg"
+
+
+def packUints(values):
+    return struct.pack("<%dI" % len(values), *values)
+
+
+class CallGraphBuilder(object):
+    """ The calls made by each function, gathered from the index lines of
+        the files as the cross-ref file is written, to be written out as a
+        call graph file.
+    """
+    def __init__(self, symbols):
+        self.symbols = symbols  # The names of the functions, numbered
+        self.calls = set()      # (Caller, callee) pairs, as symbol numbers
+
+    def add(self, data):
+        """ Add the calls made in an uncompressed chunk of the index, given
+            as bytes, made of the index lines of one file.
+        """
+        funcdef = encoded("\t" + Mark.FUNC_DEF)
+        funcend = encoded("\t" + Mark.FUNC_END)
+        funcall = encoded("\t" + Mark.FUNC_CALL)
+        intern = self.symbols.intern
+        outside = caller = intern(encoded(GLOBAL))
+        calls = self.calls
+        # Only marked symbols start their line with a tab
+        for line in data.split(b"\n"):
+            if line[:1] != b"\t":
+                continue
+            mark = line[:2]
+            if mark == funcall:
+                calls.add((caller, intern(line[2:])))
+            elif mark == funcdef:
+                caller = intern(line[2:])
+            elif mark == funcend:
+                caller = outside
+
+    def write(self, fout):
+        """ Write the call graph file.
+        """
+        symbolids = set()
+        for caller, callee in self.calls:
+            symbolids.add(caller)
+            symbolids.add(callee)
+        names = sorted(self.symbols.name(symbolid) for symbolid in symbolids)
+        ids = dict((self.symbols.intern(name), i) for i, name in enumerate(names))
+
+        callees = [[] for name in names]
+        callers = [[] for name in names]
+        for caller, callee in self.calls:
+            callees[ids[caller]].append(ids[callee])
+            callers[ids[callee]].append(ids[caller])
+
+        offsets = [0]
+        for name in names:
+            offsets.append(offsets[-1] + len(name))
+
+        fout.write(MAGIC)
+        fout.write(counts_struct.pack(len(names), len(self.calls)))
+        fout.write(packUints(offsets))
+        for adjacency in (callees, callers):
+            starts = [0]
+            for adjacent in adjacency:
+                starts.append(starts[-1] + len(adjacent))
+            fout.write(packUints(starts))
+            for adjacent in adjacency:
+                fout.write(packUints(sorted(adjacent)))
+        fout.write(b"".join(names))
+
+
+class CallGraph(object):
+    """ A call graph file, mapped into memory, to run queries on.
+    """
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        try:
+            try:
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, EnvironmentError):
+                # An empty file cannot be mapped
+                raise ValueError("Not a call graph file written by pycscope")
+            if self.map[:len(MAGIC)] != MAGIC:
+                self.map.close()
+                raise ValueError("Not a call graph file written by pycscope")
+        except Exception:
+            self.file.close()
+            raise
+        self.count, calls = counts_struct.unpack_from(self.map, len(MAGIC))
+        # Offsets of the arrays and of the table of names
+        self.offsets = len(MAGIC) + counts_struct.size
+        self.calleesPos = self.offsets + 4 * (self.count + 1)
+        self.callersPos = self.calleesPos + 4 * (self.count + 1 + calls)
+        self.names = self.callersPos + 4 * (self.count + 1 + calls)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def uint(self, pos, i):
+        return uint_struct.unpack_from(self.map, pos + 4 * i)[0]
+
+    def name(self, i):
+        """ The name of the given index.
+        """
+        return decoded(self.map[self.names + self.uint(self.offsets, i):
+                                self.names + self.uint(self.offsets, i + 1)])
+
+    def find(self, name):
+        """ The index of a name, by binary search, or None.
+        """
+        name = encoded(name)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self.names + self.uint(self.offsets, mid)
+            end = self.names + self.uint(self.offsets, mid + 1)
+            found = self.map[start:end]
+            if found == name:
+                return mid
+            if found < name:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def adjacent(self, pos, i):
+        """ The indexes of the names adjacent to the given one, in the
+            adjacency arrays at the given offset.
+        """
+        start, end = struct.unpack_from("<II", self.map, pos + 4 * i)
+        base = pos + 4 * (self.count + 1)
+        return struct.unpack_from("<%dI" % (end - start), self.map, base + 4 * start)
+
+    def reach(self, pos, name, depth):
+        """ The names reached from a name through the given adjacency
+            arrays, with the number of calls each one is away, up to
+            'depth' calls away (None for no limit).
+        """
+        i = self.find(name)
+        if i is None:
+            return {}
+        found = {}
+        frontier = [i]
+        distance = 0
+        while frontier and ((depth is None) or (distance < depth)):
+            distance += 1
+            following = []
+            for j in frontier:
+                for k in self.adjacent(pos, j):
+                    if k not in found:
+                        found[k] = distance
+                        following.append(k)
+            frontier = following
+        return dict((self.name(k), d) for k, d in found.items())
+
+    def callees(self, name):
+        """ The names of the functions the function calls.
+        """
+        return sorted(self.reach(self.calleesPos, name, 1))
+
+    def callers(self, name):
+        """ The names of the functions calling the function.
+        """
+        return sorted(self.reach(self.callersPos, name, 1))
+
+    def transitiveCallees(self, name, depth=None):
+        """ The names of the functions the function calls, directly or not,
+            with the number of calls each one is away.
+        """
+        return self.reach(self.calleesPos, name, depth)
+
+    def transitiveCallers(self, name, depth=None):
+        """ The names of the functions calling the function, directly or
+            not, with the number of calls each one is away.
+        """
+        return self.reach(self.callersPos, name, depth)
@@ -0,0 +1,140 @@
+"""
+PyCscope cross-ref compression
+
+Unless told not to (with -c), cscope compresses the text of its cross-ref
+file: the most frequent C keywords are replaced with control characters,
+and the most frequent pairs of characters ("digraphs") with characters
+above 0x7f. This applies the same compression to the lines of the index,
+only where it can be undone exactly.
+
+As in cscope, characters outside of ASCII are not escaped, so they read
+back as digraphs: only ASCII text survives compression.
+"""
+
+import re
+
+
+def byte(c):
+    """ A single byte, given its value.
+    """
+    return bytes(bytearray([c]))
+
+
+# cscope's table of compressed keywords, indexed by the control character
+# replacing them, with the delimiter that follows them: a keyword with a
+# delimiter is followed by a blank, and then by the delimiter itself if it
+# is not a blank. The entries for tab and newline keep those characters as
+# they are.
+keywords = [
+    (b"", None), (b"#define", b' '), (b"#include", b' '), (b"break", None),
+    (b"case", b' '), (b"char", b' '), (b"continue", None), (b"default", None),
+    (b"double", b' '), (b"\t", None), (b"\n", None), (b"else", b' '),
+    (b"enum", b' '), (b"extern", b' '), (b"float", b' '), (b"for", b'('),
+    (b"goto", b' '), (b"if", b'('), (b"int", b' '), (b"long", b' '),
+    (b"register", b' '), (b"return", None), (b"short", b' '), (b"sizeof", None),
+    (b"static", b' '), (b"struct", b' '), (b"switch", b'('), (b"typedef", b' '),
+    (b"union", b' '), (b"unsigned", b' '), (b"void", b' '), (b"while", b'('),
+]
+
+# The first and second characters of the compressed digraphs
+dichar1 = b" teisaprnl(of)=c"
+dichar2 = b" tnerpla"
+
+compressions = {}
+expansions = {}
+keyword_forms = []
+for code, (text, delim) in enumerate(keywords):
+    if code in (0, 9, 10):
+        continue
+    if delim is None:
+        form = text
+        keyword_forms.append(re.escape(form) + b"(?![A-Za-z0-9_])")
+    else:
+        form = text + b' '
+        if delim != b' ':
+            form += delim
+        keyword_forms.append(re.escape(form))
+    compressions[form] = byte(code)
+    expansions[byte(code)] = form
+for i in range(len(dichar1)):
+    for j in range(len(dichar2)):
+        digraph = dichar1[i:i + 1] + dichar2[j:j + 1]
+        compressions[digraph] = byte(0x80 + 8 * i + j)
+        expansions[byte(0x80 + 8 * i + j)] = digraph
+
+keyword_pattern = b"(?<![A-Za-z0-9_])(?:" + b"|".join(keyword_forms) + b")"
+dichar1_class = b"[" + re.escape(dichar1) + b"]"
+dichar2_class = b"[" + re.escape(dichar2) + b"]"
+
+# A digraph is not compressed when its second character starts a keyword
+text_re = re.compile(keyword_pattern + b"|" + dichar1_class
+                     + b"(?!" + keyword_pattern + b")" + dichar2_class)
+symbol_re = re.compile(dichar1_class + dichar2_class)
+expansion_re = re.compile(b"[\x80-\xff\x01-\x08\x0b-\x1f]")
+
+
+def compressed(match):
+    return compressions[match.group()]
+
+
+def expanded(match):
+    return expansions[match.group()]
+
+
+def compressText(text):
+    """ Compress the non-symbol text of a line.
+    """
+    return text_re.sub(compressed, text)
+
+
+def compressSymbol(symbol):
+    """ Compress a symbol, whose digraphs only are compressed.
+    """
+    return symbol_re.sub(compressed, symbol)
+
+
+def expand(data):
+    """ Expand compressed text.
+    """
+    return expansion_re.sub(expanded, data)
+
+
+def compressIndex(data):
+    """ Compress a chunk of the index, given as bytes, which must be made
+        of whole lines and file marks.
+
+        The line numbers, marks and file names are left as they are.
+    """
+    out = []
+    pos = 0
+    end = len(data)
+    while pos < end:
+        if data.startswith(b'\n\t@', pos):
+            lineend = data.find(b'\n\n', pos + 1)
+            if lineend < 0:
+                lineend = end
+            out.append(data[pos:lineend + 2])
+            pos = lineend + 2
+            continue
+
+        lineend = data.find(b'\n\n', pos)
+        if lineend < 0:
+            lineend = end
+
+        # Lines of non-symbol text alternate with lines of symbols,
+        # starting with the line number
+        lines = data[pos:lineend].split(b'\n')
+        num, sep, text = lines[0].partition(b' ')
+        lines[0] = num + sep + compressText(text)
+        for i in range(1, len(lines)):
+            line = lines[i]
+            if not i % 2:
+                lines[i] = compressText(line)
+            elif line[:1] == b'\t':
+                lines[i] = line[:2] + compressSymbol(line[2:])
+            else:
+                lines[i] = compressSymbol(line)
+        out.append(b'\n'.join(lines))
+        out.append(data[lineend:lineend + 2])
+        pos = lineend + 2
+    return b''.join(out)
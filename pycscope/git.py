@@ -0,0 +1,122 @@
+"""
+PyCscope git support
+
+Asks git for the files to index, and for those changed since a revision,
+instead of searching the directories and looking at the modification time
+of each file:
+
+  - "git ls-files" lists the files git tracks, and those it does not track
+    but does not ignore either (untracked files), leaving out the tracked
+    files deleted from the work tree;
+  - "git diff --name-status" lists the files added, modified, renamed or
+    copied since the revision, whether committed, staged or not.
+"""
+
+import os, subprocess, sys
+
+from pycscope import isPython
+
+
+class GitError(Exception):
+    """ Raised when git cannot be run, or fails.
+    """
+    pass
+
+
+if hasattr(os, 'fsdecode'):
+    fsDecode = os.fsdecode
+else:
+    # Python 2, where file names are byte strings
+    def fsDecode(name):
+        return name
+
+
+def runGit(basepath, *args):
+    """ Run a git command in the given directory, returning the entries of
+        its output, which are separated by NUL characters (-z).
+    """
+    try:
+        proc = subprocess.Popen(('git',) + args, cwd=basepath, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+    except OSError as e:
+        raise GitError("Cannot run git: %s" % e)
+    out, err = proc.communicate()
+    if proc.returncode:
+        err = err.decode(sys.getfilesystemencoding(), 'replace').strip()
+        raise GitError(err or "git %s failed" % args[0])
+    return [fsDecode(entry) for entry in out.split(b'\0') if entry]
+
+
+def isExcluded(excluded, dirname, relpath):
+    """ Whether a file, or any of the directories leading to it from the
+        given directory, is to be skipped, as genFiles() would skip them.
+    """
+    path = dirname
+    for part in relpath.split(os.sep):
+        path = os.path.join(path, part)
+        if excluded(part, path):
+            return True
+    return False
+
+
+def listFiles(basepath, args, recurse, excluded):
+    """ The Python files git knows of among the given files and directories,
+        named as pycscope.genFiles() names them, along with the set of the
+        normalized paths of the untracked ones.
+
+        Like genFiles(), only the files directly in the directories given
+        are listed unless 'recurse' is set.
+    """
+    fnames = []
+    untracked = set()
+    for name in args:
+        if not os.path.isdir(os.path.join(basepath, name)):
+            if isPython(name) and not excluded(os.path.basename(name), name):
+                fnames.append(name)
+            continue
+
+        # Tracked files are listed twice when deleted from the work tree,
+        # tagged "R" the second time
+        deleted = set()
+        entries = []
+        for entry in runGit(basepath, 'ls-files', '-z', '-t', '--cached', '--deleted', '--others',
+                            '--exclude-standard', '--', name):
+            tag, path = entry[0], entry[2:]
+            if tag == 'R':
+                deleted.add(path)
+            elif isPython(path):
+                entries.append((tag, path))
+
+        for tag, path in entries:
+            if path in deleted:
+                continue
+            # Unmerged files are listed once per stage
+            deleted.add(path)
+            relpath = os.path.relpath(path, name)
+            if not recurse and os.path.dirname(relpath):
+                continue
+            if isExcluded(excluded, name, relpath):
+                continue
+            fname = os.path.join(name, relpath)
+            fnames.append(fname)
+            if tag == '?':
+                untracked.add(os.path.normpath(fname))
+    return fnames, untracked
+
+
+def changedFiles(basepath, rev):
+    """ The normalized paths of the files added, modified, renamed or copied
+        since a revision, relative to the given directory; files deleted or
+        renamed away are left out, as they are not listed anymore.
+    """
+    changed = set()
+    entries = iter(runGit(basepath, 'diff', '-z', '--name-status', '--relative', rev, '--'))
+    for status in entries:
+        path = next(entries)
+        if status[0] in 'RC':
+            # Renamed or copied, followed by the new path
+            path = next(entries)
+        elif status[0] == 'D':
+            continue
+        changed.add(os.path.normpath(path))
+    return changed
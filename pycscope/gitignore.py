@@ -0,0 +1,155 @@
+"""
+PyCscope .gitignore handling
+
+Tells which files and directories git ignores, from the .gitignore files of
+the directories searched and of those above them up to the top of the work
+tree, and from the work tree's info/exclude file. The global excludes file
+of the user is not read.
+"""
+
+import os, re
+
+
+def translate(pattern):
+    """ Translate a .gitignore glob into a regular expression, matching a
+        path relative to the directory of the .gitignore file.
+    """
+    regex = []
+    parts = pattern.split('/')
+    for i, part in enumerate(parts):
+        last = (i == len(parts) - 1)
+        if part == '**':
+            # A trailing "/**" matches everything inside, other ones match
+            # any number of directories
+            regex.append('.*' if last else '(?:.*/)?')
+            continue
+
+        j = 0
+        while j < len(part):
+            c = part[j]
+            j += 1
+            if c == '*':
+                regex.append('[^/]*')
+            elif c == '?':
+                regex.append('[^/]')
+            elif c == '[':
+                end = part.find(']', j + 1 if part[j:j + 1] in ('!', '^') else j)
+                if end < 0:
+                    regex.append('\\[')
+                    continue
+                chars = part[j:end].replace('\\', '\\\\')
+                if chars[:1] in ('!', '^'):
+                    chars = '^' + chars[1:]
+                regex.append('[%s]' % chars)
+                j = end + 1
+            elif c == '\\' and j < len(part):
+                regex.append(re.escape(part[j]))
+                j += 1
+            else:
+                regex.append(re.escape(c))
+        if not last:
+            regex.append('/')
+    return ''.join(regex)
+
+
+def parseRule(line):
+    """ Parse a line of a .gitignore file into a compiled pattern, whether
+        the pattern is negated, and whether it only matches directories;
+        blank lines and comments give None.
+    """
+    line = line.rstrip('\r\n')
+    # Trailing blanks are ignored, unless escaped
+    stripped = line.rstrip(' ')
+    if stripped.endswith('\\') and len(stripped) < len(line):
+        stripped += ' '
+    line = stripped
+    if not line or line.startswith('#'):
+        return None
+
+    negate = line.startswith('!')
+    if negate:
+        line = line[1:]
+    elif line.startswith('\\'):
+        line = line[1:]
+
+    dirOnly = line.endswith('/')
+    if dirOnly:
+        line = line[:-1]
+    if not line:
+        return None
+
+    # A pattern with a slash but at its end is relative to the directory of
+    # the .gitignore file, others match a name at any depth
+    regex = translate(line.lstrip('/'))
+    if '/' not in line:
+        regex = '(?:.*/)?' + regex
+    return re.compile(regex + '$'), negate, dirOnly
+
+
+def readRules(path):
+    """ Read the rules of a .gitignore file, if there is one.
+    """
+    try:
+        with open(path) as f:
+            lines = f.readlines()
+    except (IOError, OSError):
+        return ()
+    return tuple(rule for rule in map(parseRule, lines) if rule is not None)
+
+
+class IgnoreRules(object):
+    """ The rules that apply to the entries of a directory, from the
+        .gitignore files of the directory and of the ones above it.
+    """
+    def __init__(self, levels=()):
+        self.levels = levels    # Directory path, with a trailing slash, and its rules
+
+    def enter(self, dirpath):
+        """ The rules that apply in a subdirectory, given its normalized
+            path.
+        """
+        rules = readRules(os.path.join(dirpath, '.gitignore'))
+        if not rules:
+            return self
+        prefix = dirpath.replace(os.sep, '/').rstrip('/') + '/'
+        return IgnoreRules(self.levels + ((prefix, rules),))
+
+    def ignored(self, path, isdir):
+        """ Is a file or directory, given its normalized path, ignored?
+
+            The last rule matching it decides, the rules of deeper
+            directories coming after those of the directories above.
+        """
+        path = path.replace(os.sep, '/')
+        for prefix, rules in reversed(self.levels):
+            rel = path[len(prefix):]
+            for regex, negate, dirOnly in reversed(rules):
+                if (isdir or not dirOnly) and regex.match(rel):
+                    return not negate
+        return False
+
+
+def rulesFor(dirpath):
+    """ The rules that apply in a directory, given its normalized path,
+        from the top of the work tree it is in down to itself.
+    """
+    dirs = [dirpath]
+    top = dirpath
+    while not os.path.exists(os.path.join(top, '.git')):
+        parent = os.path.dirname(top)
+        if parent == top:
+            # Not in a work tree, only the directory's own rules apply
+            dirs = [dirpath]
+            top = None
+            break
+        top = parent
+        dirs.append(top)
+
+    ignores = IgnoreRules()
+    if top is not None:
+        rules = readRules(os.path.join(top, '.git', 'info', 'exclude'))
+        if rules:
+            ignores = IgnoreRules(((top.replace(os.sep, '/').rstrip('/') + '/', rules),))
+    for d in reversed(dirs):
+        ignores = ignores.enter(d)
+    return ignores
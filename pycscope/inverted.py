@@ -0,0 +1,225 @@
+"""
+PyCscope inverted index
+
+The inverted index cscope uses for quick symbol searches (its -q option),
+so that a query looks up the postings of the matching symbols instead of
+scanning the whole cross-ref file. It is made of two files:
+
+  - the term file, holding the sorted symbols ("terms") in logical blocks,
+    preceded by a control block and followed by a superindex of the first
+    term of each block, and
+  - the postings file, holding for each term the references to the lines
+    of the cross-ref file it occurs on.
+
+Like the ones cscope writes, both files are in the native byte order and C
+long size of the machine.
+"""
+
+import struct, sys
+
+
+# Size of the control block and of each logical block of the term file
+# (BUFSIZ, as cscope is built with glibc)
+BLOCK_SIZE = 8192
+
+# Inverted index format version
+FORMAT_VERSION = 1
+
+# Posting type of symbols without a mark (cscope's IDENT token)
+IDENT = 2
+
+# Longest term cscope can hold, as the size of a term is kept in a byte
+MAX_TERM = 255
+
+# The file names cscope uses for the default cross-ref file
+INV_NAME = "cscope.in.out"
+POST_NAME = "cscope.po.out"
+
+LONG_SIZE = struct.calcsize('l')
+
+# version, filestat, sizeblk, startbyte, supsize, cntlsize, share
+param_struct = struct.Struct('lllllll')
+
+# Offset and size of the term in its block, growth space, number of postings
+entry_struct = struct.Struct('hBBl')
+assert entry_struct.size == 2 * LONG_SIZE
+
+# Line offset, function name offset, file index (24 bits) and type (8 bits)
+posting_struct = struct.Struct('lll')
+
+long_struct = struct.Struct('l')
+block_header_struct = struct.Struct('lll')
+
+if sys.byteorder == 'little':
+    def packFileType(fileindex, type):
+        return fileindex | (type << 24)
+else:
+    def packFileType(fileindex, type):
+        return (fileindex << (8 * LONG_SIZE - 24)) | (type << (8 * LONG_SIZE - 32))
+
+
+def fileNames(indexfn):
+    """ The names cscope looks for the term and postings files under, for
+        a given cross-ref file name.
+    """
+    if indexfn == "cscope.out":
+        return INV_NAME, POST_NAME
+    return indexfn + ".in", indexfn + ".po"
+
+
+class InvertedIndex(object):
+    """ The postings of the symbols of a cross-ref file, gathered as the
+        cross-ref file is written, to be written out as an inverted index.
+        The symbols of a compressed cross-ref file are expanded into terms.
+    """
+    def __init__(self, compressed=False):
+        self.postings = {}      # Packed postings, by term
+        self.fileindex = -1
+        self.fcnoffset = 0
+        self.expand = None
+        if compressed:
+            from pycscope.compress import expand
+            self.expand = expand
+
+    def __len__(self):
+        """ The number of terms, including the null term cscope starts its
+            index with.
+        """
+        return len(self.postings) + 1
+
+    def add(self, data, offset):
+        """ Add the postings of the symbols in a chunk of the cross-ref
+            file, given as UTF-8 encoded bytes, starting at the given
+            offset in the file.
+
+            Chunks must be added in order, and must be made of whole lines
+            and file marks.
+        """
+        pos = 0
+        end = len(data)
+        while pos < end:
+            if data.startswith(b'\n\t@', pos):
+                # A file mark starts the symbols of the next file in the
+                # list of file names
+                self.fileindex += 1
+                self.fcnoffset = 0
+                pos = data.find(b'\n\n', pos + 1)
+                if pos < 0:
+                    break
+                pos += 2
+                continue
+
+            lineend = data.find(b'\n\n', pos)
+            if lineend < 0:
+                lineend = end
+            lineoffset = offset + pos
+
+            # Lines of non-symbol text alternate with lines of symbols,
+            # starting with the line number
+            for i, line in enumerate(data[pos:lineend].split(b'\n')):
+                if i % 2:
+                    self.addSymbol(line, lineoffset, offset + pos)
+                pos += len(line) + 1
+            pos = lineend + 2
+
+    def addSymbol(self, line, lineoffset, symoffset):
+        """ Add the posting of the symbol on a line of the cross-ref file.
+        """
+        if line[:1] == b'\t':
+            mark = line[1:2]
+            term = line[2:]
+            type = ord(mark)
+        else:
+            mark = None
+            term = line
+            type = IDENT
+
+        fcnoffset = self.fcnoffset
+        if mark == b'$':
+            # cscope finds the name of a function definition on its line,
+            # and then that of the function in the following postings
+            fcnoffset = 0
+            self.fcnoffset = symoffset + 2
+        elif mark == b'}':
+            self.fcnoffset = 0
+
+        if self.expand is not None:
+            term = self.expand(term)
+        if (not term) or (len(term) > MAX_TERM):
+            return
+
+        posting = posting_struct.pack(lineoffset, fcnoffset, packFileType(self.fileindex, type))
+        try:
+            self.postings[term].extend(posting)
+        except KeyError:
+            self.postings[term] = bytearray(posting)
+
+    def write(self, finv, fpost):
+        """ Write out the term and postings files.
+        """
+        # The index starts with a null term, which cscope skips; it is
+        # given a posting so that cscope can tell when it has wrapped
+        # around back to it.
+        entries = [(b'', 1, 0)]
+        postoffset = 0
+        for term in sorted(self.postings):
+            postings = self.postings[term]
+            fpost.write(bytes(postings))
+            entries.append((term, len(postings) // posting_struct.size, postoffset))
+            postoffset += len(postings)
+
+        # Fill the logical blocks in order, from both ends
+        blocks = [[]]
+        used = block_header_struct.size
+        for entry in entries:
+            size = (termLongs(entry[0]) + 3) * LONG_SIZE
+            if used + size > BLOCK_SIZE:
+                blocks.append([])
+                used = block_header_struct.size
+            blocks[-1].append(entry)
+            used += size
+
+        numblocks = len(blocks)
+        startbyte = BLOCK_SIZE + numblocks * BLOCK_SIZE
+
+        # The superindex holds the offset of the first term of each block,
+        # but for the first block which gets a blank
+        firsts = [b' '] + [block[0][0] for block in blocks[1:]]
+        offsets = []
+        stroffset = (numblocks + 1) * LONG_SIZE
+        for first in firsts:
+            offsets.append(stroffset)
+            stroffset += len(first) + 1
+
+        param = param_struct.pack(FORMAT_VERSION, 0, BLOCK_SIZE, startbyte, stroffset,
+                                  BLOCK_SIZE, 0)
+        finv.write(param + b'\0' * (BLOCK_SIZE - len(param)))
+        for num, block in enumerate(blocks):
+            finv.write(packBlock(block, num, num == numblocks - 1))
+        finv.write(struct.pack('%dl' % (numblocks + 1), numblocks, *offsets))
+        finv.write(b''.join(first + b'\0' for first in firsts))
+
+
+def termLongs(term):
+    """ The number of longs a term takes up in a logical block.
+    """
+    return (len(term) + LONG_SIZE - 1) // LONG_SIZE
+
+
+def packBlock(entries, num, last):
+    """ Pack the entries of a logical block of the term file.
+
+        The block starts with the number of entries and the numbers of the
+        next block (wrapping around to the first one) and previous block,
+        followed by the entries. Each entry locates its term, which is
+        followed by the offset of its postings, from the end of the block.
+    """
+    block = bytearray(BLOCK_SIZE)
+    block_header_struct.pack_into(block, 0, len(entries), 0 if last else num + 1, num - 1)
+    termoffset = BLOCK_SIZE
+    for i, (term, count, postoffset) in enumerate(entries):
+        termoffset -= (termLongs(term) + 1) * LONG_SIZE
+        block[termoffset:termoffset + len(term)] = term
+        long_struct.pack_into(block, termoffset + termLongs(term) * LONG_SIZE, postoffset)
+        entry_struct.pack_into(block, (3 + 2 * i) * LONG_SIZE, termoffset, len(term), 0, count)
+    return bytes(block)
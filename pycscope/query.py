@@ -0,0 +1,261 @@
+"""
+PyCscope queries
+
+Answers the queries cscope answers with its -L option from a cross-ref file
+written by pycscope, without reading it into memory: the file is mapped,
+the symbols are searched for with regular expressions run over the mapping,
+and only the lines found are turned into strings.
+
+The offsets of the file sections are found on the first query, and those
+of the lines of a file on the first query landing in it. The text searches
+read the source files instead, as cscope does.
+"""
+
+import bisect, io, mmap, os, re
+from collections import namedtuple
+
+from pycscope import Mark, decoded, encoded, header_re
+
+
+# A line found by a query, as cscope -L lists it: the file name, the name
+# of the function the line is in (or of the symbol, for definitions and
+# calls made), the line number and the text of the line
+Reference = namedtuple('Reference', 'file function line text')
+
+# The function name of lines outside of any function
+GLOBAL = "<global>"
+
+# The function name, and text, of the lines found by text searches (and of
+# the files found)
+UNKNOWN = "<unknown>"
+
+# The marks of the symbols a cross-ref file can hold
+symbol_marks = (Mark.FUNC_DEF, Mark.FUNC_CALL, Mark.INCLUDE, Mark.ASSIGN, Mark.CLASS,
+                Mark.GLOBAL, Mark.LOCAL)
+
+# The marks of global definitions
+definition_marks = (Mark.FUNC_DEF, Mark.CLASS, Mark.GLOBAL)
+
+filemark_re = re.compile(br"\n\t@([^\n]+)\n")
+linestart_re = re.compile(br"\n\n(?=\d)")
+call_re = re.compile(br"\n\t`([^\n]+)")
+
+
+def splitLine(lines):
+    """ Split the index lines of a source line into its line number, its
+        symbols, as (mark, symbol) tuples, and its text. The mark of
+        symbols without one is an empty string.
+    """
+    lines = lines.split("\n")
+    lineno, sep, lines[0] = lines[0].partition(" ")
+    symbols = []
+    for i in range(1, len(lines), 2):
+        mark = ""
+        if lines[i][:1] == "\t":
+            mark, lines[i] = lines[i][1:2], lines[i][2:]
+        symbols.append((mark, lines[i]))
+    return int(lineno), symbols, "".join(lines).strip()
+
+
+class CrossRef(object):
+    """ A cross-ref file written by pycscope, mapped into memory, to run
+        queries on. Symbols are matched exactly.
+    """
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        try:
+            try:
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, EnvironmentError):
+                # An empty file cannot be mapped
+                raise ValueError("Not a cross-ref file written by pycscope")
+            match = header_re.match(self.map[:self.map.find(b"\n") + 1])
+            end = self.map.rfind(b"\n\t@\n")
+            if (match is None) or (end < match.end()):
+                self.map.close()
+                raise ValueError("Not a cross-ref file written by pycscope")
+        except Exception:
+            self.file.close()
+            raise
+        self.basepath = decoded(match.group(1))
+        self.expand = None
+        self.compressSymbol = None
+        if match.group(2) is None:
+            from pycscope.compress import compressSymbol, expand
+            self.expand = expand
+            self.compressSymbol = compressSymbol
+        self.start = match.end() - 1
+        self.end = end
+        self.starts = None      # Offsets of the file sections
+        self.names = None       # File names of the file sections
+        self.lines = {}         # Offsets of the lines of a file section, by index
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def sections(self):
+        """ Find the file sections, the first time only.
+        """
+        if self.starts is None:
+            self.starts = []
+            self.names = []
+            for match in filemark_re.finditer(self.map, self.start, self.end):
+                self.starts.append(match.start())
+                self.names.append(decoded(match.group(1)))
+        return self.starts
+
+    def sectionEnd(self, index):
+        if index + 1 < len(self.starts):
+            return self.starts[index + 1]
+        return self.end
+
+    def lineStarts(self, index):
+        """ The offsets of the lines of a file section, found the first time
+            only.
+        """
+        starts = self.lines.get(index)
+        if starts is None:
+            starts = [match.end() for match in
+                      linestart_re.finditer(self.map, self.starts[index], self.sectionEnd(index))]
+            self.lines[index] = starts
+        return starts
+
+    def symbol(self, name):
+        """ A symbol as found in the cross-ref file.
+        """
+        name = encoded(name)
+        if self.compressSymbol is not None:
+            name = self.compressSymbol(name)
+        return re.escape(name)
+
+    def search(self, marks, name, prefix=b""):
+        """ The offsets of the file sections and of the lines of a symbol
+            with one of the given marks, or with none if None is one of
+            them.
+        """
+        chars = b"".join(re.escape(encoded(mark)) for mark in marks if mark is not None)
+        pattern = b"\\t[" + chars + b"]"
+        if None in marks:
+            pattern = b"(?:" + pattern + b")?"
+        symbol_re = re.compile(b"\\n" + pattern + prefix + self.symbol(name) + b"(?=\\n)")
+        starts = self.sections()
+        for match in symbol_re.finditer(self.map, self.start, self.end):
+            pos = match.start()
+            yield bisect.bisect_right(starts, pos) - 1, pos
+
+    def reference(self, index, pos, function=None):
+        """ The reference to the line holding the given offset.
+        """
+        starts = self.lineStarts(index)
+        linestart = starts[bisect.bisect_right(starts, pos) - 1]
+        lineend = self.map.find(b"\n\n", linestart)
+        text = self.map[linestart:lineend]
+        if self.expand is not None:
+            text = self.expand(text)
+        lineno, symbols, text = splitLine(decoded(text))
+        if function is None:
+            function = self.function(index, pos)
+        return Reference(self.names[index], function, lineno, text)
+
+    def function(self, index, pos):
+        """ The name of the function the given offset is in.
+        """
+        start = self.starts[index]
+        # A definition is in the function it defines
+        defpos = self.map.rfind(b"\n\t" + encoded(Mark.FUNC_DEF), start, pos + 3)
+        if (defpos < 0) or (self.map.rfind(b"\n\t" + encoded(Mark.FUNC_END), defpos, pos) >= 0):
+            return GLOBAL
+        return self.name(defpos + 3)
+
+    def name(self, pos):
+        """ The symbol starting at the given offset.
+        """
+        name = self.map[pos:self.map.find(b"\n", pos)]
+        if self.expand is not None:
+            name = self.expand(name)
+        return decoded(name)
+
+    def findSymbol(self, name):
+        """ The lines the symbol is on (cscope's query 0).
+        """
+        return [self.reference(index, pos) for index, pos in self.search(symbol_marks + (None,), name)]
+
+    def findDefinition(self, name):
+        """ The global definitions of the symbol, of functions, classes and
+            other globals (cscope's query 1).
+        """
+        return [self.reference(index, pos, name) for index, pos in self.search(definition_marks, name)]
+
+    def findCallees(self, name):
+        """ The calls made by the function (cscope's query 2).
+        """
+        refs = []
+        for index, pos in self.search((Mark.FUNC_DEF,), name):
+            # The function ends at its end mark, or at the next definition
+            end = self.sectionEnd(index)
+            for mark in (Mark.FUNC_END, Mark.FUNC_DEF):
+                markpos = self.map.find(b"\n\t" + encoded(mark), pos + 1, end)
+                if markpos >= 0:
+                    end = markpos
+            for match in call_re.finditer(self.map, pos, end):
+                refs.append(self.reference(index, match.start(), self.name(match.start(1))))
+        return refs
+
+    def findCallers(self, name):
+        """ The calls made to the function (cscope's query 3).
+        """
+        return [self.reference(index, pos) for index, pos in self.search((Mark.FUNC_CALL,), name)]
+
+    def findText(self, text):
+        """ The lines of the source files holding the text (cscope's query
+            4).
+        """
+        return self.grep(lambda line: text in line)
+
+    def findEgrep(self, pattern):
+        """ The lines of the source files the regular expression matches
+            (cscope's query 6).
+        """
+        return self.grep(re.compile(pattern).search)
+
+    def grep(self, match):
+        self.sections()
+        refs = []
+        for fname in self.names:
+            try:
+                with io.open(os.path.join(self.basepath, fname), encoding='utf-8',
+                             errors='replace') as f:
+                    for lineno, line in enumerate(f, 1):
+                        if match(line):
+                            refs.append(Reference(fname, UNKNOWN, lineno, line.strip()))
+            except (IOError, OSError):
+                continue
+        return refs
+
+    def findAssignments(self, name):
+        """ The assignments to the symbol (cscope's query 9).
+        """
+        return [self.reference(index, pos) for index, pos in self.search((Mark.ASSIGN,), name)]
+
+    def findIncludes(self, name):
+        """ The imports of the module, or of any module it is the last part
+            of the dotted name of (cscope's query 8).
+        """
+        return [self.reference(index, pos)
+                for index, pos in self.search((Mark.INCLUDE,), name, br"(?:[^\n]*\.)?")]
+
+    def findFile(self, pattern):
+        """ The files whose names the regular expression matches (cscope's
+            query 7).
+        """
+        self.sections()
+        search = re.compile(pattern).search
+        return [Reference(fname, UNKNOWN, 1, UNKNOWN) for fname in self.names if search(fname)]
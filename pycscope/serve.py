@@ -0,0 +1,264 @@
+"""
+PyCscope query server
+
+A long-lived process answering queries with cscope's line-oriented
+protocol (its -l option), on standard input and output, or on each
+connection to a Unix socket: after a ">> " prompt, a line made of the
+number of a query (0 to 9, as in cscope's menu) followed by its pattern is
+answered with a "cscope: N lines" line, followed by a line for each
+reference found: its file name, function name, line number and text. A
+line starting with "q" ends the session, and one starting with "r" reloads
+the cross-ref file.
+
+Queries are run on a pycscope.query.CrossRef, reopened only when the
+modification time of the cross-ref file changes, and their results are
+kept in a cache of the most recently used ones.
+"""
+
+from __future__ import print_function
+
+import errno, getopt, os, socket, stat, sys, threading
+from collections import OrderedDict
+
+from pycscope.query import CrossRef
+from pycscope.watch import statKey
+
+
+__usage__ = """Usage: pycscope.py serve [-d] [-l] [-f reffile] [--results=N] [--socket=path]
+
+-d              Accepted for compatibility with cscope (the cross-ref file is never updated)
+-l              Accepted for compatibility with cscope (line-oriented mode is the only one)
+-f reffile      Use 'reffile' as cross-ref file name instead of 'cscope.out'
+--results=N     Keep the results of the N most recent queries (default: 256)
+--socket=path   Serve the connections to the Unix socket 'path' instead of
+                standard input and output"""
+
+
+# The methods of CrossRef answering each query, by number
+queries = {
+    '0': 'findSymbol',
+    '1': 'findDefinition',
+    '2': 'findCallees',
+    '3': 'findCallers',
+    '4': 'findText',
+    '6': 'findEgrep',
+    '7': 'findFile',
+    '8': 'findIncludes',
+    '9': 'findAssignments',
+}
+
+
+class ResultCache(object):
+    """ The results of the most recently used queries.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        results = self.entries.pop(key, None)
+        if results is not None:
+            self.entries[key] = results
+        return results
+
+    def put(self, key, results):
+        if self.size <= 0:
+            return
+        self.entries.pop(key, None)
+        self.entries[key] = results
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class Server(object):
+    """ Answers the queries of any number of sessions on a cross-ref file.
+    """
+    def __init__(self, path, results=256):
+        self.path = path
+        self.lock = threading.Lock()
+        self.xref = None
+        self.key = None
+        self.results = ResultCache(results)
+
+    def crossRef(self, reload=False):
+        """ The cross-ref file, opened again if it changed since it was
+            last opened.
+        """
+        key = statKey(os.stat(self.path))
+        if reload or (self.xref is None) or (key != self.key):
+            xref = CrossRef(self.path)
+            self.close()
+            self.xref = xref
+            self.key = key
+            self.results.clear()
+        return self.xref
+
+    def close(self):
+        if self.xref is not None:
+            self.xref.close()
+            self.xref = None
+
+    def query(self, field, pattern):
+        """ The references found by a query, given its number and pattern.
+        """
+        with self.lock:
+            xref = self.crossRef()
+            results = self.results.get((field, pattern))
+            if results is None:
+                results = getattr(xref, queries[field])(pattern)
+                self.results.put((field, pattern), results)
+            return results
+
+    def reload(self):
+        with self.lock:
+            self.crossRef(reload=True)
+
+    def session(self, fin, fout):
+        """ Answer the queries read from a file, writing the results to
+            another, until told to quit or the end of the input.
+        """
+        while True:
+            fout.write(">> ")
+            fout.flush()
+            line = fin.readline()
+            if not line:
+                break
+            line = line.rstrip("\r\n")
+            if not line:
+                continue
+            command, pattern = line[0], line[1:]
+            if command == 'q':
+                break
+            try:
+                if command == 'r':
+                    self.reload()
+                    results = []
+                elif command in queries:
+                    results = self.query(command, pattern)
+                else:
+                    # Not a query supported (5 is changing text)
+                    results = []
+            except Exception as e:
+                # Clients expect a single line telling the number of
+                # results, the error goes to the server's own output
+                print("pycscope.py: %s: %s" % (line, e), file=sys.stderr)
+                results = []
+            fout.write("cscope: %d lines\n" % len(results))
+            for ref in results:
+                fout.write("%s %s %d %s\n" % ref)
+        fout.flush()
+
+    def connection(self, conn):
+        """ Run a session on a connection to the socket.
+        """
+        try:
+            if sys.version_info[0] < 3:
+                fin, fout = conn.makefile('r'), conn.makefile('w')
+            else:
+                fin = conn.makefile('r', encoding='utf-8', errors='replace', newline='\n')
+                fout = conn.makefile('w', encoding='utf-8', errors='replace', newline='\n')
+            try:
+                self.session(fin, fout)
+            finally:
+                fin.close()
+                fout.close()
+        except (IOError, OSError):
+            # The client went away
+            pass
+        finally:
+            conn.close()
+
+    def serveSocket(self, path, ready=None):
+        """ Run a session on each connection to a Unix socket, until
+            interrupted; 'ready' is called once the socket listens.
+
+            A socket left by a server that did not get to clean up is
+            replaced, but not one another server still listens on.
+        """
+        try:
+            isSocket = stat.S_ISSOCK(os.stat(path).st_mode)
+        except OSError:
+            isSocket = False
+        if isSocket:
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except socket.error as e:
+                if e.errno != errno.ECONNREFUSED:
+                    raise
+                os.remove(path)
+            else:
+                raise socket.error(errno.EADDRINUSE, "Another server is listening")
+            finally:
+                probe.close()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(path)
+        except socket.error:
+            # The path is not ours to remove
+            sock.close()
+            raise
+        try:
+            sock.listen(5)
+            if ready is not None:
+                ready()
+            while True:
+                conn = sock.accept()[0]
+                thread = threading.Thread(target=self.connection, args=(conn,))
+                thread.daemon = True
+                thread.start()
+        finally:
+            sock.close()
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def main(argv):
+    """ Serve queries, as told by the arguments following "serve".
+    """
+    try:
+        opts, args = getopt.getopt(argv[1:], "dlf:", ["results=", "socket="])
+    except getopt.GetoptError:
+        print(__usage__)
+        return 2
+    if args:
+        print(__usage__)
+        return 2
+
+    indexfn = "cscope.out"
+    results = 256
+    sockpath = None
+    for o, a in opts:
+        if o == "-f":
+            indexfn = a
+        if o == "--results":
+            if not a.isdigit():
+                print(__usage__)
+                return 2
+            results = int(a)
+        if o == "--socket":
+            sockpath = a
+
+    server = Server(os.path.abspath(indexfn), results)
+    try:
+        server.crossRef()
+    except (IOError, OSError, ValueError) as e:
+        print("pycscope.py: %s: %s" % (indexfn, e))
+        return 1
+    try:
+        if sockpath is not None:
+            try:
+                server.serveSocket(sockpath)
+            except (IOError, OSError) as e:
+                print("pycscope.py: %s: %s" % (sockpath, e))
+                return 1
+        else:
+            server.session(sys.stdin, sys.stdout)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
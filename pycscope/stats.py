@@ -0,0 +1,215 @@
+"""
+PyCscope run statistics
+
+Records the wall and CPU time spent in each phase of a run, with the bytes
+and the number of objects (files, tokens, index lines) each one handled,
+for the run as a whole and for each file, to be reported as JSON:
+
+  - git: asking git for the files to index, and for those changed (--git)
+  - genFiles: finding the files to index
+  - read: reading a file
+  - parse: parsing a file, into a CST or an AST depending on the engine
+  - totuple: turning the CST of a file into tuples
+  - tokenize: tokenizing a file
+  - walk: walking the syntax tree or the tokens of a file into index lines
+  - write: writing the index lines to the cross-ref file
+  - sqlite: writing the index lines of a file to the symbol database (--sqlite)
+  - callgraph: writing the call graph (--callgraph)
+
+To record the statistics of a run of main() or work(), set pycscope's
+run_stats to a Stats object; hooks added to it are called with the phase,
+the file name (None for phases of the run as a whole) and the record of
+each phase as it ends. Worker processes send the records of each file back
+along with its index lines, so the hooks are always called in the process
+running main() or work().
+"""
+
+import time, timeit
+
+
+if hasattr(time, 'process_time'):
+    cpuTime = time.process_time
+else:
+    # Python 2, where it is the processor time on Unix
+    cpuTime = time.clock
+
+
+class Phase(object):
+    """ Times a phase as a context manager. The bytes and the number of
+        objects it handled can be set on it as it runs.
+    """
+    __slots__ = ('record', 'name', 'nbytes', 'count', 'wall', 'cpu')
+
+    def __init__(self, record, name, nbytes=0, count=0):
+        self.record = record
+        self.name = name
+        self.nbytes = nbytes
+        self.count = count
+
+    def __enter__(self):
+        self.wall = timeit.default_timer()
+        self.cpu = cpuTime()
+        return self
+
+    def __exit__(self, *exc):
+        self.record(self.name, timeit.default_timer() - self.wall, cpuTime() - self.cpu,
+                    self.nbytes, self.count)
+        return False
+
+
+def addRecord(records, name, wall, cpu, nbytes, count):
+    """ Add the time and sizes of a phase to its record in a dictionary.
+    """
+    rec = records.get(name)
+    if rec is None:
+        records[name] = {'wall': wall, 'cpu': cpu, 'bytes': nbytes, 'count': count, 'calls': 1}
+    else:
+        rec['wall'] += wall
+        rec['cpu'] += cpu
+        rec['bytes'] += nbytes
+        rec['count'] += count
+        rec['calls'] += 1
+    return records[name]
+
+
+class Stats(object):
+    """ The statistics of a run, by phase and by file.
+    """
+    def __init__(self):
+        self.phases = {}        # Records of the phases of the run, by name
+        self.files = {}         # Records of the phases of each file, by name
+        self.hooks = []
+        self.current = None     # Records of the phases of the file being parsed
+        self.wall = timeit.default_timer()
+        self.cpu = cpuTime()
+
+    def addHook(self, hook):
+        """ Have 'hook' called with the phase, the file name and the record
+            of each phase as it ends.
+        """
+        self.hooks.append(hook)
+
+    def removeHook(self, hook):
+        self.hooks.remove(hook)
+
+    def phase(self, name, nbytes=0, count=0):
+        """ Time a phase, of the file being parsed if there is one.
+        """
+        return Phase(self.record, name, nbytes, count)
+
+    def record(self, name, wall, cpu, nbytes=0, count=0):
+        if self.current is not None:
+            # Kept until the records of the file are added to the run
+            addRecord(self.current, name, wall, cpu, nbytes, count)
+            return
+        rec = addRecord(self.phases, name, wall, cpu, nbytes, count)
+        for hook in self.hooks:
+            hook(name, None, rec)
+
+    def timedIter(self, name, it):
+        """ Time getting each item from an iterator.
+        """
+        it = iter(it)
+        while True:
+            with self.phase(name) as p:
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+                p.count = 1
+            yield item
+
+    def beginFile(self):
+        self.current = {}
+
+    def endFile(self):
+        """ The records of the phases of the file parsed, which are to be
+            added to the run with addFile().
+        """
+        current, self.current = self.current, None
+        return current
+
+    def addFile(self, fname, records):
+        """ Add the records of the phases of a file to the run.
+        """
+        if records is None:
+            return
+        filerecs = self.files.setdefault(fname, {})
+        for name, rec in records.items():
+            addRecord(filerecs, name, rec['wall'], rec['cpu'], rec['bytes'], rec['count'])
+            addRecord(self.phases, name, rec['wall'], rec['cpu'], rec['bytes'], rec['count'])
+            for hook in self.hooks:
+                hook(name, fname, filerecs[name])
+
+    def slowest(self, n):
+        """ The names of the n files that took the longest.
+        """
+        def total(fname):
+            return sum(rec['wall'] for rec in self.files[fname].values())
+        return sorted(self.files, key=total, reverse=True)[:n]
+
+    def report(self, **info):
+        """ The statistics as a dictionary, ready for JSON, along with any
+            information given about the run.
+        """
+        report = dict(info)
+        report['wall'] = timeit.default_timer() - self.wall
+        report['cpu'] = cpuTime() - self.cpu
+        report['phases'] = self.phases
+        report['files'] = self.files
+        return report
+
+
+def profileFile(basepath, fname, engine=None, top=20):
+    """ Parse a file again under cProfile and, where available, under
+        tracemalloc, returning the functions taking the most time and the
+        lines allocating the most memory.
+    """
+    import pycscope
+
+    # The phases of the file are not recorded again
+    run_stats, pycscope.run_stats = pycscope.run_stats, None
+    try:
+        result = {'file': fname, 'functions': profileTime(pycscope, basepath, fname, engine, top)}
+        try:
+            import tracemalloc
+        except ImportError:
+            return result
+        tracemalloc.start()
+        try:
+            parseQuietly(pycscope, basepath, fname, engine)
+            snapshot = tracemalloc.take_snapshot()
+            result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        result['allocations'] = [{'line': str(stat.traceback), 'size': stat.size, 'count': stat.count}
+                                 for stat in snapshot.statistics('lineno')[:top]]
+        return result
+    finally:
+        pycscope.run_stats = run_stats
+
+
+def profileTime(pycscope, basepath, fname, engine, top):
+    """ The functions taking the most time parsing a file, under cProfile.
+    """
+    import cProfile, pstats
+
+    profile = cProfile.Profile()
+    profile.enable()
+    parseQuietly(pycscope, basepath, fname, engine)
+    profile.disable()
+    functions = []
+    for (filename, lineno, funcname), (cc, nc, tt, ct, callers) in pstats.Stats(profile).stats.items():
+        functions.append({'function': "%s:%d(%s)" % (filename, lineno, funcname),
+                          'calls': nc, 'tottime': tt, 'cumtime': ct})
+    functions.sort(key=lambda f: f['cumtime'], reverse=True)
+    return functions[:top]
+
+
+def parseQuietly(pycscope, basepath, fname, engine):
+    """ Parse a file, whose errors were already reported.
+    """
+    try:
+        pycscope.parseFile(basepath, fname, [], 0, [], engine=engine)
+    except Exception:
+        pass
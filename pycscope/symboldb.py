@@ -0,0 +1,207 @@
+"""
+PyCscope symbol database
+
+The contents of the cross-ref file, written alongside it into a SQLite
+database: the files indexed, their lines, and the symbols marked on each
+line, in indexed tables, so that a symbol is looked up without scanning
+the whole index, and any number of tools can read the database while it
+is updated.
+
+The database is updated in place: the rows of a file are only deleted and
+inserted again when its index lines changed, and those of the files no
+longer indexed are deleted at the end of the run. Changes are committed
+after each batch of files.
+"""
+
+import hashlib, re, sqlite3
+
+from pycscope import Mark, encoded
+from pycscope.query import GLOBAL, UNKNOWN, Reference, splitLine
+
+
+# Files written in each transaction
+BATCH_SIZE = 100
+
+schema = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,  -- Name of the source file, as in the cross-ref file
+    digest TEXT NOT NULL        -- Hash of the index lines of the file
+);
+CREATE TABLE IF NOT EXISTS lines (
+    file INTEGER NOT NULL,      -- Source file
+    line INTEGER NOT NULL,      -- Line number
+    text TEXT NOT NULL,         -- Text of the line, as in the cross-ref file
+    PRIMARY KEY (file, line)
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS marks (
+    symbol INTEGER NOT NULL,    -- Symbol on the line
+    mark TEXT NOT NULL,         -- Mark of the symbol, empty if it has none
+    file INTEGER NOT NULL,      -- Source file
+    line INTEGER NOT NULL,      -- Line number
+    function INTEGER            -- Symbol of the function the line is in, if any
+);
+CREATE INDEX IF NOT EXISTS marks_symbol ON marks (symbol, mark);
+CREATE INDEX IF NOT EXISTS marks_function ON marks (function, mark);
+CREATE INDEX IF NOT EXISTS marks_file ON marks (file);
+"""
+
+# The lines a query finds, with the name of the function they are in
+select_refs = """
+SELECT files.path, functions.name, marks.line, lines.text
+FROM marks
+JOIN files ON files.id = marks.file
+JOIN lines ON lines.file = marks.file AND lines.line = marks.line
+LEFT JOIN symbols AS functions ON functions.id = marks.function
+"""
+
+
+class SymbolDatabase(object):
+    """ The SQLite database of the symbols of a cross-ref file.
+    """
+    def __init__(self, path, batch=BATCH_SIZE):
+        self.db = sqlite3.connect(path)
+        # Readers are not blocked while the database is written
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(schema)
+        self.batch = batch
+        self.pending = 0
+        self.changed = False
+        self.seen = set()
+        self.symbols = {}       # Ids of the symbols written, by name
+
+    def close(self):
+        self.db.close()
+
+    def symbolId(self, name):
+        symbolid = self.symbols.get(name)
+        if symbolid is None:
+            self.db.execute("INSERT OR IGNORE INTO symbols (name) VALUES (?)", (name,))
+            symbolid = self.db.execute("SELECT id FROM symbols WHERE name = ?", (name,)).fetchone()[0]
+            self.symbols[name] = symbolid
+        return symbolid
+
+    def addFile(self, fname, index):
+        """ Write the index lines of a file, following its file mark, unless
+            they are unchanged.
+        """
+        self.seen.add(fname)
+        digest = hashlib.sha1(encoded(index)).hexdigest()
+        row = self.db.execute("SELECT id, digest FROM files WHERE path = ?", (fname,)).fetchone()
+        if row is None:
+            fileid = self.db.execute("INSERT INTO files (path, digest) VALUES (?, ?)",
+                                     (fname, digest)).lastrowid
+        elif row[1] == digest:
+            return
+        else:
+            fileid = row[0]
+            self.db.execute("DELETE FROM marks WHERE file = ?", (fileid,))
+            self.db.execute("DELETE FROM lines WHERE file = ?", (fileid,))
+            self.db.execute("UPDATE files SET digest = ? WHERE id = ?", (digest, fileid))
+        self.changed = True
+
+        lines = []
+        marks = []
+        function = None
+        for block in index.split("\n\n"):
+            if not block:
+                continue
+            lineno, symbols, text = splitLine(block)
+            lines.append((fileid, lineno, text))
+            for mark, name in symbols:
+                if mark == Mark.FUNC_END:
+                    function = None
+                    continue
+                symbolid = self.symbolId(name)
+                if mark == Mark.FUNC_DEF:
+                    # A definition is in the function it defines
+                    function = symbolid
+                marks.append((symbolid, mark, fileid, lineno, function))
+        self.db.executemany("INSERT OR REPLACE INTO lines (file, line, text) VALUES (?, ?, ?)", lines)
+        self.db.executemany("INSERT INTO marks (symbol, mark, file, line, function)"
+                            " VALUES (?, ?, ?, ?, ?)", marks)
+
+        self.pending += 1
+        if self.pending >= self.batch:
+            self.db.commit()
+            self.pending = 0
+
+    def finish(self):
+        """ Delete the files not written by this run, and the symbols left
+            unused, and commit.
+        """
+        stale = [(fileid,) for fileid, path in self.db.execute("SELECT id, path FROM files")
+                 if path not in self.seen]
+        if stale:
+            self.db.executemany("DELETE FROM marks WHERE file = ?", stale)
+            self.db.executemany("DELETE FROM lines WHERE file = ?", stale)
+            self.db.executemany("DELETE FROM files WHERE id = ?", stale)
+        if stale or self.changed:
+            self.db.execute("DELETE FROM symbols WHERE id NOT IN (SELECT symbol FROM marks)")
+        self.db.commit()
+        self.pending = 0
+
+    def find(self, where, params, function=None):
+        refs = []
+        for path, name, lineno, text in self.db.execute(
+                select_refs + " WHERE " + where + " ORDER BY files.path, marks.line", params):
+            refs.append(Reference(path, function or name or GLOBAL, lineno, text))
+        return refs
+
+    def findMarked(self, marks, name, function=None):
+        where = ("marks.symbol = (SELECT id FROM symbols WHERE name = ?) AND marks.mark IN (%s)"
+                 % ", ".join("?" * len(marks)))
+        return self.find(where, (name,) + tuple(marks), function)
+
+    def findSymbol(self, name):
+        """ The lines the symbol is on.
+        """
+        return self.findMarked(("", Mark.FUNC_DEF, Mark.FUNC_CALL, Mark.INCLUDE, Mark.ASSIGN,
+                                Mark.CLASS, Mark.GLOBAL, Mark.LOCAL), name)
+
+    def findDefinition(self, name):
+        """ The global definitions of the symbol, of functions, classes and
+            other globals.
+        """
+        return self.findMarked((Mark.FUNC_DEF, Mark.CLASS, Mark.GLOBAL), name, name)
+
+    def findCallees(self, name):
+        """ The calls made by the function.
+        """
+        refs = []
+        for path, function, lineno, text in self.db.execute(
+                "SELECT files.path, symbols.name, marks.line, lines.text FROM marks"
+                " JOIN files ON files.id = marks.file"
+                " JOIN lines ON lines.file = marks.file AND lines.line = marks.line"
+                " JOIN symbols ON symbols.id = marks.symbol"
+                " WHERE marks.function = (SELECT id FROM symbols WHERE name = ?) AND marks.mark = ?"
+                " ORDER BY files.path, marks.line", (name, Mark.FUNC_CALL)):
+            refs.append(Reference(path, function, lineno, text))
+        return refs
+
+    def findCallers(self, name):
+        """ The calls made to the function.
+        """
+        return self.findMarked((Mark.FUNC_CALL,), name)
+
+    def findAssignments(self, name):
+        """ The assignments to the symbol.
+        """
+        return self.findMarked((Mark.ASSIGN,), name)
+
+    def findIncludes(self, name):
+        """ The imports of the module.
+        """
+        return self.findMarked((Mark.INCLUDE,), name)
+
+    def findFile(self, pattern):
+        """ The files whose names the regular expression matches.
+        """
+        search = re.compile(pattern).search
+        return [Reference(path, UNKNOWN, 1, UNKNOWN)
+                for path, in self.db.execute("SELECT path FROM files ORDER BY path")
+                if search(path)]
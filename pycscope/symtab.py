@@ -0,0 +1,38 @@
+"""
+PyCscope symbol table
+
+The names of the functions met while gathering the call graph
+(--callgraph), each kept once, and numbered, so that the calls gathered
+over a run are held as pairs of numbers, the names being turned back into
+strings when the call graph file is written.
+
+The index itself is not made of numbers: its lines are formatted, passed
+around and written as strings.
+"""
+
+
+class SymbolTable(object):
+    """ The names of the symbols of a run, numbered in the order they are
+        met, as UTF-8 encoded bytes.
+    """
+    def __init__(self):
+        self.ids = {}           # Number of each name
+        self.names = []         # Name of each number
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, name):
+        """ The number of a name, numbering it if it is new.
+        """
+        try:
+            return self.ids[name]
+        except KeyError:
+            symbolid = self.ids[name] = len(self.names)
+            self.names.append(name)
+            return symbolid
+
+    def name(self, symbolid):
+        """ The name of a number.
+        """
+        return self.names[symbolid]
@@ -0,0 +1,339 @@
+"""
+PyCscope watch mode
+
+Keeps the cross-ref file up to date as the files it indexes change. The
+index lines of each file are kept in memory, and the directories searched
+for files are watched, with inotify on Linux or else by polling them and
+the files in them. After each batch of changes, once no more have come for
+a little while, only the files that changed are parsed again, and the
+cross-ref file is rewritten.
+"""
+
+import os, select, struct, sys, time
+
+from pycscope import genFiles, isPython, listDir
+
+
+# Changes are gathered until none have come for this long (seconds)
+DEBOUNCE = 0.5
+
+# Changes are gathered for at most this long before a rebuild (seconds)
+MAX_DELAY = 10.0
+
+# How often files and directories are polled without inotify (seconds)
+POLL_INTERVAL = 1.0
+
+
+def statKey(st):
+    """ What tells whether a file changed from its stat data.
+    """
+    return (st.st_mtime, st.st_size, st.st_ino)
+
+
+class MemoryCache(object):
+    """ The index lines of the files indexed, kept in memory between
+        builds, in front of another cache, if any (an IndexCache, or the
+        IndexSections of a previous cross-ref file).
+
+        An entry is used while the stat data of its file is unchanged, and
+        until the file is forgotten, as when the watcher sees it change.
+        Entries are kept by normalized path, as the watcher tells them.
+    """
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.entries = {}       # Stat data and index lines, by full path
+
+    def lookup(self, fullpath):
+        """ Look up the index lines for a file, as IndexCache.lookup()
+            does.
+        """
+        try:
+            key = statKey(os.stat(fullpath))
+        except OSError:
+            # Let the parsing report the error
+            return None, None, None
+
+        entry = self.entries.get(os.path.normpath(fullpath))
+        if (entry is not None) and (entry[0] == key):
+            return entry[1], None, None
+
+        info = data = None
+        if self.cache is not None:
+            lines, info, data = self.cache.lookup(fullpath)
+            if lines is not None:
+                self.entries[os.path.normpath(fullpath)] = (key, lines)
+                return lines, None, None
+        return None, (key, info), data
+
+    def store(self, fullpath, info, lines):
+        key, info = info
+        self.entries[os.path.normpath(fullpath)] = (key, lines)
+        if (info is not None) and (self.cache is not None):
+            self.cache.store(fullpath, info, lines)
+
+    def forget(self, fullpath):
+        self.entries.pop(os.path.normpath(fullpath), None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def prune(self, fullpaths):
+        """ Only keep the entries of the given files.
+        """
+        for fullpath in list(self.entries):
+            if fullpath not in fullpaths:
+                del self.entries[fullpath]
+
+
+# inotify events, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+# struct inotify_event, followed by the name of the entry
+EVENT = struct.Struct('iIII')
+
+
+def loadLibc():
+    """ The C library, if it has inotify.
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        import ctypes, ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+    except (ImportError, OSError, AttributeError):
+        return None
+    return libc
+
+
+class InotifyWatcher(object):
+    """ Watches directories with inotify.
+    """
+    def __init__(self, libc):
+        import ctypes
+        self.libc = libc
+        self.errno = ctypes.get_errno
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            e = self.errno()
+            raise OSError(e, os.strerror(e))
+        self.dirs = {}          # Watched directory, by watch descriptor
+        self.wds = {}           # Watch descriptor, by watched directory
+        self.files = set()
+
+    def watch(self, dirs, files):
+        """ Watch the given directories, for changes to them and to the
+            Python files in them, or to the given files.
+        """
+        for dirpath in dirs:
+            if dirpath in self.wds:
+                continue
+            path = dirpath
+            if not isinstance(path, bytes):
+                path = path.encode(sys.getfilesystemencoding())
+            wd = self.libc.inotify_add_watch(self.fd, path, WATCH_MASK)
+            if wd < 0:
+                # Gone already, or past the limit of watches of the user
+                continue
+            self.dirs[wd] = dirpath
+            self.wds[dirpath] = wd
+        self.files = set(files)
+
+    def changes(self, timeout=None):
+        """ The paths of the files and directories that changed, waiting up
+            to 'timeout' seconds for one (forever if None). If events were
+            lost, anything may have changed, which is told by returning
+            None.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        changed = set()
+        while not changed:
+            wait = None if deadline is None else max(deadline - time.time(), 0)
+            if not select.select([self.fd], [], [], wait)[0]:
+                break
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except OSError:
+                continue
+            pos = 0
+            while pos < len(data):
+                wd, mask, cookie, size = EVENT.unpack_from(data, pos)
+                name = data[pos + EVENT.size:pos + EVENT.size + size].rstrip(b'\0')
+                pos += EVENT.size + size
+                if mask & IN_Q_OVERFLOW:
+                    return None
+                dirpath = self.dirs.get(wd)
+                if dirpath is None:
+                    continue
+                if mask & IN_IGNORED:
+                    # The directory is gone
+                    del self.dirs[wd]
+                    del self.wds[dirpath]
+                    changed.add(dirpath)
+                    continue
+                if not name:
+                    changed.add(dirpath)
+                    continue
+                if not isinstance(dirpath, bytes):
+                    name = name.decode(sys.getfilesystemencoding(), 'replace')
+                path = os.path.join(dirpath, name)
+                if (mask & IN_ISDIR) or isPython(name) or (path in self.files):
+                    changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollWatcher(object):
+    """ Watches directories, and the files in them, by polling them. The
+        Python files and the subdirectories in a directory are listed again
+        when its modification time changes.
+    """
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self.dirs = {}          # Stat data and relevant entries, by directory
+        self.files = {}         # Stat data, by file
+
+    def scanDir(self, dirpath):
+        try:
+            key = statKey(os.stat(dirpath))
+        except OSError:
+            return None
+        old = self.dirs.get(dirpath)
+        if (old is not None) and (old[0] == key):
+            return old
+        try:
+            entries = frozenset(name for name, isdir, islink in listDir(dirpath)
+                                if isdir or isPython(name))
+        except OSError:
+            return None
+        return key, entries
+
+    def scanFile(self, path):
+        try:
+            return statKey(os.stat(path))
+        except OSError:
+            return None
+
+    def watch(self, dirs, files):
+        self.dirs = dict((dirpath, self.scanDir(dirpath)) for dirpath in dirs)
+        self.files = dict((path, self.scanFile(path)) for path in files)
+
+    def changes(self, timeout=None):
+        """ The paths of the files and directories that changed, waiting up
+            to 'timeout' seconds for one (forever if None).
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            wait = self.interval
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.time(), 0))
+            time.sleep(wait)
+            changed = set()
+            for dirpath, old in list(self.dirs.items()):
+                new = self.scanDir(dirpath)
+                if (new is None) != (old is None) or ((new is not None) and (new[1] != old[1])):
+                    changed.add(dirpath)
+                self.dirs[dirpath] = new
+            for path, old in list(self.files.items()):
+                new = self.scanFile(path)
+                if new != old:
+                    changed.add(path)
+                self.files[path] = new
+            if changed or ((deadline is not None) and (time.time() >= deadline)):
+                return changed
+
+    def close(self):
+        pass
+
+
+def newWatcher():
+    """ An inotify watcher where possible, else a polling one.
+    """
+    libc = loadLibc()
+    if libc is not None:
+        try:
+            return InotifyWatcher(libc)
+        except OSError:
+            pass
+    return PollWatcher()
+
+
+def gather(watcher, changed, debounce=DEBOUNCE, max_delay=MAX_DELAY):
+    """ Gather the changes following the given ones into a batch, until
+        none have come for 'debounce' seconds, or for at most 'max_delay'
+        seconds. None stands for any change.
+    """
+    start = time.time()
+    while time.time() - start < max_delay:
+        more = watcher.changes(debounce)
+        if more is None:
+            changed = None
+        elif not more:
+            break
+        elif changed is not None:
+            changed |= more
+    return changed
+
+
+def watchTree(basepath, args, recurse, exclude, gitignore, cache, build, watcher=None,
+              debounce=DEBOUNCE, batches=None, files=None):
+    """ Build the index, then rebuild it after each batch of changes to the
+        files, until interrupted (or for the given number of batches).
+
+        The files are found as pycscope.genFiles() finds them, or else by
+        calling files(), and indexed by calling build() with a generator of
+        them and a cache, which is a MemoryCache in front of the given one.
+    """
+    memory = MemoryCache(cache)
+    if watcher is None:
+        watcher = newWatcher()
+    try:
+        while True:
+            dirs = []
+            if files is None:
+                fnames = list(genFiles(basepath, args, recurse, exclude, gitignore, dirs))
+            else:
+                fnames = list(files())
+                dirs.append(basepath)
+            fullpaths = set(os.path.normpath(os.path.join(basepath, fname)) for fname in fnames)
+            dirs.extend(set(os.path.dirname(fullpath) for fullpath in fullpaths))
+            memory.prune(fullpaths)
+
+            # Watch before building, so that no change is missed
+            watcher.watch(dirs, fullpaths)
+            build(iter(fnames), cache=memory)
+
+            if batches is not None:
+                if batches == 0:
+                    break
+                batches -= 1
+            changed = watcher.changes()
+            while (changed is not None) and not changed:
+                changed = watcher.changes()
+            changed = gather(watcher, changed, debounce)
+            if changed is None:
+                memory.clear()
+            else:
+                for path in changed:
+                    memory.forget(path)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""Unit tests for the corpus generator of the benchmarks.
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+import pycscope
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'benchmarks'))
+import corpus
+import accuracy
+
+
+class TestCorpus(unittest.TestCase):
+
+    def setUp(self,):
+        self.tmpd = tempfile.mkdtemp()
+
+    def tearDown(self,):
+        shutil.rmtree(self.tmpd)
+
+    def testshapes(self,):
+        # Every shape gives source that compiles and that can be indexed
+        for shape in sorted(corpus.SHAPES):
+            d = os.path.join(self.tmpd, shape)
+            fnames = corpus.generate(d, shape, files=2, lines=200)
+            self.assertEqual(len(fnames), 2)
+            for fname in fnames:
+                with open(os.path.join(d, fname)) as f:
+                    compile(f.read(), fname, 'exec')
+            indexbuff, fnamesbuff = pycscope.work(d, fnames, False)
+            self.assertEqual(fnamesbuff, fnames)
+
+    def testdeterministic(self,):
+        fnames = corpus.generate(os.path.join(self.tmpd, 'a'), 'many', files=30, lines=10, seed=7)
+        self.assertEqual(corpus.generate(os.path.join(self.tmpd, 'b'), 'many', files=30, lines=10, seed=7),
+                         fnames)
+        self.assertTrue(os.path.join('pkg0', 'sub1', 'module20.py') in fnames)
+        for fname in fnames:
+            with open(os.path.join(self.tmpd, 'a', fname)) as a:
+                with open(os.path.join(self.tmpd, 'b', fname)) as b:
+                    self.assertEqual(a.read(), b.read())
+
+    def testaccuracy(self,):
+        # The fast engine marks the symbols of the generated corpus as the
+        # full engine does
+        corpus.generate(self.tmpd, 'mixed', files=3, lines=100)
+        results = accuracy.compare(self.tmpd)
+        self.assertEqual(results['files'], 3)
+        self.assertEqual(results['matched'], results['marked'])
+        self.assertEqual(results['extra'], 0)
+        self.assertEqual(accuracy.markedSymbols('1 \n\t=a\n = \n\t`f\n ( ) \n\n'),
+                         {(1, '=', 'a'): 1, (1, '`', 'f'): 1})
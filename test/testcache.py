@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""Unit tests for the index cache.
+"""
+
+import unittest
+import os
+import tempfile
+import shutil
+import pycscope
+from pycscope.cache import IndexCache
+
+
+class TestIndexCache(unittest.TestCase):
+
+    def setUp(self,):
+        self.tmpd = tempfile.mkdtemp()
+        self.cachefn = os.path.join(self.tmpd, 'cache')
+        self.srcfn = os.path.join(self.tmpd, 'a.py')
+        self.write("a = 1\n", 1000000000)
+
+    def tearDown(self,):
+        shutil.rmtree(self.tmpd)
+
+    def write(self, contents, mtime):
+        with open(self.srcfn, 'w') as f:
+            f.write(contents)
+        os.utime(self.srcfn, (mtime, mtime))
+
+    def store(self, key='k'):
+        cache = IndexCache(self.cachefn, key)
+        lines, info, data = cache.lookup(self.srcfn)
+        self.assertEqual(lines, None)
+        # The contents read to digest the file are handed on to parse it
+        self.assertEqual(data, b"a = 1\n")
+        cache.store(self.srcfn, info, 'lines')
+        cache.close()
+
+    def lookup(self, key='k'):
+        cache = IndexCache(self.cachefn, key)
+        try:
+            return cache.lookup(self.srcfn)[0]
+        finally:
+            cache.close()
+
+    def testhit(self,):
+        self.store()
+        self.assertEqual(self.lookup(), 'lines')
+
+    def testtouched(self,):
+        # Same contents, different modification time
+        self.store()
+        self.write("a = 1\n", 1000000100)
+        self.assertEqual(self.lookup(), 'lines')
+
+    def testchanged(self,):
+        self.store()
+        self.write("a = 2\n", 1000000100)
+        self.assertEqual(self.lookup(), None)
+
+    def testkey(self,):
+        self.store('k')
+        self.assertEqual(self.lookup('other'), None)
+        self.assertEqual(self.lookup('k'), 'lines')
+
+    def testmissing(self,):
+        os.remove(self.srcfn)
+        self.assertEqual(self.lookup(), None)
+
+    def testevict(self,):
+        self.store()
+        cache = IndexCache(self.cachefn, 'k', max_age=-1)
+        cache.close()
+        self.assertEqual(self.lookup(), None)
+
+
+class TestWorkCache(unittest.TestCase):
+
+    def testlazy(self,):
+        # Files are looked up as their chunks are consumed
+        tmpd = tempfile.mkdtemp()
+        try:
+            for name in ('a', 'b'):
+                with open(os.path.join(tmpd, name), "w") as f:
+                    f.write("%s = 1\n" % name)
+            looked = []
+
+            def gen():
+                for name in ('a', 'b'):
+                    looked.append(name)
+                    yield name
+
+            cache = IndexCache(os.path.join(tmpd, 'cache'), 'k')
+            try:
+                chunks = pycscope.workChunks(tmpd, gen(), False, cache=cache)
+                self.assertEqual(next(chunks)[1], ['a'])
+                self.assertEqual(looked, ['a'])
+                self.assertEqual(next(chunks)[1], ['b'])
+                self.assertEqual(looked, ['a', 'b'])
+            finally:
+                cache.close()
+        finally:
+            shutil.rmtree(tmpd)
+
+    def testworkcache(self,):
+        tmpd = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(tmpd, 'a'), "w") as a:
+                a.write("a = 1\n")
+            with open(os.path.join(tmpd, 's'), "w") as s:
+                s.write("a a (b)\n")
+            cachefn = os.path.join(tmpd, 'cache')
+
+            # The first run fills the cache, the second uses it for all but
+            # the file with the syntax error.
+            expected = pycscope.work(tmpd, ['a', 's'], False)
+            for i in range(2):
+                cache = IndexCache(cachefn, 'k')
+                try:
+                    result = pycscope.work(tmpd, ['a', 's'], False, cache=cache)
+                finally:
+                    cache.close()
+                self.assertEqual(''.join(result[0]), ''.join(expected[0]))
+                self.assertEqual(result[1], expected[1])
+
+            cache = IndexCache(cachefn, 'k')
+            try:
+                self.assertEqual(cache.lookup(os.path.join(tmpd, 'a'))[0], '1 \n\t=a\n = 1\n\n')
+                self.assertEqual(cache.lookup(os.path.join(tmpd, 's'))[0], None)
+            finally:
+                cache.close()
+        finally:
+            shutil.rmtree(tmpd)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""Unit tests for the call graph.
+"""
+
+import unittest
+import os
+import tempfile
+import shutil
+import pycscope
+from pycscope.callgraph import CallGraph, CallGraphBuilder, GLOBAL
+from pycscope.symtab import SymbolTable
+
+
+SOURCE = """def a():
+    b()
+    c()
+
+def b():
+    c()
+
+def c():
+    a()
+
+def d():
+    pass
+
+b()
+"""
+
+
+class TestCallGraph(unittest.TestCase):
+
+    def setUp(self,):
+        self.orig_wd = os.getcwd()
+        self.tmpd = tempfile.mkdtemp()
+        os.chdir(self.tmpd)
+        with open('m.py', 'w') as f:
+            f.write(SOURCE)
+
+    def tearDown(self,):
+        os.chdir(self.orig_wd)
+        shutil.rmtree(self.tmpd)
+
+    def testqueries(self,):
+        pycscope.main(['pycscope', '--callgraph', 'm.py'])
+        with CallGraph('cscope.cg.out') as graph:
+            self.assertEqual(graph.callees('a'), ['b', 'c'])
+            self.assertEqual(graph.callers('c'), ['a', 'b'])
+            self.assertEqual(graph.callers('b'), [GLOBAL, 'a'])
+            self.assertEqual(graph.callees('d'), [])
+            self.assertEqual(graph.callees('nosuchfunction'), [])
+            self.assertEqual(graph.transitiveCallees('b'), {'c': 1, 'a': 2, 'b': 3})
+            self.assertEqual(graph.transitiveCallers('a', depth=2), {'c': 1, 'a': 2, 'b': 2})
+
+    def testfilename(self,):
+        pycscope.main(['pycscope', '--callgraph', '-f', 'index', 'm.py'])
+        self.assertEqual(sorted(os.listdir(self.tmpd)), ['index', 'index.cg', 'm.py'])
+
+    def testempty(self,):
+        with open('empty.cg', 'wb') as f:
+            CallGraphBuilder(SymbolTable()).write(f)
+        with CallGraph('empty.cg') as graph:
+            self.assertEqual(graph.callers('a'), [])
+        self.assertRaises(ValueError, CallGraph, 'm.py')
+
+
+if __name__ == '__main__':
+    unittest.main()
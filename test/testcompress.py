@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""Unit tests for the cross-ref compression.
+"""
+
+import unittest
+import os
+import tempfile
+import shutil
+import pycscope
+from pycscope.compress import compressIndex, compressText, compressSymbol, expand
+
+
+class TestCompress(unittest.TestCase):
+
+    def testkeywords(self,):
+        self.assertEqual(compressText(b"return "), b"\x15 ")
+        self.assertEqual(compressText(b"returned"), b"\xbbtu\xbaed")
+        self.assertEqual(compressText(b"else :"), b"\x0b:")
+        self.assertEqual(compressText(b"else:"), b"\x96\xa3:")
+        self.assertEqual(compressText(b"if ( "), b"\x11 ")
+        # Not without the parenthesis that cscope adds back
+        self.assertEqual(compressText(b"if x"), b"i\xe0x")
+        # The digraph does not take the first character of the keyword
+        self.assertEqual(compressText(b" else "), b" \x0b")
+
+    def testsymbols(self,):
+        self.assertEqual(compressSymbol(b"return"), b"\xbbtu\xba")
+        self.assertEqual(compressSymbol(b"xyz"), b"xyz")
+
+    def testroundtrip(self,):
+        # Index the sources of pycscope itself, which are ASCII
+        srcdir = os.path.dirname(pycscope.__file__)
+        fnames = sorted(f for f in os.listdir(srcdir) if f.endswith('.py'))
+        indexbuff, fnamesbuff = pycscope.work(srcdir, fnames, False)
+        data = ''.join(indexbuff).encode()
+        compressed = compressIndex(data)
+        self.assertTrue(len(compressed) < len(data) * 0.9)
+        self.assertEqual(expand(compressed), data)
+
+    def testmain(self,):
+        tmpd = tempfile.mkdtemp()
+        cwd = os.getcwd()
+        try:
+            os.chdir(tmpd)
+            with open('a.py', "w") as a:
+                a.write("def f(a):\n    if (a):\n        return a\n    else:\n        return g(a)\n")
+            self.assertEqual(pycscope.main(['pycscope', '-f', 'u.out', 'a.py']), 0)
+            self.assertEqual(pycscope.main(['pycscope', '--compress', '-f', 'c.out', 'a.py']), 0)
+            with open('u.out', 'rb') as f:
+                uncompressed = pycscope.readIndex(f)
+            with open('c.out', 'rb') as f:
+                compressed = pycscope.readIndex(f)
+            self.assertEqual(os.path.getsize('c.out') < os.path.getsize('u.out'), True)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(tmpd)
+        self.assertEqual(compressed, uncompressed)
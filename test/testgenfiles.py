@@ -4,7 +4,10 @@
 
 import unittest
 import os
-from cStringIO import StringIO
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
 import tempfile
 import shutil
 import pycscope
@@ -35,6 +38,84 @@ class TestGenFiles(unittest.TestCase):
 
             # Actual test
             fs = list(pycscope.genFiles(tmpd, ['a.py', 'b', "s"], True))
-            self.assertEquals(fs, ['a.py', 's/t/f.py', 's/t/e.py', 's/d.py', 's/c.py'])
+            self.assertEqual(fs, ['a.py', 's/t/f.py', 's/t/e.py', 's/d.py', 's/c.py'])
         finally:
             shutil.rmtree(tmpd)
+
+
+class TestFilters(unittest.TestCase):
+
+    def setUp(self,):
+        self.tmpd = tempfile.mkdtemp()
+
+    def tearDown(self,):
+        shutil.rmtree(self.tmpd)
+
+    def touch(self, *paths):
+        for path in paths:
+            fullpath = os.path.join(self.tmpd, path)
+            if not os.path.isdir(os.path.dirname(fullpath)):
+                os.makedirs(os.path.dirname(fullpath))
+            with open(fullpath, "w") as f:
+                f.write("")
+
+    def genFiles(self, *args, **kwargs):
+        return sorted(pycscope.genFiles(self.tmpd, ['.'], True, *args, **kwargs))
+
+    def testexclude(self,):
+        self.touch('a.py', 'b_test.py', 'CVS/c.py', 's/.git/d.py', 's/build/e.py',
+                   's/t/build/f.py', 's/t/g.py')
+        self.assertEqual(self.genFiles(),
+                         ['./a.py', './b_test.py', './s/build/e.py', './s/t/build/f.py', './s/t/g.py'])
+        self.assertEqual(self.genFiles(['build', '*_test.py']), ['./a.py', './s/t/g.py'])
+        self.assertEqual(self.genFiles(['s/build']), ['./a.py', './b_test.py', './s/t/build/f.py', './s/t/g.py'])
+        # Files given explicitly are matched too
+        self.assertEqual(list(pycscope.genFiles(self.tmpd, ['a.py', 'b_test.py'], True, ['*_test.py'])),
+                         ['a.py'])
+
+    def testgitignore(self,):
+        self.touch('.git/HEAD', 'a.py', 'b.py', 'gen/c.py', 's/d.py', 's/e.py', 's/t/f.py',
+                   's/gen/g.py', 'u/h.py', 'u/v/i.py')
+        with open(os.path.join(self.tmpd, '.gitignore'), "w") as f:
+            f.write("# Comment\n/gen/\nb.py\n\nu/v\n")
+        with open(os.path.join(self.tmpd, 's', '.gitignore'), "w") as f:
+            f.write("*.py\n!d.py\n!t/\n")
+        self.assertEqual(self.genFiles(gitignore=True), ['./a.py', './s/d.py', './u/h.py'])
+        # The rules of the directories above the one searched apply
+        self.assertEqual(sorted(pycscope.genFiles(os.path.join(self.tmpd, 's'), ['.'], True, gitignore=True)),
+                         ['./d.py'])
+
+    def testsymlinkloop(self,):
+        if not hasattr(os, 'symlink'):
+            return
+        self.touch('a.py', 's/b.py', 't/c.py')
+        os.symlink(self.tmpd, os.path.join(self.tmpd, 's', 'up'))
+        os.symlink(os.path.join(self.tmpd, 's'), os.path.join(self.tmpd, 't', 's'))
+        os.symlink(os.path.join(self.tmpd, 't'), os.path.join(self.tmpd, 'u'))
+        self.assertEqual(self.genFiles(),
+                         ['./a.py', './s/b.py', './t/c.py', './t/s/b.py', './u/c.py', './u/s/b.py'])
+
+
+class TestGitIgnoreRules(unittest.TestCase):
+
+    def matches(self, rule, path, isdir=False):
+        from pycscope.gitignore import IgnoreRules, parseRule
+        return IgnoreRules((('/', (parseRule(rule),)),)).ignored('/' + path, isdir)
+
+    def testrules(self,):
+        self.assertTrue(self.matches("*.pyc", "a/b.pyc"))
+        self.assertFalse(self.matches("*.pyc", "a/b.py"))
+        self.assertTrue(self.matches("/a.py", "a.py"))
+        self.assertFalse(self.matches("/a.py", "s/a.py"))
+        self.assertTrue(self.matches("s/*.py", "s/a.py"))
+        self.assertFalse(self.matches("s/*.py", "s/t/a.py"))
+        self.assertTrue(self.matches("**/t/*.py", "s/t/a.py"))
+        self.assertTrue(self.matches("s/**/a.py", "s/a.py"))
+        self.assertTrue(self.matches("s/**/a.py", "s/t/u/a.py"))
+        self.assertTrue(self.matches("s/**", "s/t/a.py"))
+        self.assertTrue(self.matches("build/", "s/build", True))
+        self.assertFalse(self.matches("build/", "s/build", False))
+        self.assertTrue(self.matches("[ab]?.py", "b1.py"))
+        self.assertFalse(self.matches("[!ab]?.py", "b1.py"))
+        self.assertTrue(self.matches("\\#a.py", "#a.py"))
+        self.assertTrue(self.matches("a.py\\ ", "a.py "))
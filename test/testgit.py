@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""Unit tests for asking git for the files to index.
+"""
+
+import unittest
+import os
+import subprocess
+import tempfile
+import shutil
+import sys
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+import pycscope
+from pycscope.git import GitError, changedFiles, listFiles
+from pycscope.watch import PollWatcher, watchTree
+
+
+def hasGit():
+    try:
+        subprocess.Popen(['git', '--version'], stdout=subprocess.PIPE).communicate()
+    except OSError:
+        return False
+    return True
+
+
+class TestGit(unittest.TestCase):
+
+    def setUp(self,):
+        if not hasGit():
+            raise unittest.SkipTest("No git")
+        self.orig_wd = os.getcwd()
+        self.tmpd = tempfile.mkdtemp()
+        os.chdir(self.tmpd)
+        self.git('init', '-q')
+        self.write('.gitignore', "ignored.py\n")
+        self.write('a.py', "def a():\n    pass\n")
+        self.write('b.py', "def b():\n    a()\n")
+        self.write('notes.txt', "Not Python\n")
+        os.mkdir('sub')
+        self.write(os.path.join('sub', 'c.py'), "c = 1\n")
+        self.write('ignored.py', "i = 1\n")
+        self.git('add', '.')
+        self.git('-c', 'user.name=test', '-c', 'user.email=test@example.com',
+                 'commit', '-q', '-m', 'Initial')
+
+    def tearDown(self,):
+        if not hasattr(self, 'tmpd'):
+            return
+        os.chdir(self.orig_wd)
+        shutil.rmtree(self.tmpd)
+
+    def git(self, *args):
+        subprocess.check_call(('git',) + args, cwd=self.tmpd)
+
+    def write(self, fname, contents):
+        with open(os.path.join(self.tmpd, fname), 'w') as f:
+            f.write(contents)
+
+    def index(self,):
+        with open(os.path.join(self.tmpd, 'cscope.out')) as f:
+            return f.read()
+
+    def testlistfiles(self,):
+        self.write('d.py', "d = 1\n")
+        os.remove(os.path.join(self.tmpd, 'a.py'))
+        excluded = pycscope.excludeMatcher([])
+        fnames, untracked = listFiles(self.tmpd, ['.'], True, excluded)
+        self.assertEqual(sorted(fnames), ['./b.py', './d.py', './sub/c.py'])
+        self.assertEqual(untracked, set(['d.py']))
+
+        fnames, untracked = listFiles(self.tmpd, ['.'], False, excluded)
+        self.assertEqual(sorted(fnames), ['./b.py', './d.py'])
+
+        fnames, untracked = listFiles(self.tmpd, ['sub', 'b.py'], True, excluded)
+        self.assertEqual(sorted(fnames), ['b.py', 'sub/c.py'])
+
+        fnames, untracked = listFiles(self.tmpd, ['.'], True, pycscope.excludeMatcher(['sub']))
+        self.assertEqual(sorted(fnames), ['./b.py', './d.py'])
+
+    def testchangedfiles(self,):
+        self.write('a.py', "def a():\n    return 1\n")
+        self.git('mv', 'b.py', 'e.py')
+        self.git('rm', '-q', os.path.join('sub', 'c.py'))
+        self.write('f.py', "f = 1\n")
+        self.git('add', 'f.py')
+        self.assertEqual(changedFiles(self.tmpd, 'HEAD'), set(['a.py', 'e.py', 'f.py']))
+        self.assertRaises(GitError, changedFiles, self.tmpd, 'nosuchrev')
+
+    def testmaingit(self,):
+        ret = pycscope.main(['pycscope', '-R', '--git'])
+        self.assertEqual(ret, 0)
+        index = self.index()
+        self.assertTrue('\t@./a.py\n' in index)
+        self.assertTrue('\t@./sub/c.py\n' in index)
+        self.assertFalse('ignored.py' in index)
+
+    def parsed(self, argv):
+        """ The files parsed by a run, and what it printed.
+        """
+        parsed = []
+        workFile = pycscope.workFile
+
+        def spy(args):
+            parsed.append(args[1])
+            return workFile(args)
+
+        pycscope.workFile = spy
+        stdout = sys.stdout
+        sys.stdout = out = StringIO()
+        try:
+            self.assertEqual(pycscope.main(argv), 0)
+        finally:
+            pycscope.workFile = workFile
+            sys.stdout = stdout
+        return sorted(parsed), out.getvalue()
+
+    def testmainsince(self,):
+        self.write(os.path.join('sub', 'f.py'), "f = 1\n")
+        self.git('add', '.')
+        self.git('-c', 'user.name=test', '-c', 'user.email=test@example.com',
+                 'commit', '-q', '-m', 'More')
+        pycscope.main(['pycscope', '-R', '-u', '--git'])
+        self.write('a.py', "def a():\n    return 1\n")
+        self.git('mv', 'b.py', 'e.py')
+        os.remove(os.path.join(self.tmpd, 'sub', 'c.py'))
+        self.write('d.py', "d = 1\n")
+
+        parsed, out = self.parsed(['pycscope', '-R', '--since=HEAD'])
+        # Not sub/f.py, which is unchanged
+        self.assertEqual(parsed, ['./a.py', './d.py', './e.py'])
+        self.assertEqual(out, '')
+
+        # The same as when everything is parsed again
+        index = self.index()
+        pycscope.main(['pycscope', '-R', '--git'])
+        self.assertEqual(index, self.index())
+        self.assertFalse('c.py' in index)
+        self.assertFalse('b.py' in index)
+
+    def testmainsincefull(self,):
+        # A cross-ref file written without -u or --since has no state to
+        # update it from: every file is parsed, saying so
+        pycscope.main(['pycscope', '-R', '--git'])
+        parsed, out = self.parsed(['pycscope', '-R', '--since=HEAD'])
+        self.assertEqual(parsed, ['./a.py', './b.py', './sub/c.py'])
+        self.assertTrue(out.startswith("pycscope.py: cscope.out: Not written by a -u or --since run"))
+        # Which it can be next time
+        parsed, out = self.parsed(['pycscope', '-R', '--since=HEAD'])
+        self.assertEqual(parsed, [])
+        self.assertEqual(out, '')
+
+    def testwatchgit(self,):
+        # The files to watch and index are those git lists
+        built = []
+
+        def build(gen, cache=None):
+            built.append(sorted(gen))
+
+        files = lambda: listFiles(self.tmpd, ['.'], True, pycscope.excludeMatcher([]))[0]
+        watchTree(self.tmpd, ['.'], True, (), False, None, build, PollWatcher(0.01), 0.05, 0,
+                  files=files)
+        self.assertEqual(built, [['./a.py', './b.py', './sub/c.py']])
+
+    def testmainnotrepo(self,):
+        shutil.rmtree(os.path.join(self.tmpd, '.git'))
+        os.environ['GIT_CEILING_DIRECTORIES'] = os.path.dirname(self.tmpd)
+        try:
+            ret = pycscope.main(['pycscope', '--git'])
+        finally:
+            del os.environ['GIT_CEILING_DIRECTORIES']
+        self.assertEqual(ret, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.tmpd, 'cscope.out')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+"""Unit tests for the inverted index.
+"""
+
+import unittest
+import os
+import struct
+import tempfile
+import shutil
+from io import BytesIO
+import pycscope
+from pycscope.inverted import InvertedIndex, BLOCK_SIZE, LONG_SIZE, fileNames
+
+
+def readInverted(inv, post):
+    """ Read back the term and postings files the way cscope does,
+        returning the terms with their postings, in order.
+    """
+    version, filestat, sizeblk, startbyte, supsize, cntlsize, share = \
+        struct.unpack_from('lllllll', inv)
+    assert version == 1
+    assert sizeblk == cntlsize == BLOCK_SIZE
+
+    # The superindex holds the first term of each block
+    superindex = inv[startbyte:startbyte + supsize]
+    numblocks = struct.unpack_from('l', superindex)[0]
+    offsets = struct.unpack_from('%dl' % numblocks, superindex, LONG_SIZE)
+    firsts = [superindex[o:superindex.index(b'\0', o)] for o in offsets]
+
+    terms = []
+    num = 0
+    while True:
+        block = inv[cntlsize + num * sizeblk:cntlsize + (num + 1) * sizeblk]
+        count, nextblock, prevblock = struct.unpack_from('lll', block)
+        assert prevblock == num - 1
+        for i in range(count):
+            offset, size, space, npost = struct.unpack_from('hBBl', block, (3 + 2 * i) * LONG_SIZE)
+            term = block[offset:offset + size]
+            if i == 0 and num > 0:
+                assert term == firsts[num]
+            if not term:
+                # The null term, which has no actual postings
+                terms.append((term, npost))
+                continue
+            postoffset = struct.unpack_from('l', block, offset + (size + LONG_SIZE - 1) // LONG_SIZE * LONG_SIZE)[0]
+            postings = []
+            for j in range(npost):
+                lineoffset, fcnoffset, filetype = struct.unpack_from('lll', post, postoffset + j * 3 * LONG_SIZE)
+                postings.append((lineoffset, fcnoffset, filetype & 0xffffff, filetype >> 24))
+            terms.append((term, postings))
+        num = nextblock
+        if num == 0:
+            break
+    assert num == 0 and len(firsts) == numblocks
+    return terms
+
+
+class TestInvertedIndex(unittest.TestCase):
+
+    def index(self, chunks, offset=100):
+        inverted = InvertedIndex()
+        for chunk in chunks:
+            inverted.add(chunk, offset)
+            offset += len(chunk)
+        finv = BytesIO()
+        fpost = BytesIO()
+        inverted.write(finv, fpost)
+        return len(inverted), readInverted(finv.getvalue(), fpost.getvalue())
+
+    def testpostings(self,):
+        chunks = [b'\n\t@a.py\n\n1 \n\t=a\n = 1\n\n',
+                  b'\n\t@b.py\n\n1 def \n\t$f\n ( \nx\n ) :\n\n2 \n\t`g\n ( \na\n ) \n\t}\n\n3 \n\t`f\n ( )\n\n']
+        nterms, terms = self.index(chunks)
+        self.assertEqual(nterms, 5)
+        # The null term starts the index
+        self.assertEqual(terms[0], (b'', 1))
+        b = 100 + len(chunks[0])
+        line1 = b + chunks[1].index(b'1 def')
+        line2 = b + chunks[1].index(b'2 ')
+        line3 = b + chunks[1].index(b'3 ')
+        fcn = b + chunks[1].index(b'\t$f') + 2
+        self.assertEqual(terms[1:], [
+            (b'a', [(109, 0, 0, ord('=')), (line2, fcn, 1, 2)]),
+            (b'f', [(line1, 0, 1, ord('$')), (line3, 0, 1, ord('`'))]),
+            (b'g', [(line2, fcn, 1, ord('`'))]),
+            (b'x', [(line1, fcn, 1, 2)]),
+            ])
+
+    def testblocks(self,):
+        names = ['sym%04d' % i for i in range(2000)]
+        chunk = ''.join('%d \n%s\n\n' % (i + 1, n) for i, n in enumerate(names))
+        nterms, terms = self.index([b'\n\t@a.py\n\n', chunk.encode()])
+        self.assertEqual(nterms, 2001)
+        self.assertEqual([t[0] for t in terms[1:]], [n.encode() for n in names])
+        self.assertEqual(len(terms[1999][1]), 1)
+
+    def testlongterm(self,):
+        nterms, terms = self.index([b'\n\t@a.py\n\n1 \n' + b'x' * 256 + b'\n\n'])
+        self.assertEqual(nterms, 1)
+        self.assertEqual(terms, [(b'', 1)])
+
+    def testfilenames(self,):
+        self.assertEqual(fileNames("cscope.out"), ("cscope.in.out", "cscope.po.out"))
+        self.assertEqual(fileNames("x/y.out"), ("x/y.out.in", "x/y.out.po"))
+
+
+class TestStreamInverted(unittest.TestCase):
+
+    def teststream(self,):
+        chunks = [(['\n\t@a.py\n\n', '1 \n\t=a\n = 1\n\n'], ['a.py'])]
+        inverted = InvertedIndex()
+        fout = BytesIO()
+        pycscope.streamIndex("/tmp/foo", fout, iter(chunks), inverted)
+        contents = fout.getvalue()
+        self.assertEqual(contents, b"cscope 15 /tmp/foo -c -q 0000000002 0000000072\n\t@a.py\n\n1 \n\t=a\n = 1\n\n\n\t@\n1\n.\n0\n1\n5\na.py\n")
+        self.assertEqual(contents[72:75], b"1\n.")
+
+        # The postings point at the line the symbol is on
+        lineoffset = list(inverted.postings.values())[0]
+        self.assertEqual(contents.index(b"1 \n\t=a"), struct.unpack_from('l', bytes(lineoffset))[0])
+
+        self.assertEqual(pycscope.readIndex(BytesIO(contents)),
+                         ("/tmp/foo", {'a.py': '1 \n\t=a\n = 1\n\n'}))
+
+    def testcompressed(self,):
+        chunks = [(['\n\t@a.py\n\n', '1 \n\t=test\n = 1\n\n'], ['a.py'])]
+        inverted = InvertedIndex(True)
+        fout = BytesIO()
+        pycscope.streamIndex("/tmp/foo", fout, iter(chunks), inverted, True)
+        self.assertEqual(list(inverted.postings.keys()), [b'test'])
+        self.assertTrue(fout.getvalue().startswith(b"cscope 15 /tmp/foo -q 0000000002 "))
+
+
+class TestMainInverted(unittest.TestCase):
+
+    def testmaindashq(self,):
+        tmpd = tempfile.mkdtemp()
+        cwd = os.getcwd()
+        try:
+            os.chdir(tmpd)
+            with open('a.py', "w") as a:
+                a.write("def f(a):\n    return g(a)\n")
+            ret = pycscope.main(['pycscope', '-q', '-f', 'x.out', 'a.py'])
+            self.assertEqual(ret, 0)
+            with open('x.out') as f:
+                contents = f.read()
+            with open('x.out.in', 'rb') as f:
+                inv = f.read()
+            with open('x.out.po', 'rb') as f:
+                post = f.read()
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(tmpd)
+
+        self.assertTrue(contents.startswith("cscope 15 %s -c -q 0000000004 " % tmpd))
+        terms = readInverted(inv, post)
+        self.assertEqual([t[0] for t in terms], [b'', b'a', b'f', b'g'])
+        self.assertEqual([p[3] for p in terms[3][1]], [ord('`')])
+        fcnoffset = terms[3][1][0][1]
+        self.assertEqual(contents[fcnoffset:fcnoffset + 2], "f\n")
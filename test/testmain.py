@@ -22,6 +22,8 @@ class TestMain(unittest.TestCase):
         shutil.rmtree(self.tmpd)
         self.tmpd = None
         pycscope.strings_as_symbols = False
+        pycscope.kwlist = pycscope.python_keywords
+        pycscope.fast_size = 10 * 1024 * 1024
 
     def testmainopterr(self,):
         ret = pycscope.main()
@@ -59,6 +61,146 @@ class TestMain(unittest.TestCase):
         ret = os.listdir(self.tmpd)
         assert ['pycscope.out',] == ret, "Expected ['pycscope.out'], got %r" % ret
 
+    def testmainengine(self,):
+        with open(os.path.join(self.tmpd, 'a.py'), 'w') as a:
+            a.write('a = 1\n')
+        for engine in pycscope.engines:
+            ret = pycscope.main(['arg0', '--engine=%s' % engine, 'a.py'])
+            assert 0 == ret, "Expected 0, got %r" % ret
+            with open(os.path.join(self.tmpd, 'cscope.out'), 'r') as c:
+                contents = c.read()
+            assert '\n\t@a.py\n\n1 \n\t=a\n = 1\n\n' in contents, "Unexpected contents %r" % contents
+
+    def testmainbadengine(self,):
+        ret = pycscope.main(['arg0', '--engine=bogus'])
+        assert 2 == ret, "Expected 2, got %r" % ret
+        ret = os.listdir(self.tmpd)
+        assert [] == ret, "Expected [], got %r" % ret
+
+    def testmainfast(self,):
+        with open(os.path.join(self.tmpd, 'a.py'), 'w') as a:
+            a.write('a a (b)\n')
+        ret = pycscope.main(['arg0', '--fast=bogus', 'a.py'])
+        assert 2 == ret, "Expected 2, got %r" % ret
+        # The file is too big for the full engine, which would fail to parse it
+        ret = pycscope.main(['arg0', '--fast=8', 'a.py'])
+        assert 0 == ret, "Expected 0, got %r" % ret
+        with open(os.path.join(self.tmpd, 'cscope.out'), 'r') as c:
+            contents = c.read()
+        assert '\n\t@a.py\n\n1 \naa\n ( \nb\n )\n\n' in contents, "Unexpected contents %r" % contents
+
+    def testmaindashj(self,):
+        with open(os.path.join(self.tmpd, 'a.py'), 'w') as a:
+            a.write('a = 1\n')
+        with open(os.path.join(self.tmpd, 'b.py'), 'w') as b:
+            b.write('b = 2\n')
+        ret = pycscope.main(['arg0', '-f', 'serial.out', 'a.py', 'b.py'])
+        assert 0 == ret, "Expected 0, got %r" % ret
+        ret = pycscope.main(['arg0', '-j', '2', '-f', 'parallel.out', 'a.py', 'b.py'])
+        assert 0 == ret, "Expected 0, got %r" % ret
+        with open(os.path.join(self.tmpd, 'serial.out'), 'r') as c:
+            serial = c.read()
+        with open(os.path.join(self.tmpd, 'parallel.out'), 'r') as c:
+            parallel = c.read()
+        assert serial == parallel, "Expected %r, got %r" % (serial, parallel)
+
+    def testmainbaddashj(self,):
+        ret = pycscope.main(['arg0', '-j', 'x'])
+        assert 2 == ret, "Expected 2, got %r" % ret
+        ret = os.listdir(self.tmpd)
+        assert [] == ret, "Expected [], got %r" % ret
+
+    def testmaincache(self,):
+        with open(os.path.join(self.tmpd, 'a.py'), 'w') as a:
+            a.write('a = 1\n')
+        outputs = []
+        for i in range(2):
+            ret = pycscope.main(['arg0', '--cache=.pycscope.cache', 'a.py'])
+            assert 0 == ret, "Expected 0, got %r" % ret
+            with open(os.path.join(self.tmpd, 'cscope.out'), 'r') as c:
+                outputs.append(c.read())
+        assert outputs[0] == outputs[1], "Expected %r, got %r" % tuple(outputs)
+        ret = sorted(os.listdir(self.tmpd))
+        expf = ['.pycscope.cache', 'a.py', 'cscope.out']
+        assert expf == ret, "Expected %r, got %r" % (expf, ret)
+
+    def testmaindashu(self,):
+        def write(name, contents, mtime):
+            with open(os.path.join(self.tmpd, name), 'w') as f:
+                f.write(contents)
+            os.utime(os.path.join(self.tmpd, name), (mtime, mtime))
+        write('a.py', 'a = 1\n', 1000000000)
+        write('b.py', 'b = 2\n', 1000000000)
+        write('d.py', 'd = 4\n', 1000000000)
+        ret = pycscope.main(['arg0', '-u', '-R', '.'])
+        assert 0 == ret, "Expected 0, got %r" % ret
+
+        # Change a.py without changing its modification time, so that it is
+        # not parsed again; change b.py, add c.py and remove d.py.
+        write('a.py', 'x = 1\n', 1000000000)
+        write('b.py', 'y = 2\n', 1000000200)
+        write('c.py', 'c = 3\n', 1000000200)
+        os.remove(os.path.join(self.tmpd, 'd.py'))
+        ret = pycscope.main(['arg0', '-u', '-R', '.'])
+        assert 0 == ret, "Expected 0, got %r" % ret
+        with open(os.path.join(self.tmpd, 'cscope.out'), 'r') as c:
+            contents = c.read()
+
+        write('a.py', 'a = 1\n', 1000000000)
+        ret = pycscope.main(['arg0', '-R', '-f', 'full.out', '.'])
+        assert 0 == ret, "Expected 0, got %r" % ret
+        with open(os.path.join(self.tmpd, 'full.out'), 'r') as c:
+            econtents = c.read()
+        assert econtents == contents, "Expected %r, got %r" % (econtents, contents)
+        assert '\t=y' in contents and '\t=c' in contents and '\t=d' not in contents, "Got %r" % contents
+
+    def testmaindashurestored(self,):
+        # A file restored with an older modification time is parsed again
+        with open(os.path.join(self.tmpd, 'a.py'), 'w') as a:
+            a.write('a = 1\n')
+        ret = pycscope.main(['arg0', '-u', 'a.py'])
+        assert 0 == ret, "Expected 0, got %r" % ret
+        with open(os.path.join(self.tmpd, 'a.py'), 'w') as a:
+            a.write('b = 22\n')
+        os.utime(os.path.join(self.tmpd, 'a.py'), (1000000000, 1000000000))
+        ret = pycscope.main(['arg0', '-u', 'a.py'])
+        assert 0 == ret, "Expected 0, got %r" % ret
+        with open(os.path.join(self.tmpd, 'cscope.out'), 'r') as c:
+            contents = c.read()
+        assert '\n\t@a.py\n\n1 \n\t=b\n = 22\n\n' in contents, "Got %r" % contents
+
+    def testmaindashusettings(self,):
+        # Files are parsed again when the settings change
+        with open(os.path.join(self.tmpd, 'a.py'), 'w') as a:
+            a.write('a = "b"\n')
+        os.utime(os.path.join(self.tmpd, 'a.py'), (1000000000, 1000000000))
+        ret = pycscope.main(['arg0', '-u', 'a.py'])
+        assert 0 == ret, "Expected 0, got %r" % ret
+        ret = sorted(os.listdir(self.tmpd))
+        expf = ['a.py', 'cscope.out', 'cscope.up.out']
+        assert expf == ret, "Expected %r, got %r" % (expf, ret)
+        ret = pycscope.main(['arg0', '-u', '-S', 'a.py'])
+        assert 0 == ret, "Expected 0, got %r" % ret
+        with open(os.path.join(self.tmpd, 'cscope.out'), 'r') as c:
+            contents = c.read()
+        assert '\n\t=a\n = " \nb\n "\n\n' in contents, "Got %r" % contents
+
+        # Without -u, the state of the files no longer holds
+        ret = pycscope.main(['arg0', 'a.py'])
+        assert 0 == ret, "Expected 0, got %r" % ret
+        ret = sorted(os.listdir(self.tmpd))
+        expf = ['a.py', 'cscope.out']
+        assert expf == ret, "Expected %r, got %r" % (expf, ret)
+
+    def testmaindashunoindex(self,):
+        with open(os.path.join(self.tmpd, 'a.py'), 'w') as a:
+            a.write('a = 1\n')
+        ret = pycscope.main(['arg0', '-u', 'a.py'])
+        assert 0 == ret, "Expected 0, got %r" % ret
+        with open(os.path.join(self.tmpd, 'cscope.out'), 'r') as c:
+            contents = c.read()
+        assert '\n\t@a.py\n\n1 \n\t=a\n = 1\n\n' in contents, "Got %r" % contents
+
     def testmaindashi(self,):
         with open(os.path.join(self.tmpd, 'a.py'), 'w') as a:
             a.write('a = "b"\n')
@@ -76,6 +218,21 @@ class TestMain(unittest.TestCase):
         econtents = 'cscope 15 %s -c 0000000088\n\t@b.py\n\n1 \n\t=b\n = 2\n\n\n\t@a.py\n\n1 \n\t=a\n = "b"\n\n\n\t@\n1\n.\n0\n2\n10\nb.py\na.py\n' % self.tmpd
         assert econtents == contents, "Expected %r, got %r" % (econtents, contents)
 
+    def testmainkeywords(self,):
+        with open(os.path.join(self.tmpd, 'a.py'), 'w') as a:
+            a.write('x = type(match)\n')
+        ret = pycscope.main(['arg0', '--keywords=soft,,x', 'a.py'])
+        assert 0 == ret, "Expected 0, got %r" % ret
+        with open(os.path.join(self.tmpd, 'cscope.out'), 'r') as c:
+            contents = c.read()
+        # Calls of the keywords are not marked
+        assert '\n\t=x\n = type ( match )\n' in contents, "Got %r" % contents
+        # Only for this run
+        pycscope.main(['arg0', 'a.py'])
+        with open(os.path.join(self.tmpd, 'cscope.out'), 'r') as c:
+            contents = c.read()
+        assert ' ( \nmatch\n )\n' in contents, "Got %r" % contents
+
     def testmaindashRdashS(self,):
         with open(os.path.join(self.tmpd, 'a.py'), 'w') as a:
             a.write('a = 1\n')
@@ -32,6 +32,19 @@ class TestParseFile(unittest.TestCase):
         try:
             l = pycscope.parseFile(cwd, fn, self.buf, 0, self.fnbuf)
         except SyntaxError as e:
-            self.assertEquals(os.path.join(cwd, fn), e.filename)
+            self.assertEqual(os.path.join(cwd, fn), e.filename)
         else:
             self.fail("Expected a syntax error.")
+
+    def testfastsize(self,):
+        # Files as big as fast_size or bigger are indexed with the fast
+        # engine, which only tokenizes them
+        cwd = os.getcwd()
+        fn = "badsyntax.py"
+        pycscope.fast_size = os.path.getsize(fn)
+        try:
+            l = pycscope.parseFile(cwd, fn, self.buf, 0, self.fnbuf, engine='ast')
+        finally:
+            pycscope.fast_size = 10 * 1024 * 1024
+        self.assertEqual(l, 2)
+        self.assertEqual(self.buf, ['\n\t@badsyntax.py\n\n', '1 \naa\n ( \nbar\n )\n\n'])
@@ -2,13 +2,25 @@
 """ Unit tests for parsing Python source into cscope index
 """
 
-import unittest, parser, errno
+import unittest, ast, errno, keyword, random, sys
 try:
     from cStringIO import StringIO
 except ImportError:
     from io import StringIO
 import pycscope
-from pycscope import parseSource, Line, Symbol, NonSymbol, Mark, dumpCst
+from pycscope import parseSource, Line, LineBuilder, Symbol, NonSymbol, Mark, dumpCst, dumpAst
+try:
+    import parser
+except ImportError:
+    parser = None
+
+
+def dumpTree(src, engine):
+    """ Dump the syntax tree the given engine builds for the source.
+    """
+    if engine == 'cst':
+        return dumpCst(parser.suite(src), StringIO()).getvalue()
+    return dumpAst(ast.parse(src), StringIO()).getvalue()
 
 
 class TestMark(unittest.TestCase):
@@ -88,6 +100,13 @@ class TestMark(unittest.TestCase):
         n = Mark(Mark.FUNC_END)
         self.assertTrue(m == n)
 
+    def testInterned(self,):
+        # Verify each mark is a single, shared object
+        self.assertTrue(Mark(Mark.ASSIGN) is Mark(Mark.ASSIGN))
+        self.assertTrue(Mark() is Mark(''))
+        self.assertTrue(Symbol('x', Mark.LOCAL).hasMark(Mark(Mark.LOCAL)))
+        self.assertFalse(Symbol('x').hasMark(Mark(Mark.LOCAL)))
+
     def testGetattr(self,):
         m = Mark(Mark.INCLUDE)
         try:
@@ -186,6 +205,7 @@ class TestSymbol(unittest.TestCase):
         s = Symbol('foo', '=')
         self.assertEqual('<Symbol:\t=foo>', repr(s))
 
+    @unittest.skipIf(sys.hexversion >= 0x03000000, "coerce() is gone in Python 3")
     def testCoerce(self,):
         try:
             s = Symbol('bar')
@@ -243,6 +263,11 @@ class TestLine(unittest.TestCase):
         else:
             self.fail("Expected an attribute error looking for the non-existent line_number attribute")
 
+    def testSlots(self,):
+        # Verify the objects created for each token carry no dictionary
+        for obj in (Line(1), Symbol('x', Mark.GLOBAL), NonSymbol('='), Mark()):
+            self.assertFalse(hasattr(obj, '__dict__'))
+
     def testAddAndRepr(self,):
         l = Line(113)
         l += Symbol("x", Mark.GLOBAL)
@@ -258,6 +283,7 @@ class TestLine(unittest.TestCase):
         l += NonSymbol(")")
         self.assertEqual("<Line:117 def \\n\tgx\\n ( \\n\t~y\\n )\\n\\n>", repr(l))
 
+    @unittest.skipIf(sys.hexversion >= 0x03000000, "coerce() is gone in Python 3")
     def testCoerce(self,):
         try:
             l = Line(42)
@@ -268,12 +294,69 @@ class TestLine(unittest.TestCase):
             self.fail("Expected a TypeError exception.")
 
 
+class TestLineBuilder(unittest.TestCase):
+    """ Verify the LineBuilder class against the Line class.
+    """
+
+    def build(self, num, tokens):
+        l = Line(num)
+        b = LineBuilder(num)
+        for kind, val in tokens:
+            if kind == 'end':
+                l += Symbol('', Mark.FUNC_END)
+                b.addFuncEnd()
+            elif kind == 'sym':
+                l += Symbol(val)
+                b.addSymbol(val)
+            elif kind == 'text':
+                l += NonSymbol(val)
+                b.addNonSymbol(val)
+            else:
+                l += Symbol(val, kind)
+                b.addSymbol(val, kind)
+        self.assertEqual(l.format(), b.format())
+        return b.format()
+
+    def testFormat(self,):
+        self.assertEqual(self.build(113, [(Mark.GLOBAL, "x"), ('text', "="), ('text', "5")]),
+                         "113 \n\tgx\n = 5\n\n")
+        self.assertEqual(self.build(117, [('text', "def"), (Mark.GLOBAL, "x"), ('text', "("),
+                                          (Mark.INCLUDE, "y"), ('text', ")")]),
+                         "117 def \n\tgx\n ( \n\t~y\n )\n\n")
+        self.assertEqual(self.build(3, [('text', "pass")]), '')
+        self.assertEqual(self.build(4, [('end', None)]), "4 \n\t}\n\n")
+        self.assertEqual(self.build(5, [('sym', "f"), ('end', None)]), "5 \nf\n \n\t}\n\n")
+        self.assertEqual(self.build(6, [('text', "return"), ('sym', "a"), ('sym', "."), ('sym', "b"), ('end', None)]),
+                         "6 return \na.b\n \n\t}\n\n")
+
+    def testRandom(self,):
+        rnd = random.Random(42)
+        kinds = ['sym', 'sym', 'text', 'text', 'end', Mark.FUNC_CALL]
+        for i in range(500):
+            tokens = []
+            for j in range(rnd.randint(0, 8)):
+                kind = rnd.choice(kinds)
+                if tokens and tokens[-1][0] in ('end', Mark.FUNC_CALL) and kind not in ('text', 'end'):
+                    # Symbols following a marked symbol are marked the same
+                    kind = 'text'
+                elif tokens and tokens[-1][0] == 'sym' and kind == Mark.FUNC_CALL:
+                    kind = 'sym'
+                tokens.append((kind, rnd.choice(['a', 'b', ' ', '(', 'xyz'])))
+            self.build(i + 1, tokens)
+
+
+@unittest.skipIf(parser is None, "No parser module")
 class TestDumpCst(unittest.TestCase):
 
     def testGoodStream(self,):
         res = dumpCst(parser.suite("a = 1"), StringIO()).getvalue()
         exp = "['file_input',\n ['stmt',\n  ['simple_stmt',\n   ['small_stmt',\n    ['expr_stmt',\n     ['testlist',\n      ['test',\n       ['or_test',\n        ['and_test',\n         ['not_test',\n          ['comparison',\n           ['expr',\n            ['xor_expr',\n             ['and_expr',\n              ['shift_expr',\n               ['arith_expr',\n                ['term',\n                 ['factor',\n                  ['power', ['atom', ['NAME', 'a', 1]]]]]]]]]]]]]]]],\n     ['EQUAL', '=', 1],\n     ['testlist',\n      ['test',\n       ['or_test',\n        ['and_test',\n         ['not_test',\n          ['comparison',\n           ['expr',\n            ['xor_expr',\n             ['and_expr',\n              ['shift_expr',\n               ['arith_expr',\n                ['term',\n                 ['factor',\n                  ['power', ['atom', ['NUMBER', '1', 1]]]]]]]]]]]]]]]]]],\n   ['NEWLINE', '', 1]]],\n ['NEWLINE', '', 1],\n ['ENDMARKER', '', 1]]\n"
-        self.assertEquals(res, exp)
+        if sys.hexversion >= 0x03050000:
+            # The atom and its trailers are an atom_expr inside the power
+            exp = "['file_input',\n ['stmt',\n  ['simple_stmt',\n   ['small_stmt',\n    ['expr_stmt',\n     ['testlist_star_expr',\n      ['test',\n       ['or_test',\n        ['and_test',\n         ['not_test',\n          ['comparison',\n           ['expr',\n            ['xor_expr',\n             ['and_expr',\n              ['shift_expr',\n               ['arith_expr',\n                ['term',\n                 ['factor',\n                  ['power',\n                   ['atom_expr', ['atom', ['NAME', 'a', 1]]]]]]]]]]]]]]]]],\n     ['EQUAL', '=', 1],\n     ['testlist_star_expr',\n      ['test',\n       ['or_test',\n        ['and_test',\n         ['not_test',\n          ['comparison',\n           ['expr',\n            ['xor_expr',\n             ['and_expr',\n              ['shift_expr',\n               ['arith_expr',\n                ['term',\n                 ['factor',\n                  ['power',\n                   ['atom_expr', ['atom', ['NUMBER', '1', 1]]]]]]]]]]]]]]]]]]],\n   ['NEWLINE', '', 1]]],\n ['NEWLINE', '', 1],\n ['ENDMARKER', '', 1]]\n"
+        elif sys.hexversion >= 0x03000000:
+            exp = exp.replace("['testlist',", "['testlist_star_expr',")
+        self.assertEqual(res, exp)
 
     def testGoodStreamBadPipe(self,):
         import pprint
@@ -287,7 +370,7 @@ class TestDumpCst(unittest.TestCase):
             res = dumpCst(parser.suite("a = 1"), StringIO()).getvalue()
         finally:
             pprint.pprint = orig_pprint
-        self.assertEquals(res, "")
+        self.assertEqual(res, "")
 
     def testGoodStreamIOError(self,):
         import pprint
@@ -321,15 +404,22 @@ class TestParseSource(unittest.TestCase):
     def setUp(self,):
         self.buf = []
         pycscope.strings_as_symbols = False
+        pycscope.string_names = False
+        pycscope.kwlist = pycscope.python_keywords
 
     def tearDown(self,):
         pycscope.strings_as_symbols = False
+        pycscope.string_names = False
+        pycscope.kwlist = pycscope.python_keywords
 
-    def verify(self, src, exp, dump=False):
+    def verify(self, src, exp, dump=False, engines=None):
         ''' Run the verification of a source value against an expected output
             value. The values are list of strings, each string representing an
             individual line. An empty list is interpretted as an empty
             file. And empty string is interpretted as an empty line.
+
+            The verification is run for each of the given engines available,
+            all of them by default.
         '''
         # We create one long string for both source and expected values so
         # that the caller can enumerate each line without adding new lines,
@@ -342,22 +432,26 @@ class TestParseSource(unittest.TestCase):
         expStr = "\n".join(exp)
         if exp:
             expStr += "\n"
-        try:
-            l = parseSource(srcStr, self.buf, 0, dump)
-        except AssertionError as ae:
-            self.fail("Internal AssertionError Encountered: %s\n"
-                      "Concrete Syntax Tree:\n"
-                      "%s\n"
-                      % (ae, dumpCst(parser.suite(srcStr),StringIO()).getvalue()))
-        self.assertEqual(l, len(self.buf))
-        output = "".join(self.buf)
-        self.assertEqual(output, expStr,
-                         "Output not quite what was expected:\n"
-                         "    out: %r\n"
-                         "    exp: %r\n"
-                         "Concrete Syntax Tree:\n"
-                         "%s\n"
-                         % (output, expStr, dumpCst(parser.suite(srcStr),StringIO()).getvalue()))
+        for engine in sorted(engines or pycscope.engines):
+            if engine not in pycscope.engines:
+                continue
+            self.buf = []
+            try:
+                l = parseSource(srcStr, self.buf, 0, dump, engine)
+            except AssertionError as ae:
+                self.fail("Internal AssertionError Encountered (%s engine): %s\n"
+                          "Syntax Tree:\n"
+                          "%s\n"
+                          % (engine, ae, dumpTree(srcStr, engine)))
+            self.assertEqual(l, len(self.buf))
+            output = "".join(self.buf)
+            self.assertEqual(output, expStr,
+                             "Output not quite what was expected (%s engine):\n"
+                             "    out: %r\n"
+                             "    exp: %r\n"
+                             "Syntax Tree:\n"
+                             "%s\n"
+                             % (engine, output, expStr, dumpTree(srcStr, engine)))
 
     def testEmptyCode(self,):
         # Verify we can handle an empty file.
@@ -653,6 +747,60 @@ class TestParseSource(unittest.TestCase):
                      " \"\"\" )",
                      ""])
 
+    def testStringsAsSymbolsOnPrefixed(self,):
+        pycscope.strings_as_symbols = True
+        self.verify(["foo(b'abc', br\"\"\"d_1\"\"\", u'a b')"],
+                    ["1 ",
+                     "\t`foo",
+                     " ( b' ",
+                     "abc",
+                     " ' , br\"\"\" ",
+                     "d_1",
+                     " \"\"\" , u'a b' )",
+                     ""])
+
+    @unittest.skipIf(sys.hexversion < 0x03060000, "f-strings are new in Python 3.6")
+    def testStringsAsSymbolsOnFString(self,):
+        pycscope.strings_as_symbols = True
+        self.verify(["foo(f'abc', f'{abc}')"],
+                    ["1 ",
+                     "\t`foo",
+                     " ( f' ",
+                     "abc",
+                     " ' , f'{abc}' )",
+                     ""])
+
+    def testStringNames(self,):
+        pycscope.string_names = True
+        self.verify(["__all__ = ['f', 'a b']",
+                     "d = {'k': getattr(o, 'n'), 'x' 'y': 1}",
+                     "foo('s')[\"i\"]"],
+                    ["1 ",
+                     "\t=__all__",
+                     " = [ ' ",
+                     "f",
+                     " ' , 'a b' ]",
+                     "",
+                     "2 ",
+                     "\t=d",
+                     " = { ' ",
+                     "k",
+                     " ' : ",
+                     "\t`getattr",
+                     " ( ",
+                     "o",
+                     " , ' ",
+                     "n",
+                     " ' ) , 'x' 'y' : 1 }",
+                     "",
+                     "3 ",
+                     "\t`foo",
+                     " ( 's' ) [ \" ",
+                     "i",
+                     " \" ]",
+                     ""],
+                    engines=['ast'])
+
     def testNoSymbolForAssignment(self,):
         self.verify(["foo(x,5)[1] = 6"],
                     ["1 ",
@@ -662,6 +810,42 @@ class TestParseSource(unittest.TestCase):
                      " , 5 ) [ 1 ] = 6",
                      ""])
 
+    def testKeywords(self,):
+        pycscope.kwlist = pycscope.python_keywords | frozenset(("match", "self"))
+        # Marked names are still symbols
+        self.verify(["match = self.x or match"],
+                    ["1 ",
+                     "\t=match",
+                     " = self . ",
+                     "x",
+                     " or match",
+                     ""],
+                    engines=['ast', 'cst'])
+        # Called names are not
+        pycscope.kwlist = pycscope.python_keywords | frozenset(("len",))
+        self.verify(["def f(x):",
+                     "    len = 2",
+                     "    return g(len(x))"],
+                    ["1 def ",
+                     "\t$f",
+                     " ( ",
+                     "x",
+                     " ) :",
+                     "",
+                     "2 ",
+                     "\t=len",
+                     " = 2",
+                     "",
+                     "3 return ",
+                     "\t`g",
+                     " ( len ( ",
+                     "x",
+                     " ) ) ",
+                     "\t}",
+                     ""])
+        # The standard list is left alone
+        self.assertEqual(len(set(keyword.kwlist)), len(keyword.kwlist))
+
     def testAugmentedAssignment(self,):
         self.verify(["a += 4",
                      "b *= 6"],
@@ -839,6 +1023,107 @@ class TestParseSource(unittest.TestCase):
                      "tup",
                      ""])
 
+    def testChainedAssignmentLambda(self,):
+        # The "=" of the default values of the lambda are no assignments
+        self.verify(["a = b = lambda c=d: c"],
+                    ["1 ",
+                     "\t=a",
+                     " = ",
+                     "\t=b",
+                     " = lambda ",
+                     "c",
+                     " = ",
+                     "d",
+                     " : ",
+                     "c",
+                     ""])
+
+    @unittest.skipIf(sys.hexversion < 0x030A0000, "No match statements")
+    def testMatchStatement(self,):
+        # Soft keywords used as keywords are non-symbol text
+        self.verify(["match x:",
+                     "    case y if z:",
+                     "        pass",
+                     "    case _: a = 1"],
+                    ["1 match ",
+                     "x",
+                     " :",
+                     "",
+                     "2 case ",
+                     "y",
+                     " if ",
+                     "z",
+                     " :",
+                     "",
+                     "4 case ",
+                     "_",
+                     " : ",
+                     "\t=a",
+                     " = 1",
+                     ""])
+
+    @unittest.skipIf(sys.hexversion < 0x030A0000, "No match statements")
+    def testMatchStatementCalls(self,):
+        # Calls in the subject are marked, the soft keyword before them is not
+        self.verify(["match S(x):",
+                     "    case []:",
+                     "        pass",
+                     "    case (1 | 2) if f(b):",
+                     "        pass"],
+                    ["1 match ",
+                     "\t`S",
+                     " ( ",
+                     "x",
+                     " ) :",
+                     "",
+                     "4 case ( 1 | 2 ) if ",
+                     "\t`f",
+                     " ( ",
+                     "b",
+                     " ) :",
+                     ""])
+
+    def testSoftKeywordsAsNames(self,):
+        self.verify(["match = type(case)",
+                     "match[x] = case.type"],
+                    ["1 ",
+                     "\t=match",
+                     " = ",
+                     "\t`type",
+                     " ( ",
+                     "case",
+                     " )",
+                     "",
+                     "2 ",
+                     "\t=match",
+                     " [ ",
+                     "x",
+                     " ] = ",
+                     "case",
+                     " . ",
+                     "type",
+                     ""])
+
+    @unittest.skipIf(sys.hexversion < 0x030C0000, "No type statements")
+    def testTypeStatement(self,):
+        self.verify(["type X = int",
+                     "type L[T] = list[T]"],
+                    ["1 type ",
+                     "\t=X",
+                     " = ",
+                     "int",
+                     "",
+                     "2 type ",
+                     "\t=L",
+                     " [ ",
+                     "T",
+                     " ] = ",
+                     "list",
+                     " [ ",
+                     "T",
+                     " ]",
+                     ""])
+
     def testListAssignmentBracket3(self,):
         self.verify(["[a[z.foo(1,2)],b] = tup"],
                     ["1 [ ",
@@ -1154,6 +1439,8 @@ class TestParseSource(unittest.TestCase):
                      ""])
 
     def testFuncCallSimpleWithArgs(self,):
+        # Only the parser module accepts a positional argument after a
+        # keyword argument.
         self.verify(["main(a,b=45,c)"],
                     ["1 ",
                      "\t`main",
@@ -1164,7 +1451,8 @@ class TestParseSource(unittest.TestCase):
                      " = 45 , ",
                      "c",
                      " )",
-                     ""])
+                     ""],
+                    engines=("cst",))
 
     def testFuncCallSimpleTrailer(self,):
         self.verify(["maine.alaska()"],
@@ -1531,3 +1819,195 @@ class TestParseSource(unittest.TestCase):
                      '\t$print',
                      ' ( ) : return 0',
                      ''])
+
+    def testParenthesizedAttributeCall(self,):
+        self.verify(['s = (a + b).c()'],
+                    ['1 ',
+                     '\t=s',
+                     ' = ( ',
+                     'a',
+                     ' + ',
+                     'b',
+                     ' ) . ',
+                     '\t`c',
+                     ' ( )',
+                     ''])
+
+    @unittest.skipIf(sys.hexversion < 0x03060000, "No f-strings")
+    def testFStrings(self,):
+        self.verify(['x = f"{y()}" + z()'],
+                    ['1 ',
+                     '\t=x',
+                     ' = f"{y()}" + ',
+                     '\t`z',
+                     ' ( )',
+                     ''])
+
+    @unittest.skipIf(sys.hexversion < 0x03000000, "Source is bytes")
+    def testNonAsciiColumns(self,):
+        self.verify(['t = "\xe9" + u.v(w)'],
+                    ['1 ',
+                     '\t=t',
+                     ' = "\xe9" + ',
+                     'u',
+                     ' . ',
+                     '\t`v',
+                     ' ( ',
+                     'w',
+                     ' )',
+                     ''])
+
+    @unittest.skipIf(sys.hexversion < 0x03060000, "No annotated assignments")
+    def testAnnotatedAssignment(self,):
+        self.verify(['a: int = b()',
+                     'c: int'],
+                    ['1 ',
+                     '\t=a',
+                     ' : ',
+                     'int',
+                     ' = ',
+                     '\t`b',
+                     ' ( )',
+                     '',
+                     '2 ',
+                     'c',
+                     ' : ',
+                     'int',
+                     ''])
+
+    @unittest.skipIf(sys.hexversion < 0x03050000, "No async def")
+    def testAsyncDef(self,):
+        self.verify(['async def f():',
+                     '    await g.h()'],
+                    ['1 async def ',
+                     '\t$f',
+                     ' ( ) :',
+                     '',
+                     '2 await ',
+                     'g',
+                     ' . ',
+                     '\t`h',
+                     ' ( ) ',
+                     '\t}',
+                     ''])
+
+    @unittest.skipIf(sys.hexversion < 0x03080000, "No assignment expressions")
+    def testAssignmentExpression(self,):
+        self.verify(['if (n := len(a)) > 10:',
+                     '    pass'],
+                    ['1 if ( ',
+                     '\t=n',
+                     ' := ',
+                     '\t`len',
+                     ' ( ',
+                     'a',
+                     ' ) ) > 10 :',
+                     ''])
+
+    def testClassDecorators(self,):
+        self.verify(['@x.y(1)',
+                     '@property',
+                     'class C:',
+                     '    @a.b(c())',
+                     '    def m(self): pass'],
+                    ['1 @ ',
+                     'x',
+                     ' . ',
+                     'y',
+                     ' ( 1 )',
+                     '',
+                     '2 @ ',
+                     'property',
+                     '',
+                     '3 class ',
+                     '\tcC',
+                     ' :',
+                     '',
+                     '4 @ ',
+                     'a',
+                     ' . ',
+                     '\t`b',
+                     ' ( ',
+                     '\t`c',
+                     ' ( ) )',
+                     '',
+                     '5 def ',
+                     '\t$m',
+                     ' ( ',
+                     'self',
+                     ' ) : pass',
+                     ''])
+
+
+@unittest.skipIf(parser is None, "No parser module")
+class TestCstChunks(unittest.TestCase):
+    """ Verify long source code is indexed the same when the cst engine
+        parses it in chunks.
+    """
+
+    src = "\n".join(['# -*- coding: utf-8 -*-',
+                     'from __future__ import (print_function,',
+                     '                        division)',
+                     'import sys',
+                     '@dec',
+                     'def f(a):',
+                     '    print(a, file=sys.stderr)',
+                     'if f:',
+                     '    x = 1',
+                     'else:',
+                     '    x = 2',
+                     'y = [1,',
+                     '     2]',
+                     '',
+                     '# A comment',
+                     '"""A long',
+                     'string"""',
+                     'class C(object):',
+                     '    def m(self):',
+                     '        return "\xc3\xa9" / 2',
+                     'f(y)',
+                     ''])
+
+    def index(self, chunk_lines):
+        saved = pycscope.cst_chunk_lines
+        pycscope.cst_chunk_lines = chunk_lines
+        try:
+            buf = []
+            parseSource(self.src, buf, 0, engine='cst')
+            return buf
+        finally:
+            pycscope.cst_chunk_lines = saved
+
+    def testChunks(self,):
+        saved = pycscope.cst_chunk_lines
+        pycscope.cst_chunk_lines = 1
+        try:
+            chunks = pycscope.cstChunks(self.src)
+        finally:
+            pycscope.cst_chunk_lines = saved
+        # Decorators and else clauses stay with their statements
+        self.assertEqual([chunk.count("\n") for chunk, skip in chunks],
+                         [3, 4, 7, 11, 15, 17, 20, 21])
+        self.assertEqual([skip for chunk, skip in chunks], [0, 1, 1, 1, 1, 1, 1, 1])
+        self.assertEqual(chunks[1][0].split("\n")[:2],
+                         ['# -*- coding: utf-8 -*-', 'from __future__ import print_function , division'])
+
+    def testLongStatement(self,):
+        # A top level statement longer than a chunk is not split, its chunk
+        # is as long as it is
+        src = ''.join(['x = 1\n', 'def f():\n'] +
+                      ['    a%d = g(%d)\n' % (i, i) for i in range(1100)] +
+                      ['y = 2\n'])
+        chunks = pycscope.cstChunks(src)
+        self.assertEqual([chunk.count("\n") for chunk, skip in chunks], [1102, 1103])
+        buf = []
+        parseSource(src, buf, 0, engine='cst')
+        expected = []
+        parseSource(src, expected, 0, engine='ast')
+        self.assertEqual(buf, expected)
+        self.assertTrue("1002 \n\t=a999\n = \n\t`g\n ( 999 )\n\n" in buf)
+
+    def testSameIndex(self,):
+        expected = self.index(1000)
+        for chunk_lines in (1, 2, 5):
+            self.assertEqual(self.index(chunk_lines), expected)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""Unit tests for the queries on cross-ref files.
+"""
+
+import unittest
+import os
+import tempfile
+import shutil
+import pycscope
+from pycscope.query import CrossRef, Reference, GLOBAL, UNKNOWN
+
+
+SOURCE = """import os.path
+from sys import argv
+
+X = 1
+
+class C(object):
+    def meth(self, a):
+        return helper(a)
+
+def helper(x):
+    y = os.path.join(x, "s")
+    return C().meth(y)
+
+helper(X)
+"""
+
+
+class TestQuery(unittest.TestCase):
+
+    def setUp(self,):
+        self.orig_wd = os.getcwd()
+        self.tmpd = tempfile.mkdtemp()
+        os.chdir(self.tmpd)
+        with open('m.py', 'w') as f:
+            f.write(SOURCE)
+        with open('n.py', 'w') as f:
+            f.write("from m import helper\n\ndef other():\n    helper(2)\n")
+
+    def tearDown(self,):
+        os.chdir(self.orig_wd)
+        shutil.rmtree(self.tmpd)
+
+    def crossRef(self, *args):
+        pycscope.main(['pycscope'] + list(args) + ['m.py', 'n.py'])
+        return CrossRef(os.path.join(self.tmpd, 'cscope.out'))
+
+    def checkQueries(self, xref):
+        self.assertEqual(xref.basepath, self.tmpd)
+        self.assertEqual(xref.findSymbol('helper'), [
+            Reference('m.py', 'meth', 8, 'return helper ( a )'),
+            Reference('m.py', 'helper', 10, 'def helper ( x ) :'),
+            Reference('m.py', GLOBAL, 14, 'helper ( X )'),
+            Reference('n.py', GLOBAL, 1, 'from m import helper'),
+            Reference('n.py', 'other', 4, 'helper ( 2 )')])
+        self.assertEqual(xref.findDefinition('C'), [
+            Reference('m.py', 'C', 6, 'class C ( object ) :')])
+        self.assertEqual([(ref.function, ref.line) for ref in xref.findCallees('helper')],
+                         [('join', 11), ('C', 12), ('meth', 12)])
+        self.assertEqual([(ref.file, ref.function) for ref in xref.findCallers('helper')],
+                         [('m.py', 'meth'), ('m.py', GLOBAL), ('n.py', 'other')])
+        self.assertEqual([ref.line for ref in xref.findAssignments('y')], [11])
+        self.assertEqual([ref.line for ref in xref.findIncludes('path')], [1])
+        self.assertEqual([ref.file for ref in xref.findIncludes('m')], ['n.py'])
+        self.assertEqual([ref.file for ref in xref.findFile('^n')], ['n.py'])
+        self.assertEqual(xref.findText('os.path.join'), [
+            Reference('m.py', UNKNOWN, 11, 'y = os.path.join(x, "s")')])
+        self.assertEqual([(ref.file, ref.line) for ref in xref.findEgrep('^def ')],
+                         [('m.py', 10), ('n.py', 3)])
+        self.assertEqual(xref.findSymbol('nosuchsymbol'), [])
+        # Symbols are matched exactly
+        self.assertEqual(xref.findSymbol('help'), [])
+
+    def testqueries(self,):
+        with self.crossRef() as xref:
+            self.checkQueries(xref)
+
+    def testcompressed(self,):
+        with self.crossRef('--compress') as xref:
+            self.checkQueries(xref)
+
+    def testnotcrossref(self,):
+        open('empty.out', 'w').close()
+        self.assertRaises(ValueError, CrossRef, 'empty.out')
+        self.assertRaises(ValueError, CrossRef, 'm.py')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""Unit tests for reading source files.
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+import pycscope
+
+
+class TestReadSource(unittest.TestCase):
+
+    def setUp(self,):
+        self.tmpd = tempfile.mkdtemp()
+
+    def tearDown(self,):
+        shutil.rmtree(self.tmpd)
+
+    def read(self, data):
+        path = os.path.join(self.tmpd, 'm.py')
+        with open(path, 'wb') as f:
+            f.write(data)
+        return pycscope.readSource(path)
+
+    def decoded(self, data):
+        # What tokenize.open() would read in Python 3, bytes as they are in
+        # Python 2
+        if sys.hexversion < 0x03000000:
+            return data
+        return data.decode('utf-8')
+
+    def testutf8(self,):
+        data = u"x = '\xe9'\n".encode('utf-8')
+        self.assertEqual(self.read(data), (self.decoded(data), len(data)))
+
+    def testnewlines(self,):
+        text, size = self.read(b"a = 1\r\nb = 2\r\n")
+        self.assertEqual(text, self.decoded(b"a = 1\nb = 2\n"))
+        self.assertEqual(size, 14)
+
+    @unittest.skipIf(sys.hexversion < 0x03000000, "Sources are not decoded in Python 2")
+    def testdeclared(self,):
+        self.assertEqual(self.read(b"# -*- coding: latin-1 -*-\nx = '\xe9'\n")[0],
+                         u"# -*- coding: latin-1 -*-\nx = '\xe9'\n")
+        self.assertEqual(self.read(b"\xef\xbb\xbfx = 1\n")[0], u"x = 1\n")
+        # Lone carriage returns end lines too
+        self.assertEqual(self.read(b"a = 1\rb = 2\n")[0], u"a = 1\nb = 2\n")
+        self.assertRaises(SyntaxError, self.read, b"x = '\xe9'\n")
+        self.assertRaises(UnicodeDecodeError, self.read, b"x = 1\n\n'\xe9'\n")
+
+    def testlarge(self,):
+        data = b"x = 1\r\n" * 1000
+        saved = pycscope.mmap_size
+        pycscope.mmap_size = 1000
+        try:
+            self.assertEqual(self.read(data), (self.decoded(b"x = 1\n" * 1000), len(data)))
+        finally:
+            pycscope.mmap_size = saved
+        # Read into the buffer, grown to fit
+        self.assertEqual(self.read(data * 20)[1], 20 * len(data))
+        self.assertEqual(self.read(b""), (self.decoded(b""), 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
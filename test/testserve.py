@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+"""Unit tests for the query server.
+"""
+
+import unittest
+import os
+import sys
+import socket
+import tempfile
+import threading
+import shutil
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+import pycscope
+from pycscope.serve import ResultCache, Server
+
+
+class TestServe(unittest.TestCase):
+
+    def setUp(self,):
+        self.orig_wd = os.getcwd()
+        self.tmpd = tempfile.mkdtemp()
+        os.chdir(self.tmpd)
+        self.write("def helper(x):\n    return x\n\nhelper(1)\n")
+        self.indexfn = os.path.join(self.tmpd, 'cscope.out')
+
+    def tearDown(self,):
+        os.chdir(self.orig_wd)
+        shutil.rmtree(self.tmpd)
+
+    def write(self, source):
+        with open('m.py', 'w') as f:
+            f.write(source)
+        pycscope.main(['pycscope', 'm.py'])
+
+    def session(self, server, queries):
+        fout = StringIO()
+        server.session(StringIO(queries), fout)
+        return fout.getvalue()
+
+    def testsession(self,):
+        server = Server(self.indexfn)
+        try:
+            out = self.session(server, "3helper\n\n1helper\n5helper\n7^m\nq\n0helper\n")
+        finally:
+            server.close()
+        self.assertEqual(out, ">> cscope: 1 lines\n"
+                         "m.py <global> 4 helper ( 1 )\n"
+                         ">> >> cscope: 1 lines\n"
+                         "m.py helper 1 def helper ( x ) :\n"
+                         ">> cscope: 0 lines\n"
+                         ">> cscope: 1 lines\n"
+                         "m.py <unknown> 1 <unknown>\n"
+                         ">> ")
+
+    def testreload(self,):
+        server = Server(self.indexfn)
+        try:
+            self.assertEqual(len(server.query('3', 'helper')), 1)
+            xref = server.xref
+            self.assertEqual(len(server.query('3', 'helper')), 1)
+            self.assertTrue(server.xref is xref)
+
+            # The results kept are dropped along with the old cross-ref file
+            self.write("def helper(x):\n    return x\n\nhelper(1)\nhelper(2)\n")
+            st = os.stat(self.indexfn)
+            os.utime(self.indexfn, (st.st_atime, st.st_mtime + 10))
+            self.assertEqual(len(server.query('3', 'helper')), 2)
+            self.assertFalse(server.xref is xref)
+        finally:
+            server.close()
+
+    def testresultcache(self,):
+        cache = ResultCache(2)
+        cache.put('a', [1])
+        cache.put('b', [2])
+        self.assertEqual(cache.get('a'), [1])
+        cache.put('c', [3])
+        # The least recently used is dropped
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), [1])
+        self.assertEqual(cache.get('c'), [3])
+
+    def testsocket(self,):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise unittest.SkipTest("No Unix sockets")
+        sockpath = os.path.join(self.tmpd, 'sock')
+        server = Server(self.indexfn)
+        ready = threading.Event()
+        thread = threading.Thread(target=server.serveSocket, args=(sockpath, ready.set))
+        thread.daemon = True
+        thread.start()
+        self.assertTrue(ready.wait(10))
+
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(sockpath)
+        conn.sendall(b"1helper\nq\n")
+        data = b""
+        while True:
+            chunk = conn.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+        conn.close()
+        self.assertEqual(data, b">> cscope: 1 lines\nm.py helper 1 def helper ( x ) :\n>> ")
+
+    def testqueryerror(self,):
+        server = Server(self.indexfn)
+        stderr = sys.stderr
+        sys.stderr = err = StringIO()
+        try:
+            out = self.session(server, "6(\n1helper\n")
+        finally:
+            sys.stderr = stderr
+            server.close()
+        # One line telling the number of results, the error goes elsewhere
+        self.assertEqual(out, ">> cscope: 0 lines\n"
+                         ">> cscope: 1 lines\n"
+                         "m.py helper 1 def helper ( x ) :\n"
+                         ">> ")
+        self.assertTrue(err.getvalue().startswith("pycscope.py: 6(: "))
+
+    def testsocketinuse(self,):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise unittest.SkipTest("No Unix sockets")
+        sockpath = os.path.join(self.tmpd, 'sock')
+        # A socket left behind, no server listening on it, is replaced
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(sockpath)
+        stale.close()
+        server = Server(self.indexfn)
+        ready = threading.Event()
+        thread = threading.Thread(target=server.serveSocket, args=(sockpath, ready.set))
+        thread.daemon = True
+        thread.start()
+        self.assertTrue(ready.wait(10))
+
+        # The socket of a live server is left alone
+        other = Server(self.indexfn)
+        try:
+            self.assertRaises(socket.error, other.serveSocket, sockpath)
+            self.assertEqual(pycscope.main(['pycscope', 'serve', '--socket=%s' % sockpath]), 1)
+        finally:
+            other.close()
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(sockpath)
+        conn.sendall(b"q\n")
+        data = b""
+        while True:
+            chunk = conn.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+        conn.close()
+        self.assertEqual(data, b">> ")
+
+        # Nor is a file that is not a socket
+        os.remove(sockpath)
+        with open(sockpath, 'w') as f:
+            f.write('x')
+        self.assertRaises(socket.error, other.serveSocket, sockpath)
+        self.assertTrue(os.path.isfile(sockpath))
+
+    def testmain(self,):
+        self.assertEqual(pycscope.main(['pycscope', 'serve', '-f', 'none.out']), 1)
+        self.assertEqual(pycscope.main(['pycscope', 'serve', '--results=x']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""Unit tests for the run statistics.
+"""
+
+import unittest
+import os
+import json
+import tempfile
+import shutil
+import pycscope
+from pycscope.stats import Stats, profileFile
+
+
+class TestStats(unittest.TestCase):
+
+    def setUp(self,):
+        self.tmpd = tempfile.mkdtemp()
+        self.names = []
+        for i in range(6):
+            name = 'f%d.py' % i
+            with open(os.path.join(self.tmpd, name), "w") as f:
+                if i == 3:
+                    f.write("a a (b)\n")
+                else:
+                    f.write("def f%d():\n    return g%d(%d)\n" % (i, i, i))
+            self.names.append(name)
+
+    def tearDown(self,):
+        pycscope.run_stats = None
+        shutil.rmtree(self.tmpd)
+
+    def testhooks(self,):
+        calls = []
+        pycscope.run_stats = stats = Stats()
+        stats.addHook(lambda phase, fname, rec: calls.append((phase, fname, rec['calls'])))
+        pycscope.work(self.tmpd, self.names, False)
+
+        self.assertTrue(('read', 'f0.py', 1) in calls)
+        self.assertTrue(('walk', 'f5.py', 1) in calls)
+        # The file that cannot be parsed is not walked
+        self.assertTrue(('walk', 'f3.py', 1) not in calls)
+        self.assertEqual(sorted(stats.files), self.names)
+        self.assertEqual(stats.phases['read']['calls'], 6)
+        self.assertEqual(stats.phases['read']['bytes'],
+                         sum(os.path.getsize(os.path.join(self.tmpd, n)) for n in self.names))
+        self.assertEqual(stats.phases['walk']['calls'], 5)
+        self.assertEqual(len(stats.slowest(2)), 2)
+
+    def testjobs(self,):
+        # The records of the worker processes end up in the parent process
+        pycscope.run_stats = stats = Stats()
+        pycscope.work(self.tmpd, iter(self.names), False, jobs=2)
+        self.assertEqual(sorted(stats.files), self.names)
+        self.assertEqual(stats.phases['read']['calls'], 6)
+        self.assertEqual(stats.phases['walk']['calls'], 5)
+
+    def testmissing(self,):
+        # Files that cannot be read are reported, and their records kept
+        cwd = os.getcwd()
+        os.chdir(self.tmpd)
+        try:
+            ret = pycscope.main(['pycscope', '-f', 'cscope.out', '--stats=stats.json', 'f0.py', 'missing.py'])
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(ret, 0)
+        with open(os.path.join(self.tmpd, 'stats.json')) as f:
+            report = json.load(f)
+        self.assertEqual(sorted(report['files']), ['f0.py', 'missing.py'])
+        self.assertEqual(report['phases']['walk']['calls'], 1)
+
+    def testmain(self,):
+        cwd = os.getcwd()
+        os.chdir(self.tmpd)
+        try:
+            pycscope.main(['pycscope', '-f', 'cscope.out', '--stats=stats.json', '--profile=1'])
+        finally:
+            os.chdir(cwd)
+        self.assertTrue(pycscope.run_stats is None)
+        with open(os.path.join(self.tmpd, 'stats.json')) as f:
+            report = json.load(f)
+        self.assertEqual(report['version'], pycscope.__version__)
+        self.assertEqual(sorted(report['files']), [os.path.join('.', n) for n in self.names])
+        self.assertEqual(report['phases']['genFiles']['count'], 6)
+        self.assertTrue(report['phases']['write']['bytes'] > 0)
+        self.assertEqual(len(report['profiles']), 1)
+        self.assertTrue(report['profiles'][0]['functions'])
+
+    def testprofile(self,):
+        pycscope.run_stats = stats = Stats()
+        profile = profileFile(self.tmpd, 'f0.py')
+        self.assertEqual(profile['file'], 'f0.py')
+        self.assertTrue(profile['functions'])
+        # Profiling a file is not recorded in the statistics of the run
+        self.assertTrue(pycscope.run_stats is stats)
+        self.assertEqual(stats.files, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
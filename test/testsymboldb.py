@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""Unit tests for the symbol database.
+"""
+
+import unittest
+import os
+import sqlite3
+import tempfile
+import shutil
+import pycscope
+from pycscope.query import CrossRef
+from pycscope.symboldb import SymbolDatabase
+
+
+SOURCE = """import os.path
+
+class C(object):
+    def meth(self, a):
+        return helper(a)
+
+def helper(x):
+    y = os.path.join(x, "s")
+    return C().meth(y)
+
+helper(1)
+"""
+
+
+class TestSymbolDatabase(unittest.TestCase):
+
+    def setUp(self,):
+        self.orig_wd = os.getcwd()
+        self.tmpd = tempfile.mkdtemp()
+        os.chdir(self.tmpd)
+        self.write('m.py', SOURCE)
+        self.write('n.py', "from m import helper\n\ndef other():\n    helper(2)\n")
+
+    def tearDown(self,):
+        os.chdir(self.orig_wd)
+        shutil.rmtree(self.tmpd)
+
+    def write(self, fname, source):
+        with open(fname, 'w') as f:
+            f.write(source)
+
+    def rows(self, sql):
+        db = sqlite3.connect('sym.db')
+        try:
+            return db.execute(sql).fetchall()
+        finally:
+            db.close()
+
+    def testqueries(self,):
+        pycscope.main(['pycscope', '--sqlite=sym.db', 'm.py', 'n.py'])
+        symdb = SymbolDatabase('sym.db')
+        xref = CrossRef('cscope.out')
+        try:
+            for query, name in (('findSymbol', 'helper'), ('findDefinition', 'C'),
+                                ('findCallees', 'helper'), ('findCallers', 'helper'),
+                                ('findAssignments', 'y'), ('findIncludes', 'os.path'),
+                                ('findFile', '^n'), ('findSymbol', 'nosuchsymbol')):
+                self.assertEqual(getattr(symdb, query)(name), getattr(xref, query)(name))
+        finally:
+            symdb.close()
+            xref.close()
+
+    def testupdate(self,):
+        pycscope.main(['pycscope', '--sqlite=sym.db', 'm.py', 'n.py'])
+        files = dict(self.rows("SELECT path, id FROM files"))
+
+        # Only the file that changed is written again, and the one gone is
+        # deleted, along with the symbols only it had
+        self.write('n.py', "def another():\n    pass\n")
+        pycscope.main(['pycscope', '--sqlite=sym.db', 'n.py', 'm.py'])
+        self.assertEqual(dict(self.rows("SELECT path, id FROM files")), files)
+        self.assertEqual(self.rows("SELECT name FROM symbols WHERE name = 'other'"), [])
+        self.assertEqual(self.rows("SELECT line FROM marks JOIN symbols ON symbols.id = marks.symbol"
+                                   " WHERE name = 'another'"), [(1,)])
+
+        pycscope.main(['pycscope', '--sqlite=sym.db', 'm.py'])
+        self.assertEqual(self.rows("SELECT path FROM files"), [('m.py',)])
+        self.assertEqual(self.rows("SELECT * FROM marks WHERE file = %d" % files['n.py']), [])
+        self.assertEqual(self.rows("SELECT name FROM symbols WHERE name = 'another'"), [])
+
+    def testbatches(self,):
+        symdb = SymbolDatabase('sym.db', batch=1)
+        try:
+            symdb.addFile('m.py', "1 \n\t=x\n = 1\n\n")
+            # Committed with its batch, before the end of the run
+            self.assertEqual(self.rows("SELECT path FROM files"), [('m.py',)])
+            symdb.finish()
+        finally:
+            symdb.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
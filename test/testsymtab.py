@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+"""Unit tests for the symbol table.
+"""
+
+import unittest
+import pycscope
+from pycscope.callgraph import CallGraphBuilder
+from pycscope.symtab import SymbolTable
+
+
+class TestSymbolTable(unittest.TestCase):
+
+    def testintern(self,):
+        table = SymbolTable()
+        self.assertEqual(table.intern(b"a"), 0)
+        self.assertEqual(table.intern(b"b"), 1)
+        self.assertEqual(table.intern(b"a"), 0)
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table.name(1), b"b")
+
+    def testcallgraphnames(self,):
+        indexbuff = [pycscope.fileMark("m.py")]
+        pycscope.parseSource("def f(x):\n    y = g(x)\n", indexbuff, 1)
+        table = SymbolTable()
+        graph = CallGraphBuilder(table)
+        graph.add(pycscope.encoded(''.join(indexbuff)))
+        # Only the names of functions are held, each once
+        self.assertEqual(table.names, [b"<global>", b"f", b"g"])
+        self.assertEqual(graph.calls, set([(1, 2)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""Unit tests for the watch mode.
+"""
+
+import unittest
+import os
+import time
+import tempfile
+import shutil
+import threading
+import pycscope
+from pycscope.watch import (MemoryCache, PollWatcher, InotifyWatcher, loadLibc, gather,
+                            watchTree)
+
+
+class FakeWatcher(object):
+    """ Hands out the given batches of changes, then none.
+    """
+    def __init__(self, batches):
+        self.batches = list(batches)
+
+    def changes(self, timeout=None):
+        if self.batches:
+            return self.batches.pop(0)
+        return set()
+
+
+class TestWatch(unittest.TestCase):
+
+    def setUp(self,):
+        self.tmpd = tempfile.mkdtemp()
+        self.write('a.py', "def a():\n    pass\n")
+        self.write('b.py', "def b():\n    a()\n")
+        os.mkdir(os.path.join(self.tmpd, 'sub'))
+        self.write(os.path.join('sub', 'c.py'), "c = 1\n")
+
+    def tearDown(self,):
+        shutil.rmtree(self.tmpd)
+
+    def write(self, fname, contents):
+        with open(os.path.join(self.tmpd, fname), 'w') as f:
+            f.write(contents)
+
+    def index(self,):
+        with open(os.path.join(self.tmpd, 'cscope.out')) as f:
+            return f.read()
+
+    def testmemorycache(self,):
+        fullpath = os.path.join(self.tmpd, 'a.py')
+        cache = MemoryCache()
+        lines, info, data = cache.lookup(fullpath)
+        self.assertTrue(lines is None)
+        cache.store(fullpath, info, "lines\n")
+        self.assertEqual(cache.lookup(fullpath), ("lines\n", None, None))
+
+        cache.forget(fullpath)
+        self.assertTrue(cache.lookup(fullpath)[0] is None)
+
+        cache.store(fullpath, info, "lines\n")
+        cache.prune(set())
+        self.assertTrue(cache.lookup(fullpath)[0] is None)
+
+        # Missing files are left for the parsing to report
+        self.assertEqual(cache.lookup(os.path.join(self.tmpd, 'none.py')), (None, None, None))
+
+    def testgather(self,):
+        changed = gather(FakeWatcher([set(['a']), set(['b'])]), set(['c']), debounce=0)
+        self.assertEqual(changed, set(['a', 'b', 'c']))
+        # Lost events stand for any change
+        self.assertTrue(gather(FakeWatcher([None, set(['b'])]), set(['c']), debounce=0) is None)
+
+    def checkWatcher(self, watcher):
+        try:
+            subdir = os.path.join(self.tmpd, 'sub')
+            watcher.watch([self.tmpd, subdir], [os.path.join(self.tmpd, 'a.py')])
+            self.assertEqual(watcher.changes(0.1), set())
+
+            self.write('notes.txt', "Not Python\n")
+            self.assertEqual(watcher.changes(0.2), set())
+
+            self.write(os.path.join('sub', 'd.py'), "d = 1\n")
+            changed = watcher.changes(1)
+            self.assertTrue(changed)
+            self.assertTrue(changed <= set([subdir, os.path.join(subdir, 'd.py')]))
+        finally:
+            watcher.close()
+
+    def testpoll(self,):
+        self.checkWatcher(PollWatcher(0.01))
+
+    def testinotify(self,):
+        libc = loadLibc()
+        if libc is None:
+            raise unittest.SkipTest("No inotify")
+        self.checkWatcher(InotifyWatcher(libc))
+
+    def testbuildindex(self,):
+        pycscope.buildIndex(self.tmpd, 'cscope.out', iter(['a.py', 'b.py']))
+        self.assertTrue('\t$a\n' in self.index())
+        self.assertEqual(sorted(os.listdir(self.tmpd)), ['a.py', 'b.py', 'cscope.out', 'sub'])
+
+    def testwatchtree(self,):
+        parsed = []
+        workFile = pycscope.workFile
+
+        def spy(args):
+            parsed.append(args[1])
+            return workFile(args)
+
+        def build(gen, cache):
+            pycscope.buildIndex(self.tmpd, 'cscope.out', gen, cache=cache)
+
+        pycscope.workFile = spy
+        try:
+            thread = threading.Thread(target=watchTree,
+                                      args=(self.tmpd, ['.'], True, (), False, None, build,
+                                            PollWatcher(0.01), 0.05, 1))
+            thread.daemon = True
+            thread.start()
+            deadline = time.time() + 10
+            while len(parsed) < 3 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(sorted(parsed), [os.path.join('.', n) for n in ('a.py', 'b.py', 'sub/c.py')])
+
+            # Wait for the modification time to tell the change
+            time.sleep(0.05)
+            del parsed[:]
+            self.write(os.path.join('sub', 'c.py'), "c = 1\nd = 2\n")
+            self.write('e.py', "e = 3\n")
+            thread.join(10)
+            self.assertFalse(thread.is_alive())
+        finally:
+            pycscope.workFile = workFile
+
+        # Only the files that changed were parsed again
+        self.assertEqual(sorted(parsed), [os.path.join('.', n) for n in ('e.py', 'sub/c.py')])
+        index = self.index()
+        self.assertTrue('\t$a\n' in index)
+        self.assertTrue('\t=d\n' in index)
+        self.assertTrue('\t=e\n' in index)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,10 @@
 
 import unittest
 import os
-from cStringIO import StringIO
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
 import tempfile
 import shutil
 import pycscope
@@ -26,7 +29,30 @@ class TestWork(unittest.TestCase):
 
             # Actual test
             ibuf, fbuf = pycscope.work(tmpd, ['a', 's', 'b'], False)
-            self.assertEquals(ibuf, ['\n\t@a\n\n', '1 \n\t=a\n = 1\n\n', '\n\t@s\n\n', '\n\t@b\n\n', '1 \n\t=b\n = 1\n\n'])
-            self.assertEquals(fbuf, ['a', 's', 'b'])
+            self.assertEqual(ibuf, ['\n\t@a\n\n', '1 \n\t=a\n = 1\n\n', '\n\t@s\n\n', '\n\t@b\n\n', '1 \n\t=b\n = 1\n\n'])
+            self.assertEqual(fbuf, ['a', 's', 'b'])
+        finally:
+            shutil.rmtree(tmpd)
+
+    def testworkjobs(self,):
+        tmpd = tempfile.mkdtemp()
+        try:
+            # Create enough files to be spread across the workers, with a
+            # syntactically incorrect one in the middle.
+            names = []
+            for i in range(40):
+                name = 'f%d.py' % i
+                with open(os.path.join(tmpd, name), "w") as f:
+                    if i == 20:
+                        f.write("a a (b)\n")
+                    else:
+                        f.write("def f%d():\n    return g%d(%d)\n" % (i, i, i))
+                names.append(name)
+
+            # Actual test: parallel results match the serial ones
+            serial = pycscope.work(tmpd, names, False)
+            parallel = pycscope.work(tmpd, iter(names), False, jobs=3)
+            self.assertEqual(serial, parallel)
+            self.assertEqual(parallel[1], names)
         finally:
             shutil.rmtree(tmpd)
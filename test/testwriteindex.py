@@ -3,7 +3,11 @@
 """
 
 import unittest
-from cStringIO import StringIO
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+from io import BytesIO
 import pycscope
 
 
@@ -12,4 +16,62 @@ class TestWriteIndex(unittest.TestCase):
     def testioerrors(self,):
         fout = StringIO()
         pycscope.writeIndex("/tmp/foo/bar", fout, ['mockline1','mockline2'], ["fname1","fname2"])
-        self.assertEquals("cscope 15 /tmp/foo/bar -c 0000000055mockline1mockline2\n1\n.\n0\n2\n14\nfname1\nfname2\n", fout.getvalue())
+        self.assertEqual("cscope 15 /tmp/foo/bar -c 0000000055mockline1mockline2\n1\n.\n0\n2\n14\nfname1\nfname2\n", fout.getvalue())
+
+
+class TestStreamIndex(unittest.TestCase):
+
+    def teststream(self,):
+        chunks = [(['\n\t@a.py\n\n', '1 \n\t=a\n = 1\n\n'], ['a.py']),
+                  (['\n\t@s.py\n\n'], ['s.py']),
+                  ([], []),
+                  (['\n\t@b c.py\n\n', '1 \n\t=b\n = 1\n\n'], ['b c.py'])]
+        expected = StringIO()
+        pycscope.writeIndex("/tmp/foo bar", expected,
+                            sum([c[0] for c in chunks], []) + ['\n\t@'],
+                            sum([c[1] for c in chunks], []))
+        fout = BytesIO()
+        pycscope.streamIndex("/tmp/foo bar", fout, iter(chunks))
+        self.assertEqual(fout.getvalue(), expected.getvalue().encode())
+        # Writing continues after the trailer
+        fout.write(b"x")
+        self.assertEqual(fout.getvalue(), expected.getvalue().encode() + b"x")
+
+    def testempty(self,):
+        fout = BytesIO()
+        pycscope.streamIndex("/tmp/foo/bar", fout, iter([]))
+        self.assertEqual(b"cscope 15 /tmp/foo/bar -c 0000000040\n\t@\n1\n.\n0\n0\n1\n\n", fout.getvalue())
+
+    def testcompress(self,):
+        chunks = [(['\n\t@a.py\n\n', '1 \n\t=test\n = 1\n\n', '2 return \nb\n\n'], ['a.py'])]
+        fout = BytesIO()
+        pycscope.streamIndex("/tmp/foo/bar", fout, iter(chunks), compress=True)
+        self.assertEqual(b"cscope 15 /tmp/foo/bar 0000000067\n\t@a.py\n\n1 \n\t=\x8b\xa1\n \xf01\n\n2 \x15 \nb\n\n"
+                         b"\n\t@\n1\n.\n0\n1\n5\na.py\n", fout.getvalue())
+
+
+class TestReadIndex(unittest.TestCase):
+
+    def testroundtrip(self,):
+        fout = StringIO()
+        indexbuff = ['\n\t@a.py\n\n', '1 \n\t=a\n = 1\n\n', '\n\t@s.py\n\n', '\n\t@b c.py\n\n', '1 \n\t=b\n = 1\n\n', '\n\t@']
+        pycscope.writeIndex("/tmp/foo bar", fout, indexbuff, ["a.py", "s.py", "b c.py"])
+        basepath, sections = pycscope.readIndex(BytesIO(fout.getvalue().encode()))
+        self.assertEqual(basepath, "/tmp/foo bar")
+        self.assertEqual(sections, {'a.py': '1 \n\t=a\n = 1\n\n', 's.py': '', 'b c.py': '1 \n\t=b\n = 1\n\n'})
+
+    def testcompressed(self,):
+        chunks = [(['\n\t@a.py\n\n', '1 \n\t=test\n = 1\n\n', '2 return \nb\n\n'], ['a.py'])]
+        fout = BytesIO()
+        pycscope.streamIndex("/tmp/foo bar", fout, iter(chunks), compress=True)
+        basepath, sections = pycscope.readIndex(BytesIO(fout.getvalue()))
+        self.assertEqual(basepath, "/tmp/foo bar")
+        self.assertEqual(sections, {'a.py': '1 \n\t=test\n = 1\n\n2 return \nb\n\n'})
+
+    def testnotindex(self,):
+        try:
+            pycscope.readIndex(BytesIO(b"cscope 15 /tmp/foo -q -c 0000000055\n"))
+        except ValueError:
+            pass
+        else:
+            self.fail("Expected a ValueError")